@@ -33,6 +33,7 @@ const malwarePatterns = [
 ];
 
 const DJANGO_API_URL = 'http://127.0.0.1:8000/filter/predict/';
+const DJANGO_BATCH_API_URL = 'http://127.0.0.1:8000/filter/predict/batch/';
 // const DJANGO_API_URL = 'https://zapsyncml.onrender.com/filter/predict/';
 
 // Profanity Check
@@ -43,15 +44,17 @@ exports.checkForProfanity = async (text) => {
       .split(/\s+/)
       .filter(word => word.length > 2);
 
-    for (const word of words) {
-      const result = await checkWordWithDjangoAPI(word, 'file-upload');
-      if (result.should_reject) {
-        return {
-          isProfane: true,
-          offendingWord: word,
-          confidence: result.confidence
-        };
-      }
+    if (words.length === 0) {
+      return { isProfane: false };
+    }
+
+    const result = await checkWordsWithDjangoAPI(words, 'file-upload');
+    if (result.should_reject) {
+      return {
+        isProfane: true,
+        offendingWord: result.first_rejected.text,
+        confidence: result.first_rejected.confidence
+      };
     }
     return { isProfane: false };
   } catch (error) {
@@ -78,6 +81,29 @@ async function checkWordWithDjangoAPI(word, source = 'unknown') {
   }
 }
 
+// Batch API Request Helper - one round trip for all words, stops at the first rejected word
+async function checkWordsWithDjangoAPI(words, source = 'unknown') {
+  try {
+    const response = await axios.post(DJANGO_BATCH_API_URL, {
+      texts: words,
+      stop_on_reject: true
+    }, {
+      headers: { 'Content-Type': 'application/json' },
+      timeout: 5000 // 5 second timeout
+    });
+
+    for (const result of response.data.results) {
+      logRequest(result.text, result, source);
+    }
+    return response.data;
+  } catch (error) {
+    for (const word of words) {
+      logRequest(word, { error: error.message }, source);
+    }
+    throw error;
+  }
+}
+
 // Malware Pattern Detection
 exports.scanForMalware = async (text) => {
   return malwarePatterns.some(pattern => pattern.test(text));
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class AnomalyDetectionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'anomaly_detection'
+
+    def ready(self):
+        from zapsync_ai.registry import registry
+        from .signals import activity_recorded
+        from .stats import record_activity
+        registry.register('anomaly', 'anomaly_detection.utils.AnomalyDetector')
+        registry.register('activity_stats', 'anomaly_detection.stats.load_activity_stats')
+        activity_recorded.connect(record_activity, dispatch_uid='activity_stats')
@@ -0,0 +1,275 @@
+"""
+Per-user sliding-window activity features, updated incrementally.
+
+Each user owns one row in a set of preallocated arrays. The window is split
+into ``window // bucket`` time buckets kept as a ring: an event adds its
+action count and size to the bucket for its timestamp, and a bucket is
+zeroed when it is reused for a newer period. Window totals are a masked sum
+over the user's buckets, so no event history is ever stored or rescanned.
+
+ActivityWindow keeps the arrays in process memory (for training and tests);
+SharedActivityWindow keeps the same buckets in SQLite so that every server
+worker scores against one set of windows.
+"""
+
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+ACTIONS = ('upload', 'download', 'share', 'delete')
+ACTION_INDEX = {action: i for i, action in enumerate(ACTIONS)}
+BYTES = len(ACTIONS)  # Bucket column holding bytes moved
+
+FEATURE_NAMES = (
+    'size_log',
+    'hour_sin',
+    'hour_cos',
+    *(f'window_{action}s' for action in ACTIONS),
+    'window_bytes_log',
+    'bucket_events',
+)
+
+INITIAL_USERS = 1024
+NO_EPOCH = np.iinfo(np.int64).min
+MAX_VARIABLES = 900  # Below SQLite's default limit on bound parameters per statement
+
+
+class ActivityWindow:
+    def __init__(self, window_seconds=3600, bucket_seconds=300):
+        if window_seconds % bucket_seconds:
+            raise ValueError("window_seconds must be a multiple of bucket_seconds")
+        self.bucket_seconds = bucket_seconds
+        self.n_buckets = window_seconds // bucket_seconds
+        self.users = {}
+        self._lock = threading.Lock()
+        self._allocate(INITIAL_USERS)
+
+    def _allocate(self, capacity):
+        counts = np.zeros((capacity, self.n_buckets, BYTES + 1), dtype=np.float64)
+        epochs = np.full((capacity, self.n_buckets), NO_EPOCH, dtype=np.int64)
+        if hasattr(self, 'counts'):
+            counts[:len(self.counts)] = self.counts
+            epochs[:len(self.epochs)] = self.epochs
+        self.counts, self.epochs = counts, epochs
+
+    def __len__(self):
+        return len(self.users)
+
+    def _rows(self, users):
+        """Row of every user, adding rows (and growing the arrays) for new ones"""
+        rows = np.empty(len(users), dtype=np.int64)
+        for i, user in enumerate(users):
+            row = self.users.get(user)
+            if row is None:
+                row = self.users[user] = len(self.users)
+            rows[i] = row
+        if len(self.users) > len(self.counts):
+            capacity = len(self.counts)
+            while capacity < len(self.users):
+                capacity *= 2
+            self._allocate(capacity)
+        return rows
+
+    def update(self, users, actions, sizes, timestamps):
+        """Add a batch of events and return their (n, len(FEATURE_NAMES)) features.
+
+        ``actions`` are indexes into ACTIONS and ``timestamps`` are epoch
+        seconds. Each event's window includes the event itself and the
+        user's earlier events, whether from previous batches or this one.
+        """
+        features, batch = self.features(users, actions, sizes, timestamps)
+        self.add(batch)
+        return features
+
+    def features(self, users, actions, sizes, timestamps):
+        """Features of a batch as ``update`` computes them, without adding it.
+
+        Returns (features, batch); pass ``batch`` to ``add`` once the
+        features have been used, so a batch that fails later on leaves
+        the windows as they were.
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        sizes = np.asarray(sizes, dtype=np.float64)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        n = len(actions)
+
+        values = np.zeros((n, BYTES + 1))
+        values[np.arange(n), actions] = 1.0
+        values[:, BYTES] = sizes
+        epochs = np.floor_divide(timestamps, self.bucket_seconds).astype(np.int64)
+        slots = epochs % self.n_buckets
+
+        # Window totals before this batch, as seen from each event's bucket
+        counts, stored_epochs = self._lookup(users)
+        live = stored_epochs > (epochs - self.n_buckets)[:, None]
+        window = np.einsum('nbk,nb->nk', counts, live)
+        current = stored_epochs[np.arange(n), slots] == epochs
+        bucket = np.where(current[:, None], counts[np.arange(n), slots], 0.0)
+
+        # Add the user's earlier events in this batch that share the event's
+        # window (and bucket): with events sorted by user then time, those
+        # are contiguous runs ending at the event, so prefix sums give them
+        _, codes = np.unique(np.asarray(users), return_inverse=True)
+        order = np.lexsort((timestamps, codes))
+        running = np.vstack([np.zeros((1, BYTES + 1)), np.cumsum(values[order], axis=0)])
+        span = epochs.max() - epochs.min() + self.n_buckets + 1
+        keys = codes * span + (epochs - epochs.min())
+        sorted_keys = keys[order]
+        position = np.empty(n, dtype=np.int64)
+        position[order] = np.arange(1, n + 1)
+
+        window_start = np.searchsorted(sorted_keys, keys - self.n_buckets + 1)
+        bucket_start = np.searchsorted(sorted_keys, keys)
+        window += running[position] - running[window_start]
+        in_bucket = running[position] - running[bucket_start]
+        events_in_bucket = bucket[:, :BYTES].sum(axis=1) + in_bucket[:, :BYTES].sum(axis=1)
+
+        hours = (timestamps % 86400) / 3600
+        features = np.column_stack([
+            np.log1p(sizes),
+            np.sin(2 * np.pi * hours / 24),
+            np.cos(2 * np.pi * hours / 24),
+            np.log1p(window[:, :BYTES]),
+            np.log1p(window[:, BYTES]),
+            np.log1p(events_in_bucket),
+        ])
+        return features, (list(users), values, epochs, slots)
+
+    def _lookup(self, users):
+        """Bucket counts and epochs of each user's row (empty for new users)"""
+        counts = np.zeros((len(users), self.n_buckets, BYTES + 1))
+        epochs = np.full((len(users), self.n_buckets), NO_EPOCH, dtype=np.int64)
+        with self._lock:
+            rows = np.array([self.users.get(user, -1) for user in users], dtype=np.int64)
+            known = np.flatnonzero(rows >= 0)
+            counts[known] = self.counts[rows[known]]
+            epochs[known] = self.epochs[rows[known]]
+        return counts, epochs
+
+    def add(self, batch):
+        """Add a batch returned by ``features`` to the windows"""
+        users, values, epochs, slots = batch
+        with self._lock:
+            rows = self._rows(users)  # May grow the arrays
+            _fold(self.counts, self.epochs, rows, slots, epochs, values)
+
+
+def _fold(counts, bucket_epochs, rows, slots, epochs, values):
+    """Add events to bucket arrays in place"""
+    # Recycle buckets that now belong to a newer period, then add the
+    # events; events older than their bucket's period are dropped
+    newer = epochs > bucket_epochs[rows, slots]
+    counts[rows[newer], slots[newer]] = 0.0
+    np.maximum.at(bucket_epochs, (rows, slots), epochs)
+    keep = bucket_epochs[rows, slots] == epochs
+    np.add.at(counts, (rows[keep], slots[keep]), values[keep])
+
+
+class SharedActivityWindow(ActivityWindow):
+    """ActivityWindow kept in a SQLite file shared by every worker on the host.
+
+    Each (user, bucket) is a row. A batch reads the rows of its users, folds
+    the events in and writes back the buckets it touched in one transaction,
+    so every worker scores against the same windows. Buckets more than two
+    windows older than the newest activity are deleted.
+    """
+
+    def __init__(self, path, window_seconds=3600, bucket_seconds=300):
+        if window_seconds % bucket_seconds:
+            raise ValueError("window_seconds must be a multiple of bucket_seconds")
+        self.path = str(path)
+        self.bucket_seconds = bucket_seconds
+        self.n_buckets = window_seconds // bucket_seconds
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS buckets (user TEXT NOT NULL, slot INTEGER NOT NULL, '
+                'epoch INTEGER NOT NULL, '
+                + ''.join(f'{action}s REAL NOT NULL, ' for action in ACTIONS)
+                + 'bytes REAL NOT NULL, PRIMARY KEY (user, slot))'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS buckets_epoch ON buckets (epoch)')
+            connection.execute('CREATE TABLE IF NOT EXISTS shape (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            connection.execute(
+                "INSERT OR IGNORE INTO shape VALUES ('buckets', ?), ('bucket_seconds', ?)",
+                (self.n_buckets, bucket_seconds)
+            )
+            stored = dict(connection.execute('SELECT name, value FROM shape').fetchall())
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        if stored != {'buckets': self.n_buckets, 'bucket_seconds': bucket_seconds}:
+            raise RuntimeError(
+                f"Activity window at {self.path} has {stored['buckets']} buckets of "
+                f"{stored['bucket_seconds']}s, not {self.n_buckets} of {bucket_seconds}s"
+            )
+
+    def _connection(self):
+        """One connection per thread, reopened after a fork"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(DISTINCT user) FROM buckets').fetchone()[0]
+
+    def _read(self, connection, users):
+        """(names, rows, counts, epochs): one array row per distinct user, rows mapping ``users`` to it"""
+        names, rows = np.unique(np.asarray(users, dtype=str), return_inverse=True)
+        index = {name: i for i, name in enumerate(names.tolist())}
+        counts = np.zeros((len(names), self.n_buckets, BYTES + 1))
+        epochs = np.full((len(names), self.n_buckets), NO_EPOCH, dtype=np.int64)
+        for start in range(0, len(names), MAX_VARIABLES):
+            chunk = names[start:start + MAX_VARIABLES].tolist()
+            for user, slot, epoch, *values in connection.execute(
+                f'SELECT * FROM buckets WHERE user IN ({", ".join("?" * len(chunk))})', chunk
+            ):
+                epochs[index[user], slot] = epoch
+                counts[index[user], slot] = values
+        return names.tolist(), rows, counts, epochs
+
+    def _lookup(self, users):
+        connection = self._connection()
+        # One read transaction, so every chunk comes from the same snapshot
+        connection.execute('BEGIN')
+        try:
+            _, rows, counts, epochs = self._read(connection, users)
+        finally:
+            connection.execute('COMMIT')
+        return counts[rows], epochs[rows]
+
+    def add(self, batch):
+        users, values, epochs, slots = batch
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            names, rows, counts, bucket_epochs = self._read(connection, users)
+            _fold(counts, bucket_epochs, rows, slots, epochs, values)
+            touched = np.unique(np.column_stack([rows, slots]), axis=0)
+            connection.executemany(
+                f'INSERT OR REPLACE INTO buckets VALUES ({", ".join("?" * (BYTES + 4))})',
+                [
+                    (names[row], int(slot), int(bucket_epochs[row, slot]), *counts[row, slot].tolist())
+                    for row, slot in touched.tolist()
+                ]
+            )
+            # Keep a window of slack so that late events up to a window old still see theirs
+            connection.execute(
+                'DELETE FROM buckets WHERE epoch <= (SELECT MAX(epoch) FROM buckets) - ?', (2 * self.n_buckets,)
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
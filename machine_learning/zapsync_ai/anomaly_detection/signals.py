@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent after a batch of activity events is parsed, with the event columns as
+# keyword arguments: users, actions (indexes into features.ACTIONS), sizes
+# and timestamps (epoch seconds)
+activity_recorded = Signal()
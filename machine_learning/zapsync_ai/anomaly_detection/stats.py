@@ -0,0 +1,264 @@
+"""
+Rolling activity aggregates for the dashboard.
+
+Events are folded into one bucket per UTC day as they are ingested: action
+counts, bytes uploaded and deleted, and a HyperLogLog sketch of the users
+seen that day. KPI and calendar queries read only the buckets in their
+range; distinct users over several days come from merging the day sketches.
+
+Buckets live in a SQLite file in WAL mode shared by every worker on the
+host, so the aggregates survive restarts and cover events ingested by any
+worker. A batch is merged into its days' rows in one transaction: counts
+are added and sketch registers combined with an elementwise max, which is
+the sketch of the union.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+from .features import ACTIONS, ACTION_INDEX
+
+SECONDS_PER_DAY = 86400
+EPOCH = date(1970, 1, 1)
+
+
+def _hash64(values):
+    """Stable 64-bit hashes (the same in every process, unlike hash())"""
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(v.encode('utf-8'), digest_size=8).digest(), 'little')
+         for v in values],
+        dtype=np.uint64
+    )
+
+
+class HyperLogLog:
+    """Distinct-count sketch in ``2 ** precision`` one-byte registers (~1.6% error at 12)"""
+
+    def __init__(self, precision=12, registers=None):
+        self.precision = precision
+        self.registers = (
+            np.zeros(1 << precision, dtype=np.uint8) if registers is None else registers
+        )
+
+    def add(self, values):
+        if not len(values):
+            return
+        hashes = _hash64(values)
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        rest = (hashes & np.uint64((1 << (64 - self.precision)) - 1)).astype(np.float64)
+        # Position of the leftmost 1 bit in the remaining bits (frexp gives bit_length)
+        rank = (64 - self.precision) - np.frexp(rest)[1] + 1
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)  # Linear counting for small sets
+        return int(round(estimate))
+
+
+class ActivityStats:
+    def __init__(self, path, retention_days=400, precision=12, storage_baseline=0.0):
+        self.path = str(path)
+        self.retention_days = retention_days
+        self.precision = precision
+        self.storage_baseline = storage_baseline
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS days ('
+                'day INTEGER PRIMARY KEY, '
+                + ''.join(f'{action}s INTEGER NOT NULL, ' for action in ACTIONS)
+                + 'bytes_uploaded REAL NOT NULL, bytes_deleted REAL NOT NULL, users BLOB NOT NULL)'
+            )
+            connection.execute('CREATE TABLE IF NOT EXISTS totals (name TEXT PRIMARY KEY, value REAL NOT NULL)')
+            connection.execute(
+                "INSERT OR IGNORE INTO totals VALUES ('precision', ?), ('storage', 0)", (precision,)
+            )
+            stored = connection.execute("SELECT value FROM totals WHERE name = 'precision'").fetchone()[0]
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        if stored != precision:
+            raise RuntimeError(
+                f"Activity stats at {self.path} use HyperLogLog precision {int(stored)}, not {precision}"
+            )
+
+    def _connection(self):
+        """One connection per thread, reopened after a fork"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def record(self, users, actions, sizes, timestamps):
+        """Fold a batch of parsed events (as from anomaly_detection.utils.parse_events) in"""
+        actions = np.asarray(actions, dtype=np.int64)
+        sizes = np.asarray(sizes, dtype=np.float64)
+        days = np.floor_divide(np.asarray(timestamps, dtype=np.float64), SECONDS_PER_DAY).astype(np.int64)
+        users = np.asarray(users, dtype=object)
+        uploads = actions == ACTION_INDEX['upload']
+        deletes = actions == ACTION_INDEX['delete']
+
+        # Sketch the batch before taking the write lock
+        rows = []
+        for day in np.unique(days):
+            in_day = days == day
+            sketch = HyperLogLog(self.precision)
+            sketch.add(np.unique(users[in_day].astype(str)))
+            rows.append((
+                int(day),
+                np.bincount(actions[in_day], minlength=len(ACTIONS)),
+                float(sizes[in_day & uploads].sum()),
+                float(sizes[in_day & deletes].sum()),
+                sketch
+            ))
+
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            for day, counts, uploaded, deleted, sketch in rows:
+                stored = connection.execute('SELECT users FROM days WHERE day = ?', (day,)).fetchone()
+                if stored is not None:
+                    sketch.merge(self._sketch(stored[0]))
+                connection.execute(
+                    f'INSERT INTO days VALUES ({", ".join("?" * (len(ACTIONS) + 4))}) '
+                    'ON CONFLICT(day) DO UPDATE SET '
+                    + ''.join(f'{a}s = {a}s + excluded.{a}s, ' for a in ACTIONS)
+                    + 'bytes_uploaded = bytes_uploaded + excluded.bytes_uploaded, '
+                    'bytes_deleted = bytes_deleted + excluded.bytes_deleted, users = excluded.users',
+                    (day, *counts.tolist(), uploaded, deleted, sketch.registers.tobytes())
+                )
+            connection.execute(
+                "UPDATE totals SET value = value + ? WHERE name = 'storage'",
+                (float(sizes[uploads].sum() - sizes[deletes].sum()),)
+            )
+            self._expire(connection)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _expire(self, connection):
+        """Drop days more than ``retention_days`` before the latest day with activity"""
+        connection.execute(
+            'DELETE FROM days WHERE day <= (SELECT MAX(day) FROM days) - ?', (self.retention_days,)
+        )
+
+    def _sketch(self, registers):
+        return HyperLogLog(self.precision, np.frombuffer(registers, dtype=np.uint8).copy())
+
+    def _buckets(self, connection, first, last):
+        """{day: row} for day numbers ``first``..``last`` inclusive that have activity"""
+        rows = connection.execute(
+            'SELECT * FROM days WHERE day BETWEEN ? AND ?', (first, last)
+        ).fetchall()
+        return {row[0]: row for row in rows}
+
+    def _distinct_users(self, buckets):
+        sketch = HyperLogLog(self.precision)
+        for row in buckets.values():
+            sketch.merge(self._sketch(row[-1]))
+        return sketch.count()
+
+    def _storage_at_end_of(self, connection, day):
+        """Storage used after ``day``, from the running total minus later deltas"""
+        total, later = connection.execute(
+            "SELECT (SELECT value FROM totals WHERE name = 'storage'), "
+            'COALESCE(SUM(bytes_uploaded - bytes_deleted), 0) FROM days WHERE day > ?', (day,)
+        ).fetchone()
+        return self.storage_baseline + total - later
+
+    def summary(self, today, period=7):
+        """KPIs for the ``period`` days ending ``today`` against the period before"""
+        end = (today - EPOCH).days
+        connection = self._connection()
+        # One read transaction, so every figure comes from the same snapshot
+        connection.execute('BEGIN')
+        try:
+            buckets = self._buckets(connection, end - period + 1, end)
+            before = self._buckets(connection, end - 2 * period + 1, end - period)
+            storage_now = self._storage_at_end_of(connection, end)
+            storage_before = self._storage_at_end_of(connection, end - period)
+        finally:
+            connection.execute('COMMIT')
+
+        current = self._distinct_users(buckets)
+        previous = self._distinct_users(before)
+        totals = np.zeros(len(ACTIONS), dtype=np.int64)
+        for row in buckets.values():
+            totals += row[1:1 + len(ACTIONS)]
+        return {
+            'period_days': period,
+            'active_users': current,
+            'active_users_change': _percent_change(current, previous),
+            'storage_used': storage_now,
+            'storage_change': _percent_change(storage_now, storage_before),
+            **{f'{action}s': int(n) for action, n in zip(ACTIONS, totals)}
+        }
+
+    def calendar(self, start, end):
+        """One entry per day from ``start`` to ``end`` (dates, inclusive)"""
+        first, last = (start - EPOCH).days, (end - EPOCH).days
+        buckets = self._buckets(self._connection(), first, last)
+        entries = []
+        for day in range(first, last + 1):
+            row = buckets.get(day)
+            entry = {'date': (EPOCH + timedelta(days=day)).isoformat()}
+            if row is None:
+                entry.update({f'{action}s': 0 for action in ACTIONS})
+                entry.update({'active_users': 0, 'storage_delta': 0.0})
+            else:
+                entry.update({f'{action}s': int(n) for action, n in zip(ACTIONS, row[1:1 + len(ACTIONS)])})
+                uploaded, deleted = row[1 + len(ACTIONS):3 + len(ACTIONS)]
+                entry.update({
+                    'active_users': self._sketch(row[-1]).count(),
+                    'storage_delta': uploaded - deleted
+                })
+            entries.append(entry)
+        return entries
+
+
+def record_activity(sender, users, actions, sizes, timestamps, **kwargs):
+    """activity_recorded receiver feeding the process-wide ActivityStats"""
+    from zapsync_ai.registry import registry
+    registry.get('activity_stats').record(users, actions, sizes, timestamps)
+
+
+def load_activity_stats():
+    from django.conf import settings
+
+    config = getattr(settings, 'ACTIVITY_STATS', {})
+    return ActivityStats(
+        config.get('PATH', os.path.join(os.path.dirname(__file__), '..', 'stats', 'activity.sqlite3')),
+        retention_days=config.get('RETENTION_DAYS', 400),
+        precision=config.get('HLL_PRECISION', 12),
+        storage_baseline=config.get('STORAGE_BASELINE', 0.0)
+    )
+
+
+def _percent_change(current, previous):
+    if not previous:
+        return 0.0 if not current else 100.0
+    return round((current - previous) / abs(previous) * 100, 2)
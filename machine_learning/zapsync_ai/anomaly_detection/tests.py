@@ -1,3 +1,251 @@
-from django.test import TestCase
+import multiprocessing
+import shutil
+import tempfile
+from datetime import date
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory
+
+from . import views
+from .features import ActivityWindow, SharedActivityWindow
+from .signals import activity_recorded
+from .stats import SECONDS_PER_DAY, ActivityStats, HyperLogLog, record_activity
+from .utils import AnomalyDetector, AnomalyLog, parse_events
+
+EVENT = {'user': 'alice', 'action': 'upload', 'size': 1024, 'timestamp': 1700000000}
+
+
+class ParseEventsTests(SimpleTestCase):
+    def test_rejects_non_finite_numbers(self):
+        for field, value in [('size', float('nan')), ('size', float('inf')), ('size', 'nan'),
+                             ('timestamp', float('nan')), ('timestamp', float('-inf'))]:
+            with self.subTest(field=field, value=value), self.assertRaises(ValueError):
+                parse_events([{**EVENT, field: value}])
+
+    def test_parses_columns(self):
+        users, actions, sizes, timestamps = parse_events([EVENT, {**EVENT, 'size': None}])
+        self.assertEqual(users, ['alice', 'alice'])
+        self.assertEqual(sizes.tolist(), [1024.0, 0.0])
+        self.assertEqual(timestamps.tolist(), [1700000000.0] * 2)
+
+
+class ActivityWindowTests(SimpleTestCase):
+    def test_features_do_not_change_the_window(self):
+        window = ActivityWindow(3600, 300)
+        window.update(['alice'], [0], [10.0], [1700000000.0])
+        before = window.features(['alice'], [1], [5.0], [1700000100.0])[0]
+        again, batch = window.features(['alice'], [1], [5.0], [1700000100.0])
+        np.testing.assert_array_equal(before, again)
+        window.add(batch)
+        self.assertFalse(np.array_equal(window.features(['alice'], [1], [5.0], [1700000100.0])[0], before))
+
+
+def _random_batches(seed, n_batches=6):
+    rng = np.random.default_rng(seed)
+    # Batches move forward in time but overlap, so some events arrive late
+    for start in range(0, 1800 * n_batches, 1800):
+        n = int(rng.integers(1, 40))
+        yield (
+            [f'u{i}' for i in rng.integers(0, 8, n)],
+            rng.integers(0, 4, n),
+            rng.uniform(0, 1e6, n),
+            1700000000 + start + rng.uniform(0, 2400, n)
+        )
+
+
+class SharedActivityWindowTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = f'{directory}/anomaly.sqlite3'
+
+    def test_features_match_the_in_memory_window(self):
+        memory, shared = ActivityWindow(3600, 300), SharedActivityWindow(self.path, 3600, 300)
+        for batch in _random_batches(0):
+            np.testing.assert_allclose(shared.update(*batch), memory.update(*batch))
+        self.assertEqual(len(SharedActivityWindow(self.path, 3600, 300)), len(memory))
+
+    def test_instances_share_windows(self):
+        first, second = SharedActivityWindow(self.path, 3600, 300), SharedActivityWindow(self.path, 3600, 300)
+        memory = ActivityWindow(3600, 300)
+        for i, batch in enumerate(_random_batches(1)):
+            window = first if i % 2 else second
+            np.testing.assert_allclose(window.update(*batch), memory.update(*batch))
+
+    def test_expired_buckets_are_dropped(self):
+        window = SharedActivityWindow(self.path, 3600, 300)
+        window.update(['alice'], [0], [1.0], [1700000000.0])
+        window.update(['bob'], [0], [1.0], [1700000000.0 + 3600])
+        self.assertEqual(len(window), 2)
+        window.update(['bob'], [0], [1.0], [1700000000.0 + 7200])
+        self.assertEqual(len(window), 1)
+
+    def test_shape_must_match(self):
+        SharedActivityWindow(self.path, 3600, 300)
+        with self.assertRaises(RuntimeError):
+            SharedActivityWindow(self.path, 3600, 600)
+
+
+class AnomalyLogTests(SimpleTestCase):
+    def test_keeps_the_most_recent_anomalies(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        log = AnomalyLog(f'{directory}/anomaly.sqlite3', capacity=3)
+        log.record(10, [{'user': 'alice', 'n': 1}, {'user': 'bob', 'n': 2}])
+        AnomalyLog(f'{directory}/anomaly.sqlite3', capacity=3).record(5, [{'user': 'alice', 'n': n} for n in (3, 4)])
+        self.assertEqual([a['n'] for a in log.recent()], [4, 3, 2])
+        self.assertEqual([a['n'] for a in log.recent(user='alice', limit=1)], [4])
+        self.assertEqual(log.stats(), {'events_scored': 15, 'anomalies_found': 4, 'recent_buffered': 3})
+
+
+class AnomalyDetectorTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        with override_settings(ANOMALY_DETECTION={'STATE_PATH': f'{cls.directory}/base.sqlite3'}):
+            cls.detector = AnomalyDetector()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        path = f'{self.directory}/{self._testMethodName}.sqlite3'
+        self.detector.window = SharedActivityWindow(path, 3600, 300)
+        self.detector.log = AnomalyLog(path)
+        self.received = []
+        receiver = lambda sender, **kwargs: self.received.append(kwargs['users'])
+        activity_recorded.connect(receiver, weak=False, dispatch_uid='anomaly_tests')
+        self.addCleanup(activity_recorded.disconnect, dispatch_uid='anomaly_tests')
+        # Keep the shared activity stats out of these tests
+        activity_recorded.disconnect(dispatch_uid='activity_stats')
+        self.addCleanup(activity_recorded.connect, record_activity, dispatch_uid='activity_stats')
+
+    def test_nan_size_is_rejected_before_any_update(self):
+        with self.assertRaises(ValueError):
+            self.detector.ingest([EVENT, {**EVENT, 'size': float('nan')}])
+        self.assertEqual(len(self.detector.window), 0)
+        self.assertEqual(self.received, [])
+
+    def test_failed_scoring_leaves_state_unchanged(self):
+        with mock.patch.object(self.detector.model, 'score_samples', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                self.detector.ingest([EVENT])
+        self.assertEqual(len(self.detector.window), 0)
+        self.assertEqual(self.received, [])
+
+        result = self.detector.ingest([EVENT])
+        self.assertEqual(result['events_scored'], 1)
+        self.assertEqual(len(self.detector.window), 1)
+        self.assertEqual(self.received, [['alice']])
+        self.assertEqual(self.detector.stats()['events_scored'], 1)
+
+    def test_workers_share_windows_and_anomalies(self):
+        burst = [{**EVENT, 'size': 5e9, 'timestamp': 1700000000 + i} for i in range(200)]
+        worker = multiprocessing.get_context('fork').Process(target=self.detector.ingest, args=(burst,))
+        worker.start()
+        worker.join()
+        self.assertEqual(worker.exitcode, 0)
+
+        stats = self.detector.stats()
+        self.assertEqual((stats['events_scored'], stats['users_tracked']), (200, 1))
+        self.assertEqual(len(self.detector.recent_anomalies(limit=1000)), stats['anomalies_found'])
+        # This process sees the other worker's window
+        memory = ActivityWindow(3600, 300)
+        memory.update(['alice'] * 200, [0] * 200, [5e9] * 200, [1700000000 + i for i in range(200)])
+        features = self.detector.window.features(['alice'], [0], [1.0], [1700000300.0])[0]
+        np.testing.assert_allclose(features, memory.features(['alice'], [0], [1.0], [1700000300.0])[0])
+
+
+DAY = 19699  # 2023-12-08
+
+
+def _record_users(path, worker):
+    stats = ActivityStats(path)
+    for start in range(0, 2000, 500):
+        users = [f'{worker}-{i}' for i in range(start, start + 500)]
+        stats.record(users, [0] * 500, [1.0] * 500, [DAY * SECONDS_PER_DAY] * 500)
+
+
+class HyperLogLogTests(SimpleTestCase):
+    def test_estimates_within_error_bounds(self):
+        # Standard error is 1.04 / sqrt(4096) = 1.6%; allow four of them
+        for n in (10, 1000, 20000, 200000):
+            with self.subTest(n=n):
+                sketch = HyperLogLog(12)
+                sketch.add([f'user-{i}' for i in range(n)])
+                self.assertLessEqual(abs(sketch.count() - n), max(0.065 * n, 1))
+
+    def test_merge_is_the_sketch_of_the_union(self):
+        a, b, union = HyperLogLog(10), HyperLogLog(10), HyperLogLog(10)
+        a.add([f'u{i}' for i in range(3000)])
+        b.add([f'u{i}' for i in range(2000, 5000)])
+        union.add([f'u{i}' for i in range(5000)])
+        np.testing.assert_array_equal(a.merge(b).registers, union.registers)
+
+
+class ActivityStatsTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = f'{directory}/activity.sqlite3'
+
+    def record(self, stats, day, users, action=0, size=1.0):
+        stats.record(users, [action] * len(users), [size] * len(users), [day * SECONDS_PER_DAY + 60] * len(users))
+
+    def test_instances_share_and_merge_aggregates(self):
+        first, second = ActivityStats(self.path), ActivityStats(self.path)
+        self.record(first, DAY, ['alice', 'bob'])
+        self.record(second, DAY, ['bob', 'carol'], size=2.0)
+        summary = ActivityStats(self.path).summary(date(2023, 12, 8), period=1)
+        self.assertEqual(summary['active_users'], 3)
+        self.assertEqual(summary['uploads'], 4)
+        self.assertEqual(summary['storage_used'], 6.0)
+
+    def test_concurrent_processes_lose_no_events(self):
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=_record_users, args=(self.path, w)) for w in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+
+        entry, = ActivityStats(self.path).calendar(date(2023, 12, 8), date(2023, 12, 8))
+        self.assertEqual(entry['uploads'], 8000)
+        self.assertEqual(entry['storage_delta'], 8000.0)
+        self.assertLessEqual(abs(entry['active_users'] - 8000), 0.065 * 8000)
+
+    def test_expires_by_date(self):
+        stats = ActivityStats(self.path, retention_days=3)
+        for day in (DAY, DAY + 1, DAY + 5):
+            self.record(stats, day, ['alice'])
+        self.assertEqual(stats.calendar(date(2023, 12, 8), date(2023, 12, 9))[0]['uploads'], 0)
+        self.assertEqual(stats.calendar(date(2023, 12, 13), date(2023, 12, 13))[0]['uploads'], 1)
+
+    def test_storage_at_end_of_a_day(self):
+        stats = ActivityStats(self.path, storage_baseline=100.0)
+        self.record(stats, DAY, ['alice'], size=50.0)
+        self.record(stats, DAY + 2, ['alice'], action=3, size=30.0)
+        self.assertEqual(stats.summary(date(2023, 12, 9), period=1)['storage_used'], 150.0)
+        self.assertEqual(stats.summary(date(2023, 12, 10), period=1)['storage_used'], 120.0)
+
+    def test_precision_must_match(self):
+        ActivityStats(self.path, precision=12)
+        with self.assertRaises(RuntimeError):
+            ActivityStats(self.path, precision=10)
+
+
+class AnomaliesViewTests(SimpleTestCase):
+    def test_negative_limit_is_clamped(self):
+        detector = mock.Mock()
+        detector.recent_anomalies.return_value = []
+        request = APIRequestFactory().get('/anomaly/anomalies/', {'limit': '-5'})
+        with mock.patch.object(views, 'get_detector', return_value=detector):
+            response = views.anomalies(request)
+        self.assertEqual(response.status_code, 200)
+        detector.recent_anomalies.assert_called_once_with(limit=0, user=None)
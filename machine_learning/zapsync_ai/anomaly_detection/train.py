@@ -0,0 +1,107 @@
+import argparse
+import os
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+
+# Run as a script from any directory, importing the app's feature code
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from anomaly_detection.features import ACTIONS, ACTION_INDEX, FEATURE_NAMES, ActivityWindow
+
+# Constants
+MODEL_SAVE_PATH = os.path.join(os.path.dirname(__file__), '..', 'models', 'anomaly_model.pkl')
+WINDOW_SECONDS = 3600
+BUCKET_SECONDS = 300
+CHUNK_EVENTS = 50000
+
+
+def synthesize_events(n_users=500, days=7, seed=42):
+    """Normal file activity: per-user daily rates, office-hours peaks, log-normal sizes"""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2025-01-06', tz='UTC').timestamp()
+
+    rates = rng.gamma(shape=2.0, scale=10.0, size=n_users)  # events per user per day
+    counts = rng.poisson(rates * days)
+    users = np.repeat(np.arange(n_users), counts)
+    n = len(users)
+
+    days_offset = rng.integers(0, days, size=n) * 86400
+    hours = np.clip(rng.normal(13, 3.5, size=n), 0, 23.99)
+    timestamps = start + days_offset + hours * 3600
+
+    actions = rng.choice(len(ACTIONS), size=n, p=[0.3, 0.5, 0.15, 0.05])
+    sizes = rng.lognormal(mean=13, sigma=1.5, size=n)  # ~0.4 MB median
+    sizes[actions == ACTION_INDEX['share']] = 0
+    sizes[actions == ACTION_INDEX['delete']] = 0
+
+    return pd.DataFrame({
+        'user': [f'user{u}' for u in users],
+        'action': np.asarray(ACTIONS)[actions],
+        'size': sizes,
+        'timestamp': timestamps
+    })
+
+
+def load_events(path):
+    """CSV of past activity with user, action, size and timestamp columns"""
+    events = pd.read_csv(path)
+    missing = {'user', 'action', 'size', 'timestamp'} - set(events.columns)
+    if missing:
+        raise ValueError(f"Events file is missing columns: {', '.join(sorted(missing))}")
+    timestamps = pd.to_datetime(events['timestamp'], utc=True)
+    events['timestamp'] = (timestamps - pd.Timestamp(0, tz='UTC')).dt.total_seconds()
+    events['action'] = events['action'].str.lower()
+    return events[events['action'].isin(ACTIONS)]
+
+
+def build_features(events):
+    """Replay events in time order through the same window code used when serving"""
+    events = events.sort_values('timestamp', kind='stable')
+    window = ActivityWindow(WINDOW_SECONDS, BUCKET_SECONDS)
+    chunks = []
+    for start in range(0, len(events), CHUNK_EVENTS):
+        chunk = events.iloc[start:start + CHUNK_EVENTS]
+        chunks.append(window.update(
+            chunk['user'].astype(str).tolist(),
+            chunk['action'].map(ACTION_INDEX).to_numpy(),
+            chunk['size'].fillna(0).to_numpy(dtype=float),
+            chunk['timestamp'].to_numpy(dtype=float)
+        ))
+    return np.vstack(chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the file activity anomaly model")
+    parser.add_argument('--events', help="CSV of past activity (default: synthetic normal traffic)")
+    parser.add_argument('--contamination', type=float, default=0.01)
+    args = parser.parse_args()
+
+    events = load_events(args.events) if args.events else synthesize_events()
+    print(f"Building features for {len(events)} events...")
+    X = build_features(events)
+
+    model = IsolationForest(
+        n_estimators=100,
+        max_samples=min(256, len(X)),
+        contamination=args.contamination,
+        random_state=42
+    )
+    model.fit(X)
+    flagged = (model.predict(X) == -1).mean()
+    print(f"Flagged {flagged:.2%} of training events as anomalous")
+
+    os.makedirs(os.path.dirname(MODEL_SAVE_PATH), exist_ok=True)
+    joblib.dump({
+        'model': model,
+        'feature_names': FEATURE_NAMES,
+        'window_seconds': WINDOW_SECONDS,
+        'bucket_seconds': BUCKET_SECONDS
+    }, MODEL_SAVE_PATH)
+    print(f"\n✅ Anomaly model saved to {MODEL_SAVE_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+from django.urls import path
+from .views import activity_stats, anomalies, ingest, stats
+
+urlpatterns = [
+    path('', anomalies, name='anomalies'),
+    path('ingest/', ingest, name='anomaly_ingest'),
+    path('stats/', stats, name='anomaly_stats'),
+    path('activity/', activity_stats, name='activity_stats'),
+]
@@ -0,0 +1,215 @@
+import json
+import math
+import os
+import sqlite3
+import time
+import threading
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+from django.conf import settings
+
+from .features import ACTION_INDEX, FEATURE_NAMES, SharedActivityWindow
+from .signals import activity_recorded
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', 'models', 'anomaly_model.pkl')
+STATE_PATH = os.path.join(os.path.dirname(__file__), '..', 'stats', 'anomaly.sqlite3')
+
+
+def parse_timestamp(value):
+    """Epoch seconds from a number or an ISO 8601 string (naive means UTC)"""
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)):
+        return float(value)
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def parse_events(events):
+    """Validate raw event dicts into column arrays: users, actions, sizes, timestamps"""
+    users, actions, sizes, timestamps = [], [], [], []
+    for i, event in enumerate(events):
+        if not isinstance(event, dict):
+            raise ValueError(f"Event {i} must be an object")
+        action = ACTION_INDEX.get(str(event.get('action', '')).lower())
+        if action is None:
+            raise ValueError(f"Event {i} has an unknown action: {event.get('action')!r}")
+        user = event.get('user')
+        if user in (None, ''):
+            raise ValueError(f"Event {i} has no user")
+        try:
+            size = float(event.get('size') or 0)
+            timestamp = parse_timestamp(event.get('timestamp'))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Event {i} is invalid: {str(e)}")
+        if not math.isfinite(size) or not math.isfinite(timestamp):
+            raise ValueError(f"Event {i} has a size or timestamp that is not a finite number")
+        if size < 0:
+            raise ValueError(f"Event {i} has a negative size")
+        users.append(str(user))
+        actions.append(action)
+        sizes.append(size)
+        timestamps.append(timestamp)
+    return users, np.array(actions, dtype=np.int64), np.array(sizes), np.array(timestamps)
+
+
+class AnomalyLog:
+    """Bounded log of flagged events and scoring totals, shared by every worker.
+
+    Rows live in a SQLite file in WAL mode; each batch appends its anomalies
+    and drops the ones beyond ``capacity`` in the same transaction.
+    """
+
+    def __init__(self, path, capacity=1000):
+        self.path = str(path)
+        self.capacity = capacity
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS anomalies ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, user TEXT NOT NULL, anomaly TEXT NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS anomalies_user ON anomalies (user)')
+            connection.execute('CREATE TABLE IF NOT EXISTS totals (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            connection.execute("INSERT OR IGNORE INTO totals VALUES ('events_scored', 0), ('anomalies_found', 0)")
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _connection(self):
+        """One connection per thread, reopened after a fork"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def record(self, events_scored, anomalies):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(
+                'INSERT INTO anomalies (user, anomaly) VALUES (?, ?)',
+                [(anomaly['user'], json.dumps(anomaly)) for anomaly in anomalies]
+            )
+            connection.execute(
+                'DELETE FROM anomalies WHERE id <= (SELECT MAX(id) FROM anomalies) - ?', (self.capacity,)
+            )
+            connection.execute(
+                "UPDATE totals SET value = value + ? WHERE name = 'events_scored'", (events_scored,)
+            )
+            connection.execute(
+                "UPDATE totals SET value = value + ? WHERE name = 'anomalies_found'", (len(anomalies),)
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def recent(self, limit=50, user=None):
+        """Most recent anomalies first, optionally for one user"""
+        if user is None:
+            rows = self._connection().execute(
+                'SELECT anomaly FROM anomalies ORDER BY id DESC LIMIT ?', (limit,)
+            )
+        else:
+            rows = self._connection().execute(
+                'SELECT anomaly FROM anomalies WHERE user = ? ORDER BY id DESC LIMIT ?', (str(user), limit)
+            )
+        return [json.loads(anomaly) for anomaly, in rows]
+
+    def stats(self):
+        connection = self._connection()
+        connection.execute('BEGIN')
+        try:
+            totals = dict(connection.execute('SELECT name, value FROM totals').fetchall())
+            buffered = connection.execute('SELECT COUNT(*) FROM anomalies').fetchone()[0]
+        finally:
+            connection.execute('COMMIT')
+        return {**totals, 'recent_buffered': buffered}
+
+
+class AnomalyDetector:
+    """Scores file activity events with an Isolation Forest.
+
+    Features come from an ActivityWindow, so scoring a batch only touches
+    the rows of the users in it. The windows and the events the model
+    flags live in a SQLite file (ANOMALY_DETECTION['STATE_PATH']) rather
+    than in process memory, so every server worker scores against the same
+    history and serves the same anomalies.
+    """
+
+    def __init__(self, model_path=MODEL_PATH):
+        config = getattr(settings, 'ANOMALY_DETECTION', {})
+        try:
+            artifact = joblib.load(model_path)
+        except Exception as e:
+            raise RuntimeError(f"Failed to load anomaly model: {str(e)}")
+
+        if tuple(artifact.get('feature_names', ())) != FEATURE_NAMES:
+            raise RuntimeError("Anomaly model was trained on different features; rerun train.py")
+
+        self.model = artifact['model']
+        state_path = config.get('STATE_PATH', STATE_PATH)
+        self.window = SharedActivityWindow(
+            state_path,
+            window_seconds=artifact['window_seconds'],
+            bucket_seconds=artifact['bucket_seconds']
+        )
+        self.log = AnomalyLog(state_path, capacity=config.get('RECENT_ANOMALIES', 1000))
+
+    def ingest(self, events):
+        """Score ``events``, then add them to the windows and record anomalies"""
+        users, actions, sizes, timestamps = parse_events(events)
+        if not users:
+            return {'events_scored': 0, 'anomalies': []}
+
+        features, batch = self.window.features(users, actions, sizes, timestamps)
+        # score_samples is higher for normal points; below offset_ is an outlier
+        normality = self.model.score_samples(features)
+        # Only a batch that was scored counts as activity
+        self.window.add(batch)
+        activity_recorded.send(
+            sender=self.__class__, users=users, actions=actions, sizes=sizes, timestamps=timestamps
+        )
+        flagged = np.flatnonzero(normality < self.model.offset_)
+        scores = -normality
+
+        anomalies = [
+            {
+                'user': users[i],
+                'action': events[i]['action'].lower(),
+                'size': float(sizes[i]),
+                'timestamp': datetime.fromtimestamp(timestamps[i], timezone.utc).isoformat(),
+                'score': float(scores[i]),
+                'features': dict(zip(FEATURE_NAMES, features[i].round(4).tolist()))
+            }
+            for i in flagged
+        ]
+        self.log.record(len(users), anomalies)
+
+        return {'events_scored': len(users), 'anomalies': anomalies}
+
+    def recent_anomalies(self, limit=50, user=None):
+        """Most recent anomalies first, optionally for one user"""
+        return self.log.recent(limit=limit, user=user)
+
+    def stats(self):
+        return {
+            **self.log.stats(),
+            'users_tracked': len(self.window),
+            'window_seconds': self.window.n_buckets * self.window.bucket_seconds,
+            'bucket_seconds': self.window.bucket_seconds
+        }
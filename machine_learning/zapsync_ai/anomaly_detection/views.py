@@ -1,3 +1,85 @@
-from django.shortcuts import render
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from rest_framework import status
+from datetime import date, timedelta
+from django.conf import settings
+from zapsync_ai.registry import registry
 
-# Create your views here.
+
+def get_detector():
+    return registry.get('anomaly')
+
+
+@api_view(['POST'])
+def ingest(request):
+    events = request.data.get('events')
+    if not isinstance(events, list):
+        return Response(
+            {'error': 'events must be a list of activity events'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    max_events = getattr(settings, 'ANOMALY_DETECTION', {}).get('MAX_EVENTS_PER_REQUEST', 50000)
+    if len(events) > max_events:
+        return Response(
+            {'error': f'At most {max_events} events per request'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        return Response(get_detector().ingest(events))
+
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['GET'])
+def anomalies(request):
+    try:
+        limit = min(max(int(request.query_params.get('limit', 50)), 0), 1000)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    user = request.query_params.get('user') or None
+    return Response({'anomalies': get_detector().recent_anomalies(limit=limit, user=user)})
+
+
+@api_view(['GET'])
+def stats(request):
+    return Response(get_detector().stats())
+
+
+def _parse_date(value, default):
+    return date.fromisoformat(value) if value else default
+
+
+@api_view(['GET'])
+def activity_stats(request):
+    """
+    Dashboard KPIs for the last ``period`` days, and a per-day calendar
+    between ``start`` and ``end`` (ISO dates, default the last 30 days)
+    """
+    try:
+        today = _parse_date(request.query_params.get('today'), date.today())
+        period = min(max(int(request.query_params.get('period', 7)), 1), 365)
+        end = _parse_date(request.query_params.get('end'), today)
+        start = _parse_date(request.query_params.get('start'), end - timedelta(days=29))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if start > end or (end - start).days > 366:
+        return Response(
+            {'error': 'start must be before end and at most a year apart'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    aggregates = registry.get('activity_stats')
+    return Response({
+        **aggregates.summary(today, period=period),
+        'calendar': aggregates.calendar(start, end)
+    })
@@ -0,0 +1,65 @@
+"""
+Benchmark cases for the ML service hot paths.
+
+Every case is a zero-argument callable that makes one call. Inputs are
+generated from a fixed seed out of the bundled models' own vocabularies, so
+runs are comparable across machines and need no network or datasets.
+"""
+
+import random
+
+SEED = 1234
+FILLER = (
+    'the lecture notes for week five cover sorting algorithms and the final exam '
+    'will include graphs trees hashing and a short essay on complexity'
+).split()
+
+
+def _documents(vocabulary, words, count, seed):
+    rng = random.Random(seed)
+    pool = list(vocabulary) + FILLER * 4
+    return [' '.join(rng.choice(pool) for _ in range(words)) for _ in range(count)]
+
+
+def _cycle(items):
+    """Callable returning the next item on each call, so caches see fresh inputs"""
+    state = {'i': -1}
+
+    def next_item():
+        state['i'] = (state['i'] + 1) % len(items)
+        return items[state['i']]
+    return next_item
+
+
+def build_cases(detector, predictor, client):
+    """{name: (callable, default iterations)} for every benchmarked path"""
+    profanity_vocab = [term for term in detector.vectorizer.vocabulary_ if ' ' not in term]
+    nlp_vocab = [term for term in predictor.feature_names if ' ' not in term]
+
+    short = _cycle(_documents(profanity_vocab, 3, 512, SEED))
+    medium = _cycle(_documents(profanity_vocab, 60, 256, SEED + 1))
+    large = _cycle(_documents(profanity_vocab, 5000, 16, SEED + 2))
+    queries = _cycle([
+        f'{text} {ext}' for text, ext in zip(
+            _documents(nlp_vocab, 6, 512, SEED + 3),
+            random.Random(SEED + 4).choices(['', 'pdf', 'slides', 'CS101', 'week 3'], k=512)
+        )
+    ])
+    http_words = _cycle(_documents(profanity_vocab, 1, 512, SEED + 5))
+
+    return {
+        'profanity.predict': (lambda: detector.predict(short()), 2000),
+        'profanity.analyze_content.short': (lambda: detector.analyze_content(short()), 1000),
+        'profanity.analyze_content.medium': (lambda: detector.analyze_content(medium()), 500),
+        'profanity.analyze_content.large': (lambda: detector.analyze_content(large()), 50),
+        'nlp.predict': (lambda: predictor.predict(queries()), 500),
+        'nlp.extract_keywords': (lambda: predictor.extract_keywords(queries()), 1000),
+        'http.filter_predict': (
+            lambda: client.post('/filter/predict/', {'text': http_words()}, content_type='application/json'),
+            500
+        ),
+        'http.nlp_process': (
+            lambda: client.post('/nlp/process/', {'text': queries()}, content_type='application/json'),
+            300
+        ),
+    }
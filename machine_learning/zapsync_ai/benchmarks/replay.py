@@ -0,0 +1,361 @@
+"""
+Replay production-shaped traffic against a running ML service.
+
+    # Replay a backend trace at its recorded pace
+    python benchmarks/replay.py --log ../../backend/logs/content_filter.log
+
+    # The same trace squeezed to an average of 200 requests/s, with a fifth
+    # of the requests being search queries
+    python benchmarks/replay.py --log content_filter.log --rate 200 --nlp-share 0.2
+
+    # Synthetic traffic, 32 clients sending back to back
+    python benchmarks/replay.py --synthesize 5000 --concurrency 32
+
+The trace is ``backend/logs/content_filter.log``: one JSON line per word
+checked by ``backend/services/contentFilter.js``, each replayed as a
+``/filter/predict/`` request at its original offset from the first line.
+The backend does not log search queries, so ``/nlp/process/`` traffic is
+synthesized at Poisson arrival times across the same span.
+
+``--rate`` and ``--speed`` rescale the timeline but keep its shape (bursts
+stay bursts). Requests are sent open-loop: each goes out at its scheduled
+time whether or not earlier ones have answered, and latency is measured
+from that scheduled time, so a saturated server shows up as latency rather
+than as a lower send rate. ``--concurrency`` switches to closed-loop
+clients that ignore the timing, for finding peak throughput.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import numpy as np
+
+FILTER_PATH = '/filter/predict/'
+NLP_PATH = '/nlp/process/'
+PERCENTILES = (50, 90, 95, 99)
+UPLOAD_BURST = 12
+
+# Vocabulary for synthetic traffic, shaped like uploads and searches on the platform
+UPLOAD_WORDS = (
+    'lecture notes week introduction chapter summary assignment solution exam past '
+    'question answer tutorial lab report project proposal thesis draft final revision '
+    'algorithm data structure network database security analysis design calculus '
+    'physics chemistry biology economics statistics probability matrix theorem proof'
+).split()
+COURSES = ['CS101', 'CSC201', 'MTH102', 'PHY110', 'ECO205', 'STA301', 'BIO120', 'CHM101']
+QUERY_TEMPLATES = [
+    '{course} lecture notes',
+    '{course} past questions {year}',
+    'week {week} slides {course}',
+    '{word} {word} pdf',
+    '{word} assignment {course}',
+    'notes on {word} and {word}',
+    '{course} {word} tutorial week {week}',
+    'semester {semester} {word} exam',
+]
+
+
+def parse_timestamp(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+def load_log(path):
+    """[(offset seconds, path, body)] for every replayable line of a content_filter.log"""
+    entries = []
+    skipped = 0
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                entries.append((parse_timestamp(record['timestamp']), str(record['word'])))
+            except (ValueError, KeyError, TypeError):
+                skipped += 1
+    if not entries:
+        raise ValueError(f"No replayable lines in {path}")
+    if skipped:
+        print(f"Skipped {skipped} unreadable line(s) in {path}", file=sys.stderr)
+
+    entries.sort(key=lambda e: e[0])
+    start = entries[0][0]
+    return [(t - start, FILTER_PATH, {'text': word}) for t, word in entries]
+
+
+def synthetic_query(rng):
+    return rng.choice(QUERY_TEMPLATES).format(
+        course=rng.choice(COURSES),
+        word=rng.choice(UPLOAD_WORDS),
+        week=rng.randint(1, 14),
+        semester=rng.randint(1, 2),
+        year=rng.randint(2015, 2025)
+    )
+
+
+def synthesize(requests, rate, nlp_share, seed):
+    """A trace of uploads (bursts of one request per word) and searches at ``rate`` per second"""
+    rng = random.Random(seed)
+    # Uploads check UPLOAD_BURST words on average; pick the share of arrivals
+    # that are searches so that ``nlp_share`` of the requests are
+    search_share = UPLOAD_BURST * nlp_share / (1 - nlp_share + UPLOAD_BURST * nlp_share)
+    arrival_rate = rate / (search_share + (1 - search_share) * UPLOAD_BURST)
+
+    trace = []
+    clock = 0.0
+    while len(trace) < requests:
+        if rng.random() < search_share:
+            trace.append((clock, NLP_PATH, {'text': synthetic_query(rng)}))
+        else:
+            # An upload's words are checked within a few milliseconds of each other
+            words = min(1 + int(rng.expovariate(1 / (UPLOAD_BURST - 1))), requests - len(trace))
+            for i, word in enumerate(rng.choices(UPLOAD_WORDS, k=words)):
+                trace.append((clock + i * 0.002, FILTER_PATH, {'text': word}))
+        clock += rng.expovariate(arrival_rate)
+    trace.sort(key=lambda e: e[0])
+    return trace
+
+
+def add_queries(trace, nlp_share, seed):
+    """Mix synthesized searches into a filter trace so they make up ``nlp_share`` of it"""
+    if nlp_share <= 0 or not trace:
+        return trace
+    rng = random.Random(seed)
+    count = int(round(len(trace) * nlp_share / (1 - nlp_share)))
+    span = trace[-1][0]
+    queries = [(rng.uniform(0, span), NLP_PATH, {'text': synthetic_query(rng)}) for _ in range(count)]
+    return sorted(trace + queries, key=lambda e: e[0])
+
+
+def rescale(trace, rate=None, speed=None):
+    """Compress or stretch the timeline to an average ``rate`` or by ``speed``"""
+    span = trace[-1][0] if trace else 0.0
+    if rate:
+        factor = (len(trace) / rate) / span if span else 0.0
+    elif speed:
+        factor = 1 / speed
+    else:
+        return trace
+    return [(t * factor, path, body) for t, path, body in trace]
+
+
+class Client:
+    """One keep-alive HTTP connection per thread"""
+
+    def __init__(self, url, timeout):
+        parts = urlsplit(url)
+        self.connection_class = (
+            http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        )
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self.connection_class(self.netloc, timeout=self.timeout)
+        return connection
+
+    def post(self, path, body):
+        """Status code of the response; raises on connection errors and timeouts"""
+        payload = json.dumps(body).encode('utf-8')
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        connection = self._connection()
+        try:
+            connection.request('POST', self.prefix + path, payload, headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except Exception:
+            connection.close()
+            self._local.connection = None
+            raise
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.lag = []
+        self.outcomes = defaultdict(Counter)
+
+    def add(self, path, latency, outcome, lag=None):
+        with self._lock:
+            self.latencies[path].append(latency)
+            self.outcomes[path][outcome] += 1
+            if lag is not None:
+                self.lag.append(lag)
+
+
+def _send(client, recorder, path, body, scheduled):
+    sent = time.perf_counter()
+    try:
+        status = client.post(path, body)
+        outcome = str(status)
+    except Exception as e:
+        outcome = type(e).__name__
+    finished = time.perf_counter()
+    recorder.add(path, finished - (scheduled if scheduled is not None else sent), outcome,
+                 None if scheduled is None else sent - scheduled)
+
+
+def replay_open_loop(trace, client, max_in_flight):
+    """Send every request at its scheduled offset, however many are still outstanding"""
+    recorder = Recorder()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        start = time.perf_counter()
+        for offset, path, body in trace:
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(_send, client, recorder, path, body, start + offset)
+    return recorder, time.perf_counter() - start
+
+
+def replay_closed_loop(trace, client, concurrency):
+    """``concurrency`` clients working through the trace in order, back to back"""
+    recorder = Recorder()
+    position = iter(range(len(trace)))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                i = next(position, None)
+            if i is None:
+                return
+            _, path, body = trace[i]
+            _send(client, recorder, path, body, None)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder, time.perf_counter() - start
+
+
+def _latency_summary(seconds):
+    ms = np.asarray(seconds) * 1000
+    summary = {f'p{p}_ms': round(float(np.percentile(ms, p)), 3) for p in PERCENTILES}
+    summary['max_ms'] = round(float(ms.max()), 3)
+    summary['mean_ms'] = round(float(ms.mean()), 3)
+    return summary
+
+
+def build_report(recorder, elapsed, trace, mode):
+    endpoints = {}
+    for path, latencies in recorder.latencies.items():
+        outcomes = recorder.outcomes[path]
+        errors = sum(n for outcome, n in outcomes.items() if not outcome.startswith('2'))
+        endpoints[path] = {
+            'requests': len(latencies),
+            'errors': errors,
+            'error_rate': round(errors / len(latencies), 4),
+            'outcomes': dict(outcomes),
+            'latency': _latency_summary(latencies)
+        }
+
+    total = sum(e['requests'] for e in endpoints.values())
+    errors = sum(e['errors'] for e in endpoints.values())
+    all_latencies = [l for latencies in recorder.latencies.values() for l in latencies]
+    report = {
+        'mode': mode,
+        'requests': total,
+        'duration_s': round(elapsed, 3),
+        'scheduled_rate_per_s': round(len(trace) / trace[-1][0], 2) if trace[-1][0] else None,
+        'throughput_per_s': round(total / elapsed, 2) if elapsed else None,
+        'errors': errors,
+        'error_rate': round(errors / total, 4) if total else 0.0,
+        'latency': _latency_summary(all_latencies) if all_latencies else {},
+        'endpoints': endpoints
+    }
+    if recorder.lag:
+        # How late requests left because the sender itself fell behind
+        report['send_lag'] = _latency_summary(recorder.lag)
+    return report
+
+
+def print_report(report):
+    print(f"{report['mode']}: {report['requests']} requests in {report['duration_s']}s "
+          f"({report['throughput_per_s']}/s achieved"
+          + (f", {report['scheduled_rate_per_s']}/s scheduled)" if report['mode'] == 'open-loop' else ')'))
+    print(f"errors: {report['errors']} ({report['error_rate']:.2%})")
+    header = f"{'endpoint':20} {'requests':>9} {'errors':>7} " + ' '.join(f"{f'p{p} ms':>9}" for p in PERCENTILES)
+    print(header)
+    print('-' * len(header))
+    rows = [('all', report['requests'], report['errors'], report['latency'])] + [
+        (path, e['requests'], e['errors'], e['latency']) for path, e in sorted(report['endpoints'].items())
+    ]
+    for name, requests, errors, latency in rows:
+        print(f"{name:20} {requests:9d} {errors:7d} "
+              + ' '.join(f"{latency[f'p{p}_ms']:9.2f}" for p in PERCENTILES))
+    for path, e in sorted(report['endpoints'].items()):
+        failures = {k: v for k, v in e['outcomes'].items() if not k.startswith('2')}
+        if failures:
+            print(f"{path} failures: {', '.join(f'{k} x{v}' for k, v in failures.items())}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay traffic against the ML service")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--log', help="content_filter.log written by the backend")
+    source.add_argument('--synthesize', type=int, metavar='N', help="generate N requests instead")
+    parser.add_argument('--url', default=os.environ.get('ZAPSYNC_ML_URL', 'http://127.0.0.1:8000'))
+    pacing = parser.add_mutually_exclusive_group()
+    pacing.add_argument('--rate', type=float, help="average requests per second (rescales the timeline)")
+    pacing.add_argument('--speed', type=float, help="timeline speed-up factor (2 = twice as fast)")
+    pacing.add_argument('--concurrency', type=int, help="closed-loop clients, ignoring the timing")
+    parser.add_argument('--nlp-share', type=float, default=None,
+                        help="fraction of requests that are searches (default 0 for --log, 0.2 synthetic)")
+    parser.add_argument('--limit', type=int, help="replay only the first N requests")
+    parser.add_argument('--max-in-flight', type=int, default=256,
+                        help="open-loop cap on outstanding requests (default 256)")
+    parser.add_argument('--timeout', type=float, default=5.0,
+                        help="per-request timeout in seconds (default 5, as the backend uses)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="also write the report as JSON")
+    args = parser.parse_args()
+
+    if args.nlp_share is not None and not 0 <= args.nlp_share < 1:
+        parser.error("--nlp-share must be in [0, 1)")
+
+    if args.log:
+        trace = add_queries(load_log(args.log), args.nlp_share or 0.0, args.seed)
+    else:
+        nlp_share = 0.2 if args.nlp_share is None else args.nlp_share
+        trace = synthesize(args.synthesize, args.rate or 50.0, nlp_share, args.seed)
+    if args.limit:
+        trace = trace[:args.limit]
+    if not trace:
+        parser.error("Nothing to replay")
+    trace = rescale(trace, rate=args.rate, speed=args.speed)
+
+    client = Client(args.url, args.timeout)
+    if args.concurrency:
+        recorder, elapsed = replay_closed_loop(trace, client, args.concurrency)
+        mode = 'closed-loop'
+    else:
+        recorder, elapsed = replay_open_loop(trace, client, args.max_in_flight)
+        mode = 'open-loop'
+
+    report = build_report(recorder, elapsed, trace, mode)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
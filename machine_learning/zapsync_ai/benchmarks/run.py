@@ -0,0 +1,201 @@
+"""
+Run the hot-path benchmarks and compare them with a saved baseline.
+
+    python benchmarks/run.py                      # run, compare with the baseline if any
+    python benchmarks/run.py --save-baseline      # run and record the new baseline
+    python benchmarks/run.py -k profanity --threshold 0.10
+
+Each case is timed call by call for p50/p95/p99 latency and throughput,
+then run again under tracemalloc for its peak Python allocation (a separate
+pass, since tracing slows every call down). Like ``timeit``, every case is
+run ``--repeat`` times and the best round is kept, which filters out most
+scheduler noise. The models' verdict and result
+caches are disabled so the numbers describe the uncached path. Exits with
+status 1 when a case's p50, p95 or peak memory is more than ``threshold``
+worse than the baseline, or its throughput more than ``threshold`` lower.
+
+Baselines are only comparable on the machine that recorded them, so they
+and the per-run reports in ``benchmarks/results`` are not committed.
+"""
+
+import argparse
+import fnmatch
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+WARMUP = 20
+MEMORY_ITERATIONS = 20
+
+# Metric, and whether a larger value is worse
+COMPARED = [('p50_ms', True), ('p95_ms', True), ('throughput_per_s', False), ('peak_memory_kb', True)]
+
+
+def setup_django():
+    sys.path.insert(0, BASE_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'zapsync_ai.settings')
+    import django
+    from django.conf import settings
+
+    django.setup()
+    settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+    # Benchmark the models, not the caches in front of them
+    settings.PROFANITY_CACHE_SIZE = 0
+    settings.NLP_RESULT_CACHE = None
+
+
+def _check(result):
+    status = getattr(result, 'status_code', 200)
+    if status != 200:
+        raise RuntimeError(f"HTTP {status}: {result.content[:200]!r}")
+
+
+def measure(call, iterations):
+    for _ in range(min(WARMUP, iterations)):
+        _check(call())
+
+    timings = np.empty(iterations)
+    gc.collect()
+    started = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter_ns()
+        result = call()
+        timings[i] = time.perf_counter_ns() - t0
+        _check(result)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    for _ in range(min(MEMORY_ITERATIONS, iterations)):
+        call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings /= 1e6
+    return {
+        'iterations': iterations,
+        'mean_ms': round(float(timings.mean()), 4),
+        'p50_ms': round(float(np.percentile(timings, 50)), 4),
+        'p95_ms': round(float(np.percentile(timings, 95)), 4),
+        'p99_ms': round(float(np.percentile(timings, 99)), 4),
+        'throughput_per_s': round(iterations / elapsed, 2),
+        'peak_memory_kb': round(peak / 1024, 1)
+    }
+
+
+def best_of(rounds):
+    """Combine repeated rounds of one case, keeping each metric's best value"""
+    best = dict(rounds[0])
+    for metric in ('mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'peak_memory_kb'):
+        best[metric] = min(r[metric] for r in rounds)
+    best['throughput_per_s'] = max(r['throughput_per_s'] for r in rounds)
+    best['rounds'] = len(rounds)
+    return best
+
+
+def compare(results, baseline, threshold):
+    """Lines describing each regression past ``threshold`` (a fraction)"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric, larger_is_worse in COMPARED:
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old if larger_is_worse else (old - new) / old
+            if change > threshold:
+                regressions.append(f"{name}: {metric} {old} -> {new} ({change:.1%} worse)")
+    return regressions
+
+
+def print_table(results):
+    header = f"{'case':36} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>10} {'peak KB':>9}"
+    print(header)
+    print('-' * len(header))
+    for name, r in results.items():
+        print(f"{name:36} {r['p50_ms']:9.3f} {r['p95_ms']:9.3f} {r['p99_ms']:9.3f} "
+              f"{r['throughput_per_s']:10.1f} {r['peak_memory_kb']:9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ML service hot paths")
+    parser.add_argument('-k', '--filter', default='*', help="glob of case names to run")
+    parser.add_argument('--iterations', type=float, default=1.0,
+                        help="multiplier for each case's default iteration count")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="rounds per case; the best one is reported (default 3)")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="write this run's results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=0.20,
+                        help="allowed fractional regression before failing (default 0.20)")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client
+    from zapsync_ai.registry import registry
+    from zapsync_ai.registry import resident_memory
+    from cases import build_cases
+
+    cases = build_cases(registry.get('profanity'), registry.get('nlp'), Client())
+    selected = {name: case for name, case in cases.items() if fnmatch.fnmatch(name, args.filter)}
+    if not selected:
+        parser.error(f"No cases match {args.filter!r}: {', '.join(cases)}")
+
+    results = {}
+    for name, (call, iterations) in selected.items():
+        iterations = max(int(iterations * args.iterations), 1)
+        results[name] = best_of([measure(call, iterations) for _ in range(max(args.repeat, 1))])
+
+    report = {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+            'rss_bytes': resident_memory()
+        },
+        'results': results
+    }
+    print_table(results)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    with open(os.path.join(RESULTS_DIR, f'{stamp}.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"\nNo regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
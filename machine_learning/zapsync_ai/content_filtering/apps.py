@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class ContentFilteringConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'content_filtering'
+
+    def ready(self):
+        from zapsync_ai.registry import registry
+        registry.register(
+            'profanity',
+            'content_filtering.utils.ProfanityDetector',
+            warmup=lambda detector: detector.predict('warmup'),
+            probe='content_filtering.utils.probe_artifacts',
+            handover=lambda detector, previous: detector.inherit_cache(previous)
+        )
@@ -0,0 +1,98 @@
+"""
+Moderation feedback for the online profanity learner.
+
+/filter/feedback/ appends labeled texts to a SQLite log in WAL mode, which
+every worker on the host can write to while the learner
+(content_filtering/online.py) reads it. Events get increasing ids, so the
+learner only has to remember the last id it trained on.
+
+This module has no Django dependency so the learner can import it.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+
+def parse_events(events):
+    """[(text, label)] from feedback events, raising ValueError on bad input"""
+    parsed = []
+    for i, event in enumerate(events):
+        if not isinstance(event, dict):
+            raise ValueError(f"Event {i} is not an object")
+        text, label = event.get('text'), event.get('is_profane')
+        if not isinstance(text, str) or not text.strip():
+            raise ValueError(f"Event {i}: text must be a non-empty string")
+        if not isinstance(label, bool):
+            raise ValueError(f"Event {i}: is_profane must be true or false")
+        parsed.append((text, int(label)))
+    return parsed
+
+
+class FeedbackLog:
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS feedback ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, text TEXT NOT NULL, '
+            'label INTEGER NOT NULL, created_at REAL NOT NULL)'
+        )
+
+    def _connection(self):
+        """One connection per thread, reopened after a fork"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def append(self, events):
+        """Store (text, label) pairs; returns the id of the last one"""
+        now = time.time()
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(
+                'INSERT INTO feedback (text, label, created_at) VALUES (?, ?, ?)',
+                [(text, label, now) for text, label in events]
+            )
+            last_id = connection.execute('SELECT MAX(id) FROM feedback').fetchone()[0]
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return last_id
+
+    def read(self, after_id=0, limit=256):
+        """[(id, text, label)] of the events after ``after_id``, oldest first"""
+        return self._connection().execute(
+            'SELECT id, text, label FROM feedback WHERE id > ? ORDER BY id LIMIT ?',
+            (after_id, limit)
+        ).fetchall()
+
+    def stats(self):
+        total, profane, last_id = self._connection().execute(
+            'SELECT COUNT(*), COALESCE(SUM(label), 0), COALESCE(MAX(id), 0) FROM feedback'
+        ).fetchone()
+        return {'events': total, 'profane': profane, 'last_id': last_id}
+
+
+_log = None
+
+
+def get_feedback_log():
+    global _log
+    if _log is None:
+        from django.conf import settings
+
+        config = getattr(settings, 'PROFANITY_ONLINE_LEARNING', {})
+        _log = FeedbackLog(config.get(
+            'FEEDBACK_PATH', os.path.join(os.path.dirname(__file__), '..', 'feedback', 'profanity.sqlite3')
+        ))
+    return _log
@@ -0,0 +1,233 @@
+"""
+Online learning for the profanity model from moderation feedback.
+
+    python content_filtering/online.py           # follow the feedback log
+    python content_filtering/online.py --once    # train on what is there, publish and exit
+
+Texts are featurized with a HashingVectorizer, which has no vocabulary, so
+words never seen before get features without a refit. An SGDClassifier
+with logistic loss is updated with ``partial_fit`` on mini-batches of the
+events posted to /filter/feedback/. The first run starts the model from the
+training sheet.
+
+The learner's state is checkpointed every ``--checkpoint-every`` seconds,
+including the id of the last event it trained on, so a restart resumes
+where it stopped. Every ``--publish-every`` seconds, if there were updates,
+the weights are published as a new profanity release with pickles and a
+bundle, and serving processes hot-reload it. A release is held back when
+accuracy on the training sheet has dropped more than
+``--max-accuracy-drop`` below the bootstrapped model's, so a burst of bad
+feedback never reaches serving.
+"""
+
+import argparse
+import logging
+import os
+import re
+import sys
+import time
+from collections import deque
+
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+
+# Run as a script from any directory, importing the project's modules
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BASE_DIR)
+from content_filtering.feedback import FeedbackLog
+from zapsync_ai import bundles
+from zapsync_ai.artifacts import MODELS_DIR, new_release
+from zapsync_ai.dataset_cache import read_sheet
+
+logger = logging.getLogger('content_filtering.online')
+
+DATASET_PATH = os.path.join(BASE_DIR, 'datasets', 'profane_words.xlsx')
+DATASET_SHEET = 'Top 100 Profane Words used'
+FEEDBACK_PATH = os.path.join(BASE_DIR, 'feedback', 'profanity.sqlite3')
+CHECKPOINT_PATH = os.path.join(MODELS_DIR, 'online', 'profanity.joblib')
+CLASSES = np.array([0, 1])
+BOOTSTRAP_EPOCHS = 20
+RECENT_TEXTS = 1000
+
+
+def clean_text(text):
+    text = str(text).lower().strip()
+    text = re.sub(r"[^\w\s]", "", text)
+    return text
+
+
+def build_featurizer():
+    return HashingVectorizer(
+        n_features=2 ** 18,
+        ngram_range=(1, 2),
+        stop_words='english',
+        alternate_sign=False,
+        norm='l2'
+    )
+
+
+def build_classifier():
+    return SGDClassifier(loss='log_loss', alpha=1e-4, random_state=42)
+
+
+def load_reference():
+    """Cleaned texts and labels of the training sheet"""
+    data = read_sheet(DATASET_PATH, DATASET_SHEET)
+    return [clean_text(t) for t in data['Text']], data['Label'].to_numpy()
+
+
+class OnlineLearner:
+    def __init__(self, feedback, checkpoint_path=CHECKPOINT_PATH, batch_size=256):
+        self.feedback = feedback
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size
+        self.featurizer = build_featurizer()
+        self.classifier = None
+        self.last_id = 0
+        self.events = 0
+        self.reference_accuracy = None
+        # Updates not yet checkpointed / published
+        self.unsaved = 0
+        self.unpublished = 0
+        self.recent = deque(maxlen=RECENT_TEXTS)
+
+    def restore(self):
+        """Resume from the checkpoint; False if there is none"""
+        if not os.path.exists(self.checkpoint_path):
+            return False
+        state = joblib.load(self.checkpoint_path)
+        self.classifier = state['classifier']
+        self.last_id = state['last_id']
+        self.events = state['events']
+        self.reference_accuracy = state['reference_accuracy']
+        return True
+
+    def bootstrap(self, texts, labels, epochs=BOOTSTRAP_EPOCHS, seed=42):
+        """Start a new model from labeled texts, in shuffled passes of partial_fit"""
+        self.classifier = build_classifier()
+        X = self.featurizer.transform(texts)
+        labels = np.asarray(labels)
+        rng = np.random.default_rng(seed)
+        for _ in range(epochs):
+            order = rng.permutation(len(labels))
+            for start in range(0, len(order), self.batch_size):
+                batch = order[start:start + self.batch_size]
+                self.classifier.partial_fit(X[batch], labels[batch], classes=CLASSES)
+        self.reference_accuracy = self.accuracy(texts, labels)
+        self.unsaved = self.unpublished = len(labels)
+
+    def accuracy(self, texts, labels):
+        return float(np.mean(self.classifier.predict(self.featurizer.transform(texts)) == labels))
+
+    def step(self):
+        """Train on the next mini-batch of feedback; returns how many events it had"""
+        rows = self.feedback.read(self.last_id, self.batch_size)
+        if not rows:
+            return 0
+        texts = [clean_text(text) for _, text, _ in rows]
+        labels = np.array([label for _, _, label in rows])
+        self.classifier.partial_fit(self.featurizer.transform(texts), labels, classes=CLASSES)
+        self.recent.extend(texts)
+        self.last_id = rows[-1][0]
+        self.events += len(rows)
+        self.unsaved += len(rows)
+        self.unpublished += len(rows)
+        return len(rows)
+
+    def checkpoint(self):
+        os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+        tmp_path = self.checkpoint_path + '.tmp'
+        joblib.dump({
+            'classifier': self.classifier,
+            'last_id': self.last_id,
+            'events': self.events,
+            'reference_accuracy': self.reference_accuracy
+        }, tmp_path)
+        os.replace(tmp_path, self.checkpoint_path)
+        self.unsaved = 0
+
+    def publish(self, reference_texts, reference_labels, max_accuracy_drop):
+        """Publish the current weights as a profanity release, or None if held back"""
+        accuracy = self.accuracy(reference_texts, reference_labels)
+        if accuracy < self.reference_accuracy - max_accuracy_drop:
+            logger.warning(
+                "Holding back release: training sheet accuracy %.3f, bootstrapped at %.3f",
+                accuracy, self.reference_accuracy
+            )
+            return None
+        with new_release('profanity') as release:
+            joblib.dump(self.classifier, release.path('profane_model_v2.pkl'))
+            joblib.dump(self.featurizer, release.path('vectorizer_v2.pkl'))
+            bundles.export(release.path('profanity.bundle'), self.featurizer, self.classifier,
+                           check_texts=[*reference_texts, *self.recent])
+        self.unpublished = 0
+        logger.info("Published release %s after %d events (training sheet accuracy %.3f)",
+                    release.version, self.events, accuracy)
+        return release.version
+
+
+def run(learner, reference, once=False, poll_interval=2.0, checkpoint_every=30.0,
+        publish_every=300.0, max_accuracy_drop=0.05):
+    last_checkpoint = last_publish = time.monotonic()
+    try:
+        while True:
+            trained = learner.step()
+            idle = trained < learner.batch_size
+            now = time.monotonic()
+            if learner.unsaved and (now - last_checkpoint >= checkpoint_every or once and idle):
+                learner.checkpoint()
+                last_checkpoint = now
+            # Published weights are always checkpointed first, so a restart
+            # never goes back to weights older than the ones being served
+            if learner.unpublished and (now - last_publish >= publish_every or once and idle):
+                if learner.unsaved:
+                    learner.checkpoint()
+                    last_checkpoint = now
+                learner.publish(*reference, max_accuracy_drop)
+                last_publish = now
+            if idle:
+                if once:
+                    return
+                time.sleep(poll_interval)
+    finally:
+        if learner.unsaved:
+            learner.checkpoint()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the profanity model online from moderation feedback")
+    parser.add_argument('--feedback', default=FEEDBACK_PATH, help="feedback log written by /filter/feedback/")
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--poll-interval', type=float, default=2.0,
+                        help="seconds to wait for new feedback when the log is drained")
+    parser.add_argument('--checkpoint-every', type=float, default=30.0)
+    parser.add_argument('--publish-every', type=float, default=300.0)
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.05,
+                        help="hold back releases this much less accurate on the training sheet")
+    parser.add_argument('--once', action='store_true',
+                        help="train on the feedback logged so far, publish and exit")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    learner = OnlineLearner(FeedbackLog(args.feedback), args.checkpoint, args.batch_size)
+    reference = load_reference()
+    if learner.restore():
+        logger.info("Resuming after feedback event %d (%d events trained on)", learner.last_id, learner.events)
+    else:
+        learner.bootstrap(*reference)
+        logger.info("Bootstrapped from the training sheet, accuracy %.3f", learner.reference_accuracy)
+
+    try:
+        run(learner, reference, once=args.once, poll_interval=args.poll_interval,
+            checkpoint_every=args.checkpoint_every, publish_every=args.publish_every,
+            max_accuracy_drop=args.max_accuracy_drop)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
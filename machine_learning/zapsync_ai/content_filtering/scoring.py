@@ -0,0 +1,108 @@
+import math
+from collections import Counter
+
+import numpy as np
+from scipy.special import expit
+
+
+def _sigmoid(x):
+    if x >= 0:
+        return 1.0 / (1.0 + math.exp(-x))
+    z = math.exp(x)
+    return z / (1.0 + z)
+
+
+class LinearScorer:
+    """TF-IDF + binary logistic regression scored straight from its weights.
+
+    Scoring a text tokenizes it with the vectorizer's own analyzer, then sums
+    ``tf * idf * coef`` over the in-vocabulary terms, normalized the same way
+    as ``TfidfVectorizer``, so no sparse matrix is ever built. Terms are
+    looked up in the vectorizer's own vocabulary and the weights are read
+    from its ``idf_`` and the model's ``coef_``, so with a memory-mapped
+    bundle every worker scores from the same shared pages.
+    """
+
+    def __init__(self, vectorizer, model):
+        if getattr(vectorizer, 'norm', None) not in ('l2', None):
+            raise ValueError(f"Unsupported vectorizer norm: {vectorizer.norm}")
+        if len(model.classes_) != 2 or model.coef_.shape[0] != 1:
+            raise ValueError("Only binary linear models can be compiled")
+
+        self.analyzer = vectorizer.build_analyzer()
+        self.vocabulary = vectorizer.vocabulary_
+        self.norm = vectorizer.norm
+        self.binary = getattr(vectorizer, 'binary', False)
+        self.sublinear_tf = getattr(vectorizer, 'sublinear_tf', False)
+
+        self.coef = model.coef_[0]
+        idf = getattr(vectorizer, 'idf_', None)
+        self.idf = idf if idf is not None and getattr(vectorizer, 'use_idf', True) else None
+        self.intercept = float(model.intercept_[0])
+        self.baseline = _sigmoid(self.intercept)
+
+    def _columns(self, terms):
+        """Column of each term, -1 where it is not in the vocabulary"""
+        if hasattr(self.vocabulary, 'lookup'):
+            return self.vocabulary.lookup(terms)
+        return np.fromiter((self.vocabulary.get(t, -1) for t in terms), dtype=np.int64, count=len(terms))
+
+    def _idf(self, columns):
+        if self.idf is None:
+            return np.ones(len(columns))
+        return np.asarray(self.idf[columns], dtype=np.float64)
+
+    def _tf(self, counts):
+        counts = np.asarray(counts, dtype=np.float64)
+        if self.binary:
+            return np.ones_like(counts)
+        if self.sublinear_tf:
+            return 1.0 + np.log(counts)
+        return counts
+
+    def explain(self, text):
+        """Probability for ``text`` plus each matched term's logit contribution"""
+        counts = Counter(self.analyzer(text))
+        terms = list(counts)
+        columns = self._columns(terms)
+        known = np.flatnonzero(columns >= 0)
+        if not len(known):
+            return self.baseline, {}
+
+        columns = columns[known]
+        values = self._tf([counts[terms[i]] for i in known]) * self._idf(columns)
+        norm = math.sqrt(float(values @ values)) if self.norm == 'l2' else 1.0
+        if not norm:
+            contributions = np.zeros(len(values))
+        else:
+            contributions = values * np.asarray(self.coef[columns], dtype=np.float64) / norm
+        contributions = contributions.tolist()
+        logit = self.intercept + sum(contributions)
+        return _sigmoid(logit), {terms[i]: c for i, c in zip(known, contributions)}
+
+    def probability(self, text):
+        return self.explain(text)[0]
+
+    def word_probabilities(self, words):
+        """Probabilities for single lowercase words, each scored on its own"""
+        columns = self._columns(words)
+        known = np.flatnonzero(columns >= 0)
+        probabilities = np.full(len(words), self.baseline)
+        if len(known):
+            columns = columns[known]
+            values = self._tf(np.ones(len(known))) * self._idf(columns)
+            # A single term's l2 norm is its own absolute value
+            norms = np.abs(values) if self.norm == 'l2' else np.ones(len(values))
+            scale = np.divide(values, norms, out=np.zeros_like(values), where=norms != 0)
+            probabilities[known] = expit(self.intercept + scale * np.asarray(self.coef[columns], dtype=np.float64))
+        return probabilities.tolist()
+
+    def word_probability(self, word):
+        """Probability for a single lowercase word scored on its own"""
+        return self.word_probabilities([word])[0]
+
+    def max_deviation(self, vectorizer, model, texts):
+        """Largest absolute difference from sklearn's predict_proba on ``texts``"""
+        expected = model.predict_proba(vectorizer.transform(texts))[:, 1]
+        actual = np.array([self.probability(t) for t in texts])
+        return float(np.max(np.abs(expected - actual))) if len(texts) else 0.0
@@ -1,3 +1,211 @@
-from django.test import TestCase
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import joblib
+import numpy as np
+from django.test import SimpleTestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from zapsync_ai import bundles
+
+from . import utils, views
+from .feedback import FeedbackLog, parse_events
+from .scoring import LinearScorer
+from .utils import MAX_WORD_LENGTH, ProfanityDetector
+
+
+def _append_feedback(path, worker):
+    log = FeedbackLog(path)
+    for i in range(25):
+        log.append([(f'{worker}-{i}-{j}', j % 2) for j in range(4)])
+
+
+class ScanStreamTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.detector = ProfanityDetector()
+
+    def test_word_split_across_chunks_is_rejoined(self):
+        summary = self.detector.scan_stream([b'notes for this fu', b'ck week'])
+        self.assertTrue(summary['should_reject'])
+        self.assertEqual(summary['most_offensive_word']['word'], 'fuck')
+
+    def test_multibyte_character_split_across_chunks(self):
+        text = 'café notes'.encode('utf-8')
+        summary = self.detector.scan_stream([text[:4], text[4:]], summary_only=False)
+        words = [r['word'] for r in summary['detailed_results']]
+        self.assertEqual(words, ['café', 'notes'])
+
+    def test_matches_analyze_content(self):
+        text = 'damn this damn shit exam'
+        summary = self.detector.scan_stream([text])
+        analysis = self.detector.analyze_content(text)
+        self.assertEqual(summary['total_profane_words'], analysis['total_profane_words'])
+        self.assertEqual(summary['should_reject'], analysis['should_reject'])
+        self.assertAlmostEqual(summary['confidence'], analysis['confidence'])
+
+    def test_long_word_run_is_linear(self):
+        chunk = 'a' * (64 * 1024)
+        started = time.perf_counter()
+        summary = self.detector.scan_stream([chunk + ' ', chunk, chunk + '.'])
+        self.assertLess(time.perf_counter() - started, 1.0)
+        self.assertEqual(summary['words_scanned'], 3)
+        self.assertFalse(summary['should_reject'])
+
+    def test_trailing_word_up_to_max_length_is_carried(self):
+        word = 'b' * MAX_WORD_LENGTH
+        summary = self.detector.scan_stream([word[:10], word[10:]])
+        self.assertEqual(summary['words_scanned'], 1)
+
+
+class FeedbackLogTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'feedback.sqlite3')
+
+    def test_parse_events_validates_each_event(self):
+        self.assertEqual(parse_events([{'text': 'darn it', 'is_profane': True}]), [('darn it', 1)])
+        for event in ({'text': '  ', 'is_profane': False}, {'text': 'ok', 'is_profane': 1},
+                      {'text': 3, 'is_profane': False}, 'text'):
+            with self.subTest(event=event), self.assertRaises(ValueError):
+                parse_events([event])
+
+    def test_reads_events_after_an_id_in_order(self):
+        log = FeedbackLog(self.path)
+        first = log.append([('a', 0), ('b', 1)])
+        last = log.append([('c', 1)])
+        self.assertEqual(last, first + 1)
+        self.assertEqual([text for _, text, _ in log.read(0)], ['a', 'b', 'c'])
+        self.assertEqual(log.read(first), [(last, 'c', 1)])
+        self.assertEqual(log.read(0, limit=1)[0][1], 'a')
+        self.assertEqual(log.stats(), {'events': 3, 'profane': 2, 'last_id': last})
+
+    def test_concurrent_processes_keep_every_event(self):
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=_append_feedback, args=(self.path, w)) for w in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+
+        rows = FeedbackLog(self.path).read(0, limit=1000)
+        self.assertEqual(len(rows), 400)
+        self.assertEqual([row[0] for row in rows], list(range(1, 401)))
+        self.assertEqual({row[1] for row in rows}, {f'{w}-{i}-{j}' for w in range(4) for i in range(25) for j in range(4)})
+
+
+class FeedbackViewTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.log = FeedbackLog(os.path.join(directory, 'feedback.sqlite3'))
+        patcher = mock.patch.object(views, 'get_feedback_log', return_value=self.log)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, user=None, events=None):
+        request = APIRequestFactory().post(
+            '/filter/feedback/', {'events': events or [{'text': 'darn', 'is_profane': True}]}, format='json'
+        )
+        if user is not None:
+            force_authenticate(request, user=user)
+        return views.feedback(request)
+
+    def moderator(self, is_staff=False, groups=()):
+        names = set(groups)
+        group_query = lambda name: SimpleNamespace(exists=lambda: name in names)
+        return SimpleNamespace(
+            is_authenticated=True, is_active=True, is_staff=is_staff,
+            groups=SimpleNamespace(filter=lambda name: group_query(name))
+        )
+
+    def test_anonymous_requests_are_refused(self):
+        self.assertEqual(self.post().status_code, 403)
+        self.assertEqual(self.log.stats()['events'], 0)
+
+    def test_other_users_are_refused(self):
+        self.assertEqual(self.post(self.moderator(groups=['editors'])).status_code, 403)
+        self.assertEqual(self.log.stats()['events'], 0)
+
+    def test_moderators_and_staff_are_accepted(self):
+        response = self.post(self.moderator(groups=['moderators']))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['accepted'], 1)
+        self.assertEqual(self.post(self.moderator(is_staff=True)).status_code, 200)
+        self.assertEqual(self.log.stats()['events'], 2)
+
+    def test_invalid_events_are_rejected(self):
+        response = self.post(self.moderator(is_staff=True), events=[{'text': 'x', 'is_profane': 'yes'}])
+        self.assertEqual(response.status_code, 400)
+
+
+class PredictBatchViewTests(SimpleTestCase):
+    def post(self, data):
+        request = APIRequestFactory().post('/filter/predict_batch/', data, format='json')
+        with mock.patch.object(views, 'run_detector', return_value={'results': []}) as run:
+            return views.predict_batch(request), run
+
+    def test_stop_on_reject_must_be_a_boolean(self):
+        for value, expected in [(True, True), (False, False), ('false', False), ('TRUE', True)]:
+            with self.subTest(value=value):
+                response, run = self.post({'texts': ['hi'], 'stop_on_reject': value})
+                self.assertEqual(response.status_code, 200)
+                run.assert_called_once_with('predict_batch', ['hi'], stop_on_reject=expected)
+        for value in ('no', 'yes', 1, None, []):
+            with self.subTest(value=value):
+                response, run = self.post({'texts': ['hi'], 'stop_on_reject': value})
+                self.assertEqual(response.status_code, 400)
+                run.assert_not_called()
+
+
+class HashingReleaseTests(SimpleTestCase):
+    def test_disabled_fast_paths_are_reported(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        vectorizer = HashingVectorizer(n_features=2 ** 10, alternate_sign=False)
+        model = SGDClassifier(loss='log_loss', random_state=0)
+        model.partial_fit(vectorizer.transform(['darn it', 'lecture notes']), np.array([1, 0]), classes=[0, 1])
+        paths = [os.path.join(directory, name) for name in utils.MODEL_FILES]
+        joblib.dump(model, paths[0])
+        joblib.dump(vectorizer, paths[1])
+
+        with mock.patch.object(utils.artifacts, 'resolve', return_value=('online-1', paths)), \
+                self.assertLogs(utils.logger, 'WARNING') as logs:
+            detector = ProfanityDetector()
+        self.assertIn('hashing vectorizer', logs.output[0])
+        stats = detector.stats()
+        self.assertFalse(stats['compiled_scorer'])
+        self.assertIsNone(stats['vocabulary_index'])
+        self.assertIn('should_reject', detector.analyze_content('darn it all'))
+
+
+class LinearScorerTests(SimpleTestCase):
+    TEXTS = ['darn it all', 'lecture notes', 'darn lecture', 'week five notes darn darn', 'damn the exam']
+
+    def test_scores_a_bundle_from_its_arrays(self):
+        vectorizer = TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True).fit(self.TEXTS)
+        model = LogisticRegression().fit(vectorizer.transform(self.TEXTS), [1, 0, 1, 1, 0])
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        bundles.export(directory, vectorizer, model)
+        bundle = bundles.load(directory)
+
+        for vectorizer, model in [(vectorizer, model), (bundle.vectorizer, bundle.classifier)]:
+            scorer = LinearScorer(vectorizer, model)
+            texts = self.TEXTS + ['', 'unknown words only', 'darn ' * 20]
+            self.assertLess(scorer.max_deviation(vectorizer, model, texts), 1e-12)
+            words = ['darn', 'notes', 'unknown', 'lecture']
+            expected = model.predict_proba(vectorizer.transform(words))[:, 1]
+            np.testing.assert_allclose(scorer.word_probabilities(words), expected, atol=1e-12)
+            self.assertEqual(scorer.explain('darn it')[1].keys(), {'darn', 'darn it', 'it'} & set(vectorizer.vocabulary_))
+        self.assertIs(scorer.vocabulary, bundle.vectorizer.vocabulary_)
+        self.assertIsInstance(scorer.coef, np.memmap)
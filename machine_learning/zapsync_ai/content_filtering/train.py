@@ -1,18 +1,27 @@
 import pandas as pd
+import os
 import re
+import sys
 import joblib
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
 
+# Run as a script from any directory, importing the project's dataset cache
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BASE_DIR)
+from zapsync_ai import bundles
+from zapsync_ai.artifacts import new_release
+from zapsync_ai.dataset_cache import read_sheet
+
 def clean_text(text):
     text = str(text).lower().strip()
     text = re.sub(r"[^\w\s]", "", text)
     return text
 
 # Load and verify data
-data = pd.read_excel("../../datasets/profane_words.xlsx", sheet_name="Top 100 Profane Words used")
+data = read_sheet(os.path.join(BASE_DIR, "datasets", "profane_words.xlsx"), "Top 100 Profane Words used")
 print("Class distribution:")
 print(data["Label"].value_counts())
 
@@ -51,7 +60,12 @@ print("\nTest set performance:")
 y_pred = model.predict(X_test_vec)
 print(classification_report(y_test, y_pred))
 
-# Save artifacts
-joblib.dump(model, "../models/profane_model_v2.pkl")
-joblib.dump(vectorizer, "../models/vectorizer_v2.pkl")
-print("\n✅ Model and vectorizer saved successfully!")
\ No newline at end of file
+# Publish artifacts as a new release; running servers pick it up without a restart
+with new_release("profanity") as release:
+    joblib.dump(model, release.path("profane_model_v2.pkl"))
+    joblib.dump(vectorizer, release.path("vectorizer_v2.pkl"))
+    # Memory-mapped copy the server loads instead, checked against the pickles
+    check = bundles.export(release.path("profanity.bundle"), vectorizer, model,
+                           check_texts=data["clean_text"])["check"]
+    print(f"Bundle max deviation over {check['texts']} texts: {check['max_deviation']:.2g}")
+print(f"\n✅ Model and vectorizer saved successfully as release {release.version}!")
\ No newline at end of file
@@ -1,7 +1,12 @@
 # detector/urls.py
+from django.conf import settings
 from django.urls import path
-from .views import predict
+from .views import feedback, predict, predict_async, predict_batch, scan, stats
 
 urlpatterns = [
-    path('predict/', predict, name='predict'),
+    path('predict/', predict_async if settings.SERVING_MODE == 'asgi' else predict, name='predict'),
+    path('predict/batch/', predict_batch, name='predict_batch'),
+    path('scan/', scan, name='scan'),
+    path('feedback/', feedback, name='feedback'),
+    path('stats/', stats, name='filter_stats'),
 ]
\ No newline at end of file
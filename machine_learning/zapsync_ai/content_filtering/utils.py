@@ -1,27 +1,186 @@
 import os
+import time
+import codecs
+import threading
 import joblib
 import re
+import logging
+from collections import Counter
 from django.conf import settings
 from sklearn.exceptions import NotFittedError
+from zapsync_ai import artifacts, bundles
+from zapsync_ai.metrics import BATCH_SIZE, CACHE_LOOKUPS, STAGE_SECONDS
+from .cache import VerdictCache
+from .scoring import LinearScorer
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILES = ('profane_model_v2.pkl', 'vectorizer_v2.pkl')
+BUNDLE_DIR = 'profanity.bundle'
+SCORER_TOLERANCE = 1e-9
+WORD_PATTERN = re.compile(r'\b\w{3,}\b')
+MAX_WORD_LENGTH = 256
+# Only ever searched from MAX_WORD_LENGTH + 1 characters before the end, so a
+# long run of word characters cannot make the search quadratic
+TRAILING_WORD = re.compile(rf'\w{{0,{MAX_WORD_LENGTH + 1}}}\Z')
+
+LOOKUP_SECONDS = STAGE_SECONDS.labels('profanity', 'lookup')
+SCORE_SECONDS = STAGE_SECONDS.labels('profanity', 'score')
+CACHE_HITS = CACHE_LOOKUPS.labels('profanity', 'hit')
+CACHE_MISSES = CACHE_LOOKUPS.labels('profanity', 'miss')
+OOV_LOOKUPS = CACHE_LOOKUPS.labels('profanity', 'oov')
+
+
+def probe_artifacts():
+    """Registry hot-reload probe: changes when new profanity artifacts are published"""
+    return artifacts.probe('profanity', MODEL_FILES)
+
+
+def iter_chunks(stream, chunk_size):
+    """Yield fixed-size chunks read from a file-like object"""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+class VocabularyIndex:
+    """Membership index of every token that occurs in a vocabulary n-gram.
+
+    A text with no such token has an all-zero feature vector, so the model
+    can only return its baseline (intercept-only) probability for it.
+    """
+
+    def __init__(self, vectorizer, model):
+        if (vectorizer.analyzer != 'word' or vectorizer.tokenizer is not None
+                or vectorizer.preprocessor is not None or vectorizer.strip_accents is not None):
+            raise ValueError("Vectorizer uses custom text processing")
+        self.tokens = frozenset(
+            token for term in vectorizer.vocabulary_ for token in term.split(' ')
+        )
+        self.token_pattern = re.compile(vectorizer.token_pattern)
+        self.lowercase = vectorizer.lowercase
+        self.baseline = float(model.predict_proba(vectorizer.transform([''])).flat[1])
+        self.baseline_verdict = {
+            'is_profane': self.baseline > 0.5,
+            'confidence': self.baseline,
+            'should_reject': self.baseline > 0.5
+        }
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.short_circuited = 0
+
+    def is_oov(self, text):
+        if self.lowercase:
+            text = text.lower()
+        oov = not any(token in self.tokens for token in self.token_pattern.findall(text))
+        with self._lock:
+            self.checked += 1
+            self.short_circuited += oov
+        return oov
+
+    def stats(self):
+        with self._lock:
+            return {
+                'vocabulary_tokens': len(self.tokens),
+                'baseline_confidence': self.baseline,
+                'checked': self.checked,
+                'short_circuited': self.short_circuited,
+                'short_circuit_ratio': self.short_circuited / self.checked if self.checked else 0.0
+            }
 
-MODEL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'models'))
 
 class ProfanityDetector:
     def __init__(self):
+        self.cache = VerdictCache(getattr(settings, 'PROFANITY_CACHE_SIZE', 10000))
+        self._load_models()
+
+    def _load_models(self):
         try:
-            self.model = joblib.load(os.path.join(MODEL_DIR, 'profane_model_v2.pkl'))
-            self.vectorizer = joblib.load(os.path.join(MODEL_DIR, 'vectorizer_v2.pkl'))
-            self._verify_models()
+            version, (model_path, vectorizer_path) = artifacts.resolve('profanity', MODEL_FILES)
+            bundle_path = os.path.join(os.path.dirname(model_path), BUNDLE_DIR)
+            if getattr(settings, 'MODEL_BUNDLES', True) and bundles.exists(bundle_path):
+                bundle = bundles.load(bundle_path)
+                model, vectorizer = bundle.classifier, bundle.vectorizer
+                self.artifact_format = 'bundle'
+            else:
+                model = joblib.load(model_path)
+                vectorizer = joblib.load(vectorizer_path)
+                self.artifact_format = 'pickle'
+            self._verify_models(model, vectorizer)
+            self.model, self.vectorizer = model, vectorizer
+            self.scorer = self._compile_scorer(model, vectorizer)
+            self.vocab_index = self._build_vocabulary_index(model, vectorizer)
+            if not hasattr(vectorizer, 'vocabulary_'):
+                logger.warning(
+                    "Profanity release %s uses a hashing vectorizer: the compiled scorer and "
+                    "vocabulary index are disabled and every input is scored by sklearn", version
+                )
+            self.version = version
         except Exception as e:
             raise RuntimeError(f"Failed to load models: {str(e)}")
 
-    def _verify_models(self):
+    def inherit_cache(self, previous, limit=None):
+        """Re-score the previous detector's most recently used inputs with this model.
+
+        Called before a reloaded detector is swapped in, so it starts with
+        the same hot entries instead of a cold cache.
+        """
+        keys = previous.cache.recent_keys(limit or self.cache.max_size)
+        if keys:
+            self._score_cleaned(keys)
+        return len(keys)
+
+    @staticmethod
+    def _verify_models(model, vectorizer):
         """Verify models are properly loaded"""
-        if not hasattr(self.vectorizer, 'vocabulary_'):
+        # Hashing vectorizers (published by the online learner) are stateless
+        if not hasattr(vectorizer, 'vocabulary_') and not hasattr(vectorizer, 'n_features'):
             raise NotFittedError("Vectorizer missing vocabulary")
-        if not hasattr(self.model, 'classes_'):
+        if not hasattr(model, 'classes_'):
             raise NotFittedError("Model not properly trained")
 
+    @staticmethod
+    def _compile_scorer(model, vectorizer):
+        """Build the fast scoring path, or None if it does not match sklearn"""
+        if not hasattr(vectorizer, 'vocabulary_'):
+            return None  # Nothing to compile a term table from
+        try:
+            scorer = LinearScorer(vectorizer, model)
+            terms = sorted(vectorizer.vocabulary_)
+            probes = terms + [' '.join(terms[i:i + 3]) for i in range(0, len(terms), 3)]
+            probes += ['', 'lecture notes week 5', ' '.join(terms) + ' ' + terms[0]]
+            deviation = scorer.max_deviation(vectorizer, model, probes)
+        except Exception as e:
+            logger.warning("Compiled scorer unavailable, using sklearn: %s", e)
+            return None
+        if deviation > SCORER_TOLERANCE:
+            logger.warning("Compiled scorer deviates from sklearn by %g, using sklearn", deviation)
+            return None
+        return scorer
+
+    @staticmethod
+    def _build_vocabulary_index(model, vectorizer):
+        if not hasattr(vectorizer, 'vocabulary_'):
+            return None  # Every token has a feature under a hashing vectorizer
+        try:
+            return VocabularyIndex(vectorizer, model)
+        except Exception as e:
+            logger.warning("Vocabulary index unavailable, scoring every input: %s", e)
+            return None
+
+    def stats(self):
+        index = self.vocab_index
+        return {
+            'model_version': self.version,
+            'artifact_format': self.artifact_format,
+            'compiled_scorer': self.scorer is not None,
+            'verdict_cache': self.cache.stats(),
+            'vocabulary_index': index.stats() if index is not None else None,
+            'pid': os.getpid()
+        }
+
     @staticmethod
     def clean_text(text):
         text = str(text).lower().strip()
@@ -32,23 +191,29 @@ class ProfanityDetector:
         if not content.strip():
             return {"error": "Empty content"}
 
-        words = re.findall(r'\b\w{3,}\b', content.lower())
-        if not words:
-            return {"error": "No valid words found"}
+        with STAGE_SECONDS.time('profanity', 'tokenize'):
+            words = re.findall(r'\b\w{3,}\b', content.lower())
+            if not words:
+                return {"error": "No valid words found"}
 
-        word_counts = Counter(words)
-        cleaned_words = [self.clean_text(w) for w in set(words)]
-        
-        # Batch transform for better performance
-        X = self.vectorizer.transform(cleaned_words)
-        probas = self.model.predict_proba(X)[:, 1]
+            word_counts = Counter(words)
+            cleaned_words = [self.clean_text(w) for w in word_counts]
+
+        with STAGE_SECONDS.time('profanity', 'word_scores'):
+            probas = self._word_probabilities(cleaned_words)
+        if self.scorer is not None:
+            # The whole document is explained by the same compiled engine
+            with STAGE_SECONDS.time('profanity', 'explain'):
+                document_confidence, contributions = self.scorer.explain(content)
+        else:
+            document_confidence, contributions = None, {}
 
         results = [
             {
                 "word": word,
                 "count": word_counts[word],
                 "confidence": float(proba),
-                "is_profane": proba > threshold
+                "is_profane": bool(proba > threshold)
             }
             for word, proba in zip(cleaned_words, probas)
         ]
@@ -57,6 +222,7 @@ class ProfanityDetector:
         total_profane = sum(1 for r in results if r["confidence"] > threshold)
         max_confidence = max(r["confidence"] for r in results) if results else 0
         most_offensive = max(results, key=lambda x: x["confidence"]) if results else None
+        top_contributions = sorted(contributions.items(), key=lambda x: x[1], reverse=True)[:10]
 
         return {
             "words_analyzed": len(results),
@@ -64,19 +230,177 @@ class ProfanityDetector:
             "most_offensive_word": most_offensive,
             "should_reject": max_confidence > threshold,
             "confidence": max_confidence,
+            "document_confidence": document_confidence,
+            "token_contributions": [
+                {"token": token, "contribution": weight}
+                for token, weight in top_contributions
+            ],
             "detailed_results": results
         }
 
+    def scan_stream(self, chunks, threshold=0.5, summary_only=True):
+        """Scan a document delivered as an iterable of str/bytes chunks.
+
+        Words cut by a chunk boundary are carried over to the next chunk, and
+        the scan stops at the first word above ``threshold``. With
+        ``summary_only`` no per-word results are kept, so memory stays flat
+        no matter how large the document is. As in ``analyze_content``,
+        ``total_profane_words`` counts distinct words.
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        word_counts = None if summary_only else Counter()
+        summary = {
+            "bytes_scanned": 0,
+            "words_scanned": 0,
+            "total_profane_words": 0,
+            "most_offensive_word": None,
+            "should_reject": False,
+            "confidence": 0.0,
+            "stopped_early": False
+        }
+        carry = ''
+        profane_words = set()
+
+        def scan_text(text):
+            words = WORD_PATTERN.findall(text)
+            if not words:
+                return False
+            unique = list(dict.fromkeys(words))
+            scores = dict(zip(unique, self._word_probabilities(unique)))
+            for word, proba in scores.items():
+                if proba > summary["confidence"]:
+                    summary["confidence"] = float(proba)
+                    summary["most_offensive_word"] = {"word": word, "confidence": float(proba)}
+            summary["words_scanned"] += len(words)
+            profane_words.update(w for w, proba in scores.items() if proba > threshold)
+            summary["total_profane_words"] = len(profane_words)
+            if word_counts is not None:
+                word_counts.update(words)
+            summary["should_reject"] = summary["confidence"] > threshold
+            return summary["should_reject"]
+
+        for chunk in chunks:
+            if isinstance(chunk, bytes):
+                summary["bytes_scanned"] += len(chunk)
+                chunk = decoder.decode(chunk)
+            else:
+                summary["bytes_scanned"] += len(chunk.encode('utf-8'))
+            text = carry + chunk.lower()
+            # Hold back a trailing partial word unless it is absurdly long
+            tail = TRAILING_WORD.search(text, max(len(text) - MAX_WORD_LENGTH - 1, 0))
+            cut = tail.start() if tail.end() - tail.start() <= MAX_WORD_LENGTH else len(text)
+            carry = text[cut:]
+            if scan_text(text[:cut]):
+                summary["stopped_early"] = True
+                break
+        else:
+            scan_text(carry + decoder.decode(b'', final=True).lower())
+
+        if word_counts is not None:
+            cleaned_words = list(word_counts)
+            summary["detailed_results"] = [
+                {
+                    "word": word,
+                    "count": word_counts[word],
+                    "confidence": float(proba),
+                    "is_profane": bool(proba > threshold)
+                }
+                for word, proba in zip(cleaned_words, self._word_probabilities(cleaned_words))
+            ]
+        return summary
+
     def predict(self, text):
         """Simplified version for single word checks"""
         try:
-            cleaned = self.clean_text(text)
-            X = self.vectorizer.transform([cleaned])
-            proba = self.model.predict_proba(X)[0][1]
+            return dict(self._score_cleaned([self.clean_text(text)])[0])
+        except Exception as e:
+            raise RuntimeError(f"Prediction failed: {str(e)}")
+
+    def _probabilities(self, cleaned):
+        """Profane-class probabilities, through the compiled scorer when available"""
+        if self.scorer is not None:
+            return [self.scorer.probability(c) for c in cleaned]
+        X = self.vectorizer.transform(cleaned)
+        return self.model.predict_proba(X)[:, 1]
+
+    def _word_probabilities(self, words):
+        """Probabilities for single words, from the term table when compiled"""
+        if self.scorer is not None:
+            return self.scorer.word_probabilities(words)
+        return [v['confidence'] for v in self._score_cleaned(words)]
+
+    def _score_cleaned(self, cleaned):
+        """Verdicts for already cleaned texts.
+
+        Out-of-vocabulary texts get the baseline verdict straight from the
+        vocabulary index, then the cache is consulted, and only the
+        remaining misses are scored by the model.
+        """
+        index = self.vocab_index
+        started = time.perf_counter()
+        verdicts = [
+            index.baseline_verdict if index is not None and index.is_oov(c) else self.cache.get(c)
+            for c in cleaned
+        ]
+        misses = [i for i, v in enumerate(verdicts) if v is None]
+        LOOKUP_SECONDS.observe(time.perf_counter() - started)
+
+        oov = sum(1 for v in verdicts if v is index.baseline_verdict) if index is not None else 0
+        if oov:
+            OOV_LOOKUPS.inc(oov)
+        if len(verdicts) > oov + len(misses):
+            CACHE_HITS.inc(len(verdicts) - oov - len(misses))
+
+        if misses:
+            CACHE_MISSES.inc(len(misses))
+            started = time.perf_counter()
+            probas = self._probabilities([cleaned[i] for i in misses])
+            SCORE_SECONDS.observe(time.perf_counter() - started)
+            for i, proba in zip(misses, probas):
+                verdicts[i] = {
+                    'is_profane': bool(proba > 0.5),
+                    'confidence': float(proba),
+                    'should_reject': bool(proba > 0.5)
+                }
+                self.cache.put(cleaned[i], verdicts[i])
+
+        return verdicts
+
+    def predict_batch(self, texts, stop_on_reject=False, chunk_size=256):
+        """Score a list of texts with one transform/predict_proba pass.
+
+        With ``stop_on_reject`` the list is scored in chunks and scoring stops
+        at the first rejected item, which is returned as ``first_rejected``.
+        """
+        try:
+            BATCH_SIZE.observe(len(texts), 'profanity', 'predict_batch')
+            with STAGE_SECONDS.time('profanity', 'clean'):
+                cleaned = [self.clean_text(t) for t in texts]
+            step = chunk_size if stop_on_reject else max(len(cleaned), 1)
+            results = []
+            first_rejected = None
+
+            for start in range(0, len(cleaned), step):
+                verdicts = self._score_cleaned(cleaned[start:start + step])
+                for offset, verdict in enumerate(verdicts):
+                    results.append({'text': texts[start + offset], **verdict})
+                    if stop_on_reject and verdict['should_reject']:
+                        first_rejected = {'index': start + offset, **results[-1]}
+                        break
+                if first_rejected:
+                    break
+
+            if first_rejected is None:
+                first_rejected = next(
+                    ({'index': i, **r} for i, r in enumerate(results) if r['should_reject']),
+                    None
+                )
+
             return {
-                'is_profane': bool(self.model.predict(X)[0]),
-                'confidence': float(proba),
-                'should_reject': proba > 0.5
+                'items_checked': len(results),
+                'should_reject': first_rejected is not None,
+                'first_rejected': first_rejected,
+                'results': results
             }
         except Exception as e:
-            raise RuntimeError(f"Prediction failed: {str(e)}")
\ No newline at end of file
+            raise RuntimeError(f"Batch prediction failed: {str(e)}")
@@ -1,10 +1,51 @@
 # detector/views.py
-from rest_framework.decorators import api_view
+import json
+from asgiref.sync import sync_to_async
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import BasePermission
 from rest_framework.response import Response
 from rest_framework import status
-from .utils import ProfanityDetector
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from zapsync_ai.batching import build_batcher
+from zapsync_ai.executor import get_executor
+from zapsync_ai.registry import registry
+from .feedback import get_feedback_log, parse_events
+from .utils import iter_chunks
+
+
+def get_detector():
+    return registry.get('profanity')
+
+
+class IsModerator(BasePermission):
+    """Staff, or members of the PROFANITY_ONLINE_LEARNING moderator group"""
+
+    def has_permission(self, request, view):
+        user = request.user
+        if not (user and user.is_authenticated):
+            return False
+        group = getattr(settings, 'PROFANITY_ONLINE_LEARNING', {}).get('MODERATOR_GROUP', 'moderators')
+        return user.is_staff or user.groups.filter(name=group).exists()
+
+
+def run_detector(method, *args, **kwargs):
+    """Call a ProfanityDetector method through the configured inference executor"""
+    return get_executor().run('profanity', method, *args, **kwargs)
+
+
+def _predict_many(texts):
+    """Verdicts shaped like ProfanityDetector.predict, for a whole batch"""
+    return [
+        {key: value for key, value in result.items() if key != 'text'}
+        for result in run_detector('predict_batch', texts)['results']
+    ]
+
+
+predict_batcher = build_batcher(_predict_many)
 
-detector = ProfanityDetector()
 
 @api_view(['POST'])
 def predict(request):
@@ -19,9 +60,9 @@ def predict(request):
     
     try:
         if analysis_type == 'full':
-            result = detector.analyze_content(text)
+            result = run_detector('analyze_content', text)
         else:
-            result = detector.predict(text)
+            result = run_detector('predict', text)
         
         return Response(result)
     
@@ -29,4 +70,149 @@ def predict(request):
         return Response(
             {'error': str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+@csrf_exempt
+@require_POST
+async def predict_async(request):
+    """ASGI variant of predict: concurrent word checks share one model call"""
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=status.HTTP_400_BAD_REQUEST)
+
+    text = data.get('text', '')
+    analysis_type = data.get('type', 'word')  # 'word' or 'full'
+
+    if not text:
+        return JsonResponse(
+            {'error': 'Text parameter is required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        if analysis_type == 'full':
+            result = await sync_to_async(run_detector, thread_sensitive=False)(
+                'analyze_content', text
+            )
+        else:
+            result = await predict_batcher.submit(text)
+
+        return JsonResponse(result)
+
+    except Exception as e:
+        return JsonResponse(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['POST'])
+def predict_batch(request):
+    texts = request.data.get('texts', [])
+    stop_on_reject = request.data.get('stop_on_reject', False)
+    # Form-encoded requests can only send it as text
+    if isinstance(stop_on_reject, str) and stop_on_reject.lower() in ('true', 'false'):
+        stop_on_reject = stop_on_reject.lower() == 'true'
+
+    if not isinstance(stop_on_reject, bool):
+        return Response(
+            {'error': 'stop_on_reject must be true or false'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not isinstance(texts, list) or not texts:
+        return Response(
+            {'error': 'texts must be a non-empty list'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not all(isinstance(t, str) for t in texts):
+        return Response(
+            {'error': 'texts must only contain strings'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        return Response(run_detector('predict_batch', texts, stop_on_reject=stop_on_reject))
+
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['POST'])
+def scan(request):
+    """
+    Stream a large text upload through the filter chunk by chunk.
+    Accepts a multipart 'file' field or a raw request body; pass
+    ?summary_only=false to get per-word results as well.
+    """
+    summary_only = request.query_params.get('summary_only', 'true').lower() != 'false'
+    chunk_size = getattr(settings, 'PROFANITY_SCAN_CHUNK_SIZE', 64 * 1024)
+
+    if request.content_type.startswith('multipart/'):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {'error': 'file field is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        chunks = upload.chunks(chunk_size)
+    elif request.stream is not None:
+        chunks = iter_chunks(request.stream, chunk_size)
+    else:
+        return Response(
+            {'error': 'Request body is required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        return Response(get_detector().scan_stream(chunks, summary_only=summary_only))
+
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['POST'])
+@permission_classes([IsModerator])
+def feedback(request):
+    """Record moderation verdicts ({"events": [{"text", "is_profane"}]}) for the online learner"""
+    events = request.data.get('events')
+    if not isinstance(events, list) or not events:
+        return Response(
+            {'error': 'events must be a non-empty list of feedback events'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    max_events = getattr(settings, 'PROFANITY_ONLINE_LEARNING', {}).get('MAX_EVENTS_PER_REQUEST', 1000)
+    if len(events) > max_events:
+        return Response(
+            {'error': f'At most {max_events} events per request'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        last_id = get_feedback_log().append(parse_events(events))
+        return Response({'accepted': len(events), 'last_id': last_id})
+
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['GET'])
+def stats(request):
+    return Response({
+        **run_detector('stats'),
+        'micro_batching': predict_batcher.stats(),
+        'executor': get_executor().stats()
+    })
@@ -0,0 +1,13 @@
+# gunicorn -c gunicorn.conf.py zapsync_ai.wsgi
+#
+# The app (and with it every model in the registry) is imported once in the
+# master, then forked, so all workers share the model pages copy-on-write.
+import os
+
+os.environ.setdefault('ZAPSYNC_PRELOAD_MODELS', '1')
+
+preload_app = True
+workers = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 2))
+# Each worker starts its own inference pool, sized from this
+os.environ['ZAPSYNC_SERVER_WORKERS'] = str(workers)
+bind = os.environ.get('BIND', '0.0.0.0:8000')
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class NlpConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'nlp'
+
+    def ready(self):
+        from zapsync_ai.registry import registry
+        registry.register(
+            'nlp',
+            'nlp.utils.NLPPredictor',
+            warmup=lambda predictor: predictor.predict('warmup lecture notes.pdf'),
+            probe='nlp.utils.probe_artifacts'
+        )
+        registry.register('search_index', 'nlp.search.load_search_index')
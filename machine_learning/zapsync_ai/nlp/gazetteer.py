@@ -0,0 +1,95 @@
+import json
+import os
+import re
+import threading
+import time
+
+from .matcher import AhoCorasick
+
+NORMALIZE_PATTERN = re.compile(r'[\W_]+')
+MAX_WEEK = 53
+
+
+def normalize(text):
+    """Lowercase and collapse punctuation/underscores/whitespace to single spaces"""
+    return NORMALIZE_PATTERN.sub(' ', str(text).lower()).strip()
+
+
+def load_entries(path):
+    """Read ``{category: [name | {"name", "aliases"}]}`` into {pattern: (category, name)}"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    entries = {}
+    for category, names in data.items():
+        for entry in names:
+            if isinstance(entry, str):
+                entry = {'name': entry}
+            for alias in [entry['name'], *entry.get('aliases', [])]:
+                pattern = normalize(alias)
+                if pattern:
+                    entries[pattern] = (category, entry['name'])
+    return entries
+
+
+def week_entries():
+    entries = {}
+    for week in range(1, MAX_WEEK + 1):
+        for pattern in (f'week {week}', f'week{week}', f'week {week:02d}', f'week{week:02d}'):
+            entries[pattern] = ('weeks', f'Week {week}')
+    return entries
+
+
+class Gazetteer:
+    """Known courses, lecturers, semesters and weeks, matched in one pass.
+
+    Names come from a JSON data file and are compiled into a single
+    Aho-Corasick automaton over normalized text. When the file changes only
+    the added and removed names are applied to the automaton, as one batch
+    with a single rebuild.
+    """
+
+    def __init__(self, path, check_interval=5):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._matcher = AhoCorasick()
+        self._entries = {}
+        self._mtime = None
+        self._apply(week_entries())
+        self._load()
+
+    def _apply(self, entries):
+        """Bring the automaton in line with ``entries``, touching only the differences"""
+        self._matcher.update(
+            add={pattern: value for pattern, value in entries.items() if self._entries.get(pattern) != value},
+            remove=self._entries.keys() - entries.keys()
+        )
+        self._entries = dict(entries)
+
+    def _load(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        self._apply({**week_entries(), **load_entries(self.path)})
+        self._mtime = mtime
+        self._last_check = time.monotonic()
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            self._last_check = now
+            try:
+                if force or os.stat(self.path).st_mtime_ns != self._mtime:
+                    self._load()
+            except (OSError, ValueError, KeyError):
+                pass  # Keep the current names while the file is missing or malformed
+
+    def __len__(self):
+        return len(self._matcher)
+
+    def find(self, text):
+        """``[(category, name), ...]`` in order of appearance"""
+        self.refresh()
+        with self._lock:
+            return [value for _, _, value in self._matcher.find_words(normalize(text))]
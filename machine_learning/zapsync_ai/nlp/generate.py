@@ -1,22 +1,43 @@
+import argparse
+import os
+import sys
+import numpy as np
 import pandas as pd
 import random
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from faker import Faker
+from faker.providers.lorem.en_US import Provider as LoremProvider
+
+# Run as a script from any directory, importing the project's dataset cache
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from zapsync_ai.dataset_cache import read_sheet
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'datasets', 'file_metadata.xlsx')
 
 # Initialize faker for realistic data generation
 fake = Faker()
 
+# Common patterns from your existing data
+NAME_PREFIXES = ['Lecture', 'Slide', 'Assignment', 'Exam', 'Note', 'Research', 
+                 'Project', 'Exercise', 'Tutorial', 'Lab']
+ACADEMIC_TERMS = ['CS101', 'MATH202', 'PHYS301', 'COMPSCI401', 'ALGORITHMS', 
+                  'DATABASE', 'CALCULUS', 'STATISTICS', 'AI', 'ML']
+PEOPLE_NAMES = ['Dr Partey', 'Prof Smith', 'Dr Johnson', 'Prof Lee', 'Dr Brown']
+NAME_STATUSES = ['Final', 'Draft', 'Solution']
+TAGS = ['', 'important', 'draft', 'final', 'review', 'confidential']
+# (low, high) KB of the small, medium and large files, picked with equal odds
+SIZE_RANGES = [(0.1, 100), (100, 1000), (1000, 5000)]
+CREATED_FORMAT = '%m/%d/%Y, %I:%M:%S %p'
+
 def generate_synthetic_data(existing_files, existing_folders, num_files=200, num_folders=20):
     # Analyze existing data patterns
     existing_file_types = existing_files['Type'].value_counts().to_dict()
     existing_folder_names = existing_folders['Name'].tolist()
     
-    # Common patterns from your existing data
-    name_prefixes = ['Lecture', 'Slide', 'Assignment', 'Exam', 'Note', 'Research', 
-                    'Project', 'Exercise', 'Tutorial', 'Lab']
-    academic_terms = ['CS101', 'MATH202', 'PHYS301', 'COMPSCI401', 'ALGORITHMS', 
-                     'DATABASE', 'CALCULUS', 'STATISTICS', 'AI', 'ML']
-    people_names = ['Dr Partey', 'Prof Smith', 'Dr Johnson', 'Prof Lee', 'Dr Brown']
+    name_prefixes = NAME_PREFIXES
+    academic_terms = ACADEMIC_TERMS
+    people_names = PEOPLE_NAMES
     
     # Generate new folders
     new_folders = []
@@ -51,7 +72,7 @@ def generate_synthetic_data(existing_files, existing_folders, num_files=200, num
                 random.choice(name_prefixes),
                 random.choice(['', str(random.randint(1, 10))]),
                 random.choice(['', random.choice(academic_terms)]),
-                random.choice(['', random.choice(['Final', 'Draft', 'Solution'])]),
+                random.choice(['', random.choice(NAME_STATUSES)]),
                 f".{file_type.lower()}"
             ]
             file_name = '_'.join(filter(None, name_parts)).replace(' ', '')
@@ -69,16 +90,152 @@ def generate_synthetic_data(existing_files, existing_folders, num_files=200, num
             'Name': file_name,
             'Type': file_type,
             'Size (KB)': size_kb,
-            'Tags': random.choice(['', 'important', 'draft', 'final', 'review', 'confidential']),
+            'Tags': random.choice(TAGS),
             'Created': fake.date_time_between(start_date='-1y', end_date='now').strftime('%m/%d/%Y, %I:%M:%S %p')
         })
     
     return pd.DataFrame(new_files), pd.DataFrame(new_folders)
 
+def catalog_spec(existing_files):
+    """What the block generator needs from the real data: the file type
+    distribution and a fixed end date for the 'Created' range, so the same
+    seed gives the same catalog on any day"""
+    type_counts = existing_files['Type'].value_counts()
+    created = pd.to_datetime(existing_files['Created'], format='mixed', errors='coerce')
+    return {
+        'types': type_counts.index.tolist(),
+        'type_weights': (type_counts / type_counts.sum()).tolist(),
+        'end': created.max().to_datetime64() if created.notna().any() else np.datetime64('2025-01-01')
+    }
+
+def _pick(rng, options, size):
+    return np.asarray(options, dtype=object)[rng.integers(0, len(options), size=size)]
+
+def _optional(rng, options, size):
+    """random.choice(['', random.choice(options)]) for a whole column"""
+    values = _pick(rng, options, size)
+    values[rng.random(size) < 0.5] = ''
+    return values
+
+def _time_strings():
+    """'%I:%M:%S %p' for every second of a day, indexed by seconds since midnight"""
+    return np.array([
+        f"{(s // 3600) % 12 or 12:02d}:{s // 60 % 60:02d}:{s % 60:02d} {'AM' if s < 43200 else 'PM'}"
+        for s in range(86400)
+    ], dtype=object)
+
+def generate_catalog_block(spec, seed_sequence, rows):
+    """``rows`` synthetic files drawn column by column with the same
+    distributions as generate_synthetic_data"""
+    rng = np.random.default_rng(seed_sequence)
+    type_index = rng.choice(len(spec['types']), size=rows, p=spec['type_weights'])
+    types = np.asarray(spec['types'], dtype=object)[type_index]
+    extensions = np.asarray([t.lower() for t in spec['types']], dtype=object)[type_index]
+
+    # 70% academic-style names: non-empty parts joined by '_', then the extension
+    academic = _pick(rng, NAME_PREFIXES, rows)
+    for part in (_optional(rng, [str(n) for n in range(1, 11)], rows),
+                 _optional(rng, ACADEMIC_TERMS, rows),
+                 _optional(rng, NAME_STATUSES, rows)):
+        academic = academic + np.where(part != '', '_', '').astype(object) + part
+    academic = academic + '_.' + np.char.replace(extensions.astype(str), ' ', '').astype(object)
+    # 30% generic word_word names
+    generic = (_pick(rng, LoremProvider.word_list, rows) + '_'
+               + _pick(rng, LoremProvider.word_list, rows) + '.' + extensions)
+    names = np.where(rng.random(rows) < 0.7, academic, generic)
+
+    ranges = np.asarray(SIZE_RANGES)[rng.integers(0, len(SIZE_RANGES), size=rows)]
+    sizes = np.round(rng.uniform(ranges[:, 0], ranges[:, 1]))
+
+    # Uniform over the year before spec['end'], formatted via per-day and
+    # per-second lookup tables instead of one strftime per row
+    end = spec['end'].astype('datetime64[s]')
+    created = end - (rng.random(rows) * 365 * 86400).astype('timedelta64[s]')
+    days = created.astype('datetime64[D]')
+    first_day = end.astype('datetime64[D]') - 366
+    day_strings = pd.Series(np.arange(first_day, first_day + 367)).dt.strftime('%m/%d/%Y, ')
+    day_strings = day_strings.to_numpy(dtype=object)
+    seconds = (created - days).astype(np.int64)
+    created = day_strings[(days - first_day).astype(np.int64)] + TIME_STRINGS[seconds]
+
+    return pd.DataFrame({
+        'Name': names,
+        'Type': types,
+        'Size (KB)': sizes,
+        'Tags': _pick(rng, TAGS, rows),
+        'Created': created
+    })
+
+TIME_STRINGS = _time_strings()
+
+def _block_tasks(spec, rows, seed, chunk_size):
+    # One child seed per block, so a block's contents do not depend on which
+    # process generates it
+    blocks = range(0, rows, chunk_size)
+    children = np.random.SeedSequence(seed).spawn(len(blocks))
+    return [(spec, child, min(chunk_size, rows - start)) for start, child in zip(blocks, children)]
+
+def _generate_task(task):
+    return generate_catalog_block(*task)
+
+def iter_catalog(spec, rows, seed=42, chunk_size=100000, workers=1):
+    """Yield the catalog in order as DataFrames of ``chunk_size`` rows; at
+    most ``2 * workers`` blocks are in memory at once"""
+    tasks = _block_tasks(spec, rows, seed, chunk_size)
+    if workers <= 1:
+        for task in tasks:
+            yield _generate_task(task)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for task in tasks:
+            pending.append(pool.submit(_generate_task, task))
+            if len(pending) >= 2 * workers:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+def write_catalog(path, chunks, fmt='csv'):
+    """Stream chunks to one CSV or Parquet file; returns the rows written"""
+    written = 0
+    if fmt == 'parquet':
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)")
+
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+                written += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+        return written
+
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        for chunk in chunks:
+            chunk.to_csv(f, header=written == 0, index=False)
+            written += len(chunk)
+    return written
+
+def generate_catalog(args):
+    existing_files = read_sheet(DATASET_PATH, 'Files', columns=['Type', 'Created'])
+    spec = catalog_spec(existing_files)
+    chunks = iter_catalog(spec, args.rows, seed=args.seed, chunk_size=args.chunk_size, workers=args.workers)
+    written = write_catalog(args.output, chunks, fmt=args.format)
+    print(f"Wrote {written} synthetic files to {args.output}")
+
 def main():
     # Load existing data
-    existing_files = pd.read_excel('../datasets/file_metadata.xlsx', sheet_name='Files')
-    existing_folders = pd.read_excel('../datasets/file_metadata.xlsx', sheet_name='Folders')
+    existing_files = read_sheet(DATASET_PATH, 'Files')
+    existing_folders = read_sheet(DATASET_PATH, 'Folders')
     
     # Generate synthetic data
     new_files, new_folders = generate_synthetic_data(existing_files, existing_folders)
@@ -88,11 +245,25 @@ def main():
     combined_folders = pd.concat([existing_folders, new_folders], ignore_index=True)
     
     # Save back to Excel
-    with pd.ExcelWriter('../datasets/file_metadata.xlsx', engine='openpyxl') as writer:
+    with pd.ExcelWriter(DATASET_PATH, engine='openpyxl') as writer:
         combined_files.to_excel(writer, sheet_name='Files', index=False)
         combined_folders.to_excel(writer, sheet_name='Folders', index=False)
     
     print(f"Added {len(new_files)} new files and {len(new_folders)} new folders to the dataset.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate synthetic file metadata")
+    parser.add_argument('--rows', type=int,
+                        help="stream a catalog of this many files to --output instead of "
+                             "appending to the Excel dataset")
+    parser.add_argument('--output', default='synthetic_catalog.csv')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-size', type=int, default=100000,
+                        help="rows per block; part of what the seed reproduces")
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+    if args.rows:
+        generate_catalog(args)
+    else:
+        main()
\ No newline at end of file
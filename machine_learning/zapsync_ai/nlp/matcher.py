@@ -0,0 +1,146 @@
+from collections import deque
+
+
+class AhoCorasick:
+    """Multi-pattern string matcher (Aho-Corasick automaton).
+
+    Every occurrence of every pattern is found in one pass over the text, so
+    the cost depends on the text length, not on how many patterns there are.
+    Patterns can be added and removed at any time; the failure links are
+    rebuilt lazily on the next search, or right away by ``update``, which
+    applies a whole batch of edits first. Nodes that only removed patterns
+    used are dropped by the rebuild.
+    """
+
+    def __init__(self, patterns=None):
+        self._goto = [{}]
+        self._values = [None]
+        self._depth = [0]
+        self._fail = [0]
+        self._outputs = [()]
+        self._dirty = False
+        self._size = 0
+        for pattern, value in (patterns or {}).items():
+            self.add(pattern, value)
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, pattern):
+        node = self._find_node(pattern)
+        return node is not None and self._values[node] is not None
+
+    def _find_node(self, pattern):
+        node = 0
+        for char in pattern:
+            node = self._goto[node].get(char)
+            if node is None:
+                return None
+        return node
+
+    def add(self, pattern, value=None):
+        """Add ``pattern``; ``value`` (default: the pattern) is reported on match"""
+        if not pattern:
+            return
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto.append({})
+                self._values.append(None)
+                self._depth.append(self._depth[node] + 1)
+                self._fail.append(0)
+                self._outputs.append(())
+                self._goto[node][char] = next_node
+            node = next_node
+        if self._values[node] is None:
+            self._size += 1
+        self._values[node] = (pattern if value is None else value,)
+        self._dirty = True
+
+    def remove(self, pattern):
+        path = [0]
+        for char in pattern:
+            node = self._goto[path[-1]].get(char)
+            if node is None:
+                return
+            path.append(node)
+        if len(path) == 1 or self._values[path[-1]] is None:
+            return
+        self._values[path[-1]] = None
+        self._size -= 1
+        self._dirty = True
+        # Unlink the nodes only this pattern used; the next build drops them
+        for depth in range(len(pattern), 0, -1):
+            node = path[depth]
+            if self._goto[node] or self._values[node] is not None:
+                break
+            del self._goto[path[depth - 1]][pattern[depth - 1]]
+
+    def update(self, add=None, remove=()):
+        """Apply a batch of edits, then rebuild once so no search pays for it"""
+        for pattern in remove:
+            self.remove(pattern)
+        for pattern, value in (add or {}).items():
+            self.add(pattern, value)
+        if self._dirty:
+            self._build()
+
+    def _build(self):
+        """Renumber the reachable nodes breadth first and recompute failure links and outputs"""
+        old_goto, old_values = self._goto, self._values
+        goto, values, depth = [{}], [None], [0]
+        queue = deque([(0, 0)])
+        while queue:
+            old, new = queue.popleft()
+            for char, child in old_goto[old].items():
+                goto[new][char] = len(goto)
+                goto.append({})
+                values.append(old_values[child])
+                depth.append(depth[new] + 1)
+                queue.append((child, len(goto) - 1))
+
+        # In breadth-first order a node's failure target (which is shallower)
+        # always comes before it, so one pass in index order is enough
+        fail = [0] * len(goto)
+        outputs = [()] * len(goto)
+        for node, children in enumerate(goto):
+            if node:
+                own = ((depth[node], values[node][0]),) if values[node] else ()
+                outputs[node] = own + outputs[fail[node]]
+                for char, child in children.items():
+                    state = fail[node]
+                    while state and char not in goto[state]:
+                        state = fail[state]
+                    fail[child] = goto[state].get(char, 0)
+        self._goto, self._values, self._depth, self._fail, self._outputs = goto, values, depth, fail, outputs
+        self._dirty = False
+
+    def iter_matches(self, text):
+        """Yield ``(start, end, value)`` for every occurrence in ``text``"""
+        if self._dirty:
+            self._build()
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        node = 0
+        for i, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for length, value in outputs[node]:
+                yield i + 1 - length, i + 1, value
+
+    def find_words(self, text):
+        """Leftmost-longest, non-overlapping matches that start and end on word boundaries"""
+        matches = [
+            (start, end, value) for start, end, value in self.iter_matches(text)
+            if (start == 0 or not text[start - 1].isalnum())
+            and (end == len(text) or not text[end].isalnum())
+        ]
+        matches.sort(key=lambda m: (m[0], m[0] - m[1]))
+        selected, last_end = [], 0
+        for start, end, value in matches:
+            if start >= last_end:
+                selected.append((start, end, value))
+                last_end = end
+        return selected
@@ -0,0 +1,355 @@
+"""
+Semantic file search over a persistent, memory-mapped embedding index.
+
+The index directory holds:
+    manifest.json    encoder name, dimension and number of rows in use
+    embeddings.npy   float32 (capacity, dim) matrix of L2-normalized rows
+    ids.npy          fixed-width UTF-8 file IDs, row-aligned with embeddings
+    live.npy         uint8 flags, row-aligned: 0 once the file was re-indexed
+                     in a later row, so each file has one live row
+    encoder.pkl      the fitted LSA encoder (offline mode only)
+
+The arrays are opened with ``mmap_mode`` and over-allocated, so appends
+write new rows in place and queries scan the matrix block by block without
+materializing it as Python objects. Appends take an fcntl lock on the
+directory and re-read the manifest under it, so workers sharing an index
+never write over each other's rows or into arrays that were grown and
+replaced.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import joblib
+import numpy as np
+
+from zapsync_ai.dataset_cache import read_sheet
+
+logger = logging.getLogger(__name__)
+
+DATASET_PATH = os.path.join(os.path.dirname(__file__), '..', 'datasets', 'file_metadata.xlsx')
+ID_WIDTH = 64
+BLOCK_ROWS = 65536
+INITIAL_CAPACITY = 1024
+
+
+def document_text(item):
+    """Text embedded for a file: its name, tags and folder context"""
+    tags = item.get('tags') or ''
+    if isinstance(tags, (list, tuple)):
+        tags = ' '.join(str(t) for t in tags)
+    parts = [item.get('name') or '', tags, item.get('folder') or '']
+    return ' '.join(str(p) for p in parts if p).strip()
+
+
+def encode_ids(ids):
+    """Fixed-width UTF-8 IDs; raises ValueError for IDs longer than ID_WIDTH bytes"""
+    encoded = [str(i).encode('utf-8') for i in ids]
+    for value in encoded:
+        if len(value) > ID_WIDTH:
+            raise ValueError(f"IDs are limited to {ID_WIDTH} bytes of UTF-8, got {len(value)}")
+    return np.array(encoded, dtype=f'S{ID_WIDTH}')
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive across processes, on ``path`` (created if missing)"""
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class SentenceTransformerEncoder:
+    name = 'sentence-transformer'
+
+    def __init__(self, model_name='all-MiniLM-L6-v2', batch_size=64):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+        self.batch_size = batch_size
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts):
+        embeddings = self.model.encode(
+            list(texts), batch_size=self.batch_size, convert_to_numpy=True
+        )
+        return _normalize(embeddings)
+
+
+class LsaEncoder:
+    """Character n-gram TF-IDF reduced with truncated SVD (latent semantic analysis).
+
+    It is fitted once, on the bundled file catalog, and then frozen so
+    vectors appended later stay comparable with the ones already indexed.
+    """
+    name = 'lsa'
+
+    def __init__(self, path, dim=128):
+        self.path = path
+        if not os.path.exists(path):
+            # Workers starting cold fit it once; the others wait and load it
+            with _file_lock(path + '.lock'):
+                if not os.path.exists(path):
+                    self._save(self._fit(self._training_corpus(), dim))
+        self.vectorizer, self.svd = joblib.load(path)
+        self.dim = self.svd.n_components
+
+    def _save(self, fitted):
+        fd, tmp_path = tempfile.mkstemp(prefix='.encoder-', dir=os.path.dirname(self.path) or '.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                joblib.dump(fitted, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @staticmethod
+    def _training_corpus():
+        files = read_sheet(DATASET_PATH, 'Files', columns=['Name', 'Tags'])
+        folders = read_sheet(DATASET_PATH, 'Folders', columns=['Name'])
+        corpus = (files['Name'].astype(str) + ' ' + files['Tags'].fillna('').astype(str)).tolist()
+        return corpus + folders['Name'].astype(str).tolist()
+
+    @staticmethod
+    def _fit(corpus, dim):
+        from sklearn.decomposition import TruncatedSVD
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        vectorizer = TfidfVectorizer(analyzer='char_wb', ngram_range=(2, 4), sublinear_tf=True)
+        X = vectorizer.fit_transform(corpus)
+        svd = TruncatedSVD(n_components=min(dim, X.shape[0] - 1, X.shape[1] - 1), random_state=42)
+        svd.fit(X)
+        return vectorizer, svd
+
+    def encode(self, texts):
+        return _normalize(self.svd.transform(self.vectorizer.transform(list(texts))))
+
+
+class EmbeddingIndex:
+    def __init__(self, directory, encoder, batch_size=256):
+        self.directory = directory
+        self.encoder = encoder
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self.embeddings_path = os.path.join(directory, 'embeddings.npy')
+        self.ids_path = os.path.join(directory, 'ids.npy')
+        self.live_path = os.path.join(directory, 'live.npy')
+
+        if not os.path.exists(self.manifest_path):
+            with self._file_lock():
+                if not os.path.exists(self.manifest_path):
+                    self._allocate(INITIAL_CAPACITY, count=0)
+        self._open()
+        if self.manifest['encoder'] != encoder.name or self.manifest['dim'] != encoder.dim:
+            raise RuntimeError(
+                f"Index at {directory} was built with {self.manifest['encoder']} "
+                f"({self.manifest['dim']} dims), not {encoder.name} ({encoder.dim} dims)"
+            )
+
+    def _file_lock(self):
+        """Exclusive across processes sharing the index directory"""
+        return _file_lock(os.path.join(self.directory, '.lock'))
+
+    def _write_manifest(self, count):
+        manifest = {'encoder': self.encoder.name, 'dim': self.encoder.dim, 'count': count}
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _allocate(self, capacity, count):
+        """Create (or grow into) arrays of ``capacity`` rows, keeping ``count`` rows"""
+        embeddings = np.lib.format.open_memmap(
+            self.embeddings_path + '.tmp', mode='w+', dtype=np.float32,
+            shape=(capacity, self.encoder.dim)
+        )
+        ids = np.lib.format.open_memmap(
+            self.ids_path + '.tmp', mode='w+', dtype=f'S{ID_WIDTH}', shape=(capacity,)
+        )
+        live = np.lib.format.open_memmap(
+            self.live_path + '.tmp', mode='w+', dtype=np.uint8, shape=(capacity,)
+        )
+        if count:
+            for start in range(0, count, BLOCK_ROWS):
+                stop = min(start + BLOCK_ROWS, count)
+                embeddings[start:stop] = self.embeddings[start:stop]
+                ids[start:stop] = self.ids[start:stop]
+                live[start:stop] = self.live[start:stop]
+        for array in (embeddings, ids, live):
+            array.flush()
+        del embeddings, ids, live
+        os.replace(self.embeddings_path + '.tmp', self.embeddings_path)
+        os.replace(self.ids_path + '.tmp', self.ids_path)
+        os.replace(self.live_path + '.tmp', self.live_path)
+        self._write_manifest(count)
+
+    def _manifest_signature(self):
+        st = os.stat(self.manifest_path)
+        return st.st_ino, st.st_mtime_ns
+
+    def _open(self):
+        """Map the arrays read-only; only ``add`` maps them writable, under the file lock"""
+        # The manifest is read first: arrays replaced after it was written
+        # only ever hold more rows than it counts
+        signature = self._manifest_signature()
+        with open(self.manifest_path) as f:
+            self.manifest = json.load(f)
+        self._manifest_signature_seen = signature
+        self.embeddings = np.load(self.embeddings_path, mmap_mode='r')
+        self.ids = np.load(self.ids_path, mmap_mode='r')
+        self.live = np.load(self.live_path, mmap_mode='r')
+        self.count = self.manifest['count']
+
+    def _refresh(self):
+        """Pick up rows appended by another process"""
+        try:
+            signature = self._manifest_signature()
+        except OSError:
+            return
+        if signature != self._manifest_signature_seen:
+            with self._lock:
+                self._open()
+
+    def __len__(self):
+        return self.count
+
+    def add(self, items):
+        """Embed ``items`` ({'id', 'name', 'tags', 'folder'}) in batches and append them.
+
+        A file indexed again replaces its earlier row, which is marked dead.
+        """
+        items = [item for item in items if item.get('id')]
+        if not items:
+            return 0
+        ids = encode_ids(item['id'] for item in items)
+        # Within the batch too, the last row of an ID is the live one
+        _, last = np.unique(ids[::-1], return_index=True)
+        batch_live = np.zeros(len(ids), dtype=np.uint8)
+        batch_live[len(ids) - 1 - last] = 1
+        # Embedding is the slow part, so it happens before taking the lock
+        vectors = [
+            self.encoder.encode(document_text(i) for i in items[start:start + self.batch_size])
+            for start in range(0, len(items), self.batch_size)
+        ]
+
+        with self._lock, self._file_lock():
+            self._open()
+            count = self.count
+            needed = count + len(items)
+            if needed > self.embeddings.shape[0]:
+                capacity = max(needed, 2 * self.embeddings.shape[0])
+                self._allocate(capacity, count)
+
+            embeddings = np.load(self.embeddings_path, mmap_mode='r+')
+            start = count
+            for batch in vectors:
+                embeddings[start:start + len(batch)] = batch
+                start += len(batch)
+            stored_ids = np.load(self.ids_path, mmap_mode='r+')
+            stored_ids[count:needed] = ids
+            live = np.load(self.live_path, mmap_mode='r+')
+            live[count:needed] = batch_live
+            for array in (embeddings, stored_ids, live):
+                array.flush()
+
+            # The old rows die only after the new ones are visible, so a
+            # concurrent search never finds the file missing
+            self._write_manifest(needed)
+            for start in range(0, count, BLOCK_ROWS):
+                stop = min(start + BLOCK_ROWS, count)
+                superseded = np.isin(stored_ids[start:stop], ids)
+                live[start:stop][superseded] = 0
+            live.flush()
+            del embeddings, stored_ids, live
+            self._open()
+        return len(items)
+
+    def search(self, query, top_k=10):
+        """Cosine top-k over every indexed row, scanned in fixed-size blocks"""
+        self._refresh()
+        count, embeddings, ids, live = self.count, self.embeddings, self.ids, self.live
+        if not count or top_k <= 0:
+            return []
+
+        q = self.encoder.encode([query])[0]
+        # Over-fetch a little: while a re-indexed file's old row is being
+        # retired both rows are live, and they collapse to one result
+        k = min(top_k * 2, count)
+        while True:
+            results = self._top_files(embeddings, ids, live, count, q, k, top_k)
+            if len(results) == top_k or k == count:
+                return results
+            k = min(k * 2, count)
+
+    @staticmethod
+    def _top_files(embeddings, ids, live, count, q, k, top_k):
+        """The top_k distinct IDs among the k best-scoring live rows"""
+        best_scores = np.empty(0, dtype=np.float32)
+        best_rows = np.empty(0, dtype=np.int64)
+        for start in range(0, count, BLOCK_ROWS):
+            stop = min(start + BLOCK_ROWS, count)
+            scores = embeddings[start:stop] @ q
+            scores[live[start:stop] == 0] = -np.inf
+            if len(scores) > k:
+                top = np.argpartition(scores, -k)[-k:]
+            else:
+                top = np.arange(len(scores))
+            best_scores = np.concatenate([best_scores, scores[top]])
+            best_rows = np.concatenate([best_rows, top + start])
+            if len(best_scores) > k:
+                keep = np.argpartition(best_scores, -k)[-k:]
+                best_scores, best_rows = best_scores[keep], best_rows[keep]
+
+        # Later rows win over earlier ones for the same ID
+        order = np.lexsort((-best_rows, -best_scores))
+        results, seen = [], set()
+        for i in order:
+            if best_scores[i] == -np.inf:
+                break  # Only dead rows are left
+            file_id = ids[best_rows[i]].decode('utf-8')
+            if file_id in seen:
+                continue
+            seen.add(file_id)
+            results.append({'id': file_id, 'score': float(best_scores[i])})
+            if len(results) == top_k:
+                break
+        return results
+
+
+def build_encoder(kind, directory):
+    """'sentence-transformer', 'lsa', or 'auto' (the former when installed)"""
+    if kind in ('auto', SentenceTransformerEncoder.name):
+        try:
+            return SentenceTransformerEncoder()
+        except Exception as e:
+            if kind != 'auto':
+                raise
+            logger.info("SentenceTransformer unavailable, using the LSA encoder: %s", e)
+    os.makedirs(directory, exist_ok=True)
+    return LsaEncoder(os.path.join(directory, 'encoder.pkl'))
+
+
+def load_search_index():
+    from django.conf import settings
+
+    base_dir = str(settings.SEARCH_INDEX_DIR)
+    encoder = build_encoder(settings.SEARCH_ENCODER, os.path.join(base_dir, LsaEncoder.name))
+    return EmbeddingIndex(os.path.join(base_dir, encoder.name), encoder)
@@ -1,3 +1,226 @@
-from django.test import TestCase
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import zlib
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase
+
+from . import search
+from .gazetteer import Gazetteer
+from .matcher import AhoCorasick
+from .search import EmbeddingIndex
+
+
+class HashEncoder:
+    """Deterministic stand-in for the real encoders: one dimension per word hash"""
+    name = 'hash'
+    dim = 16
+
+    def encode(self, texts):
+        rows = []
+        for text in texts:
+            row = np.zeros(self.dim, dtype=np.float32)
+            for word in text.split():
+                row[zlib.crc32(word.encode()) % self.dim] += 1
+            rows.append(row)
+        return search._normalize(np.array(rows).reshape(-1, self.dim))
+
+
+CORPUS = ['lecture notes week one', 'exam answers', 'research paper draft', 'lab report', 'slides']
+
+
+def _open_encoder(path, fits):
+    fit_lsa = search.LsaEncoder._fit
+
+    def fit(corpus, dim):
+        with open(fits, 'a') as f:
+            f.write('fit\n')
+        return fit_lsa(corpus, dim)
+
+    with mock.patch.object(search.LsaEncoder, '_training_corpus', staticmethod(lambda: CORPUS)), \
+            mock.patch.object(search.LsaEncoder, '_fit', staticmethod(fit)):
+        encoder = search.LsaEncoder(path, dim=3)
+    assert encoder.encode(['lab notes']).shape == (1, encoder.dim)
+
+
+def _add_files(directory, worker, batches):
+    index = EmbeddingIndex(directory, HashEncoder(), batch_size=3)
+    for i in range(batches):
+        index.add([{'id': f'{worker}-{i}-{j}', 'name': f'notes {worker} {i}'} for j in range(7)])
+
+
+class EmbeddingIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_search_ranks_matching_files_first(self):
+        index = EmbeddingIndex(self.directory, HashEncoder())
+        index.add([
+            {'id': 'a', 'name': 'linear algebra', 'folder': 'math'},
+            {'id': 'b', 'name': 'organic chemistry', 'folder': 'science'},
+        ])
+        self.assertEqual(index.search('linear algebra', top_k=1)[0]['id'], 'a')
+
+    def test_search_fills_top_k_past_duplicate_ids(self):
+        index = EmbeddingIndex(self.directory, HashEncoder())
+        # Many re-indexed copies of one file outscore everything else
+        index.add([{'id': 'dup', 'name': 'exam answers'}] * 50)
+        index.add([{'id': f'other-{i}', 'name': f'exam {i}'} for i in range(5)])
+        results = index.search('exam answers', top_k=4)
+        self.assertEqual(len(results), 4)
+        self.assertEqual(results[0]['id'], 'dup')
+        self.assertEqual(len({r['id'] for r in results}), 4)
+        self.assertEqual(len(index.search('exam', top_k=10)), 6)
+
+    def test_reindexed_file_is_found_by_its_new_text_only(self):
+        index = EmbeddingIndex(self.directory, HashEncoder())
+        index.add([{'id': 'f1', 'name': 'organic chemistry'}, {'id': 'f2', 'name': 'linear algebra'}])
+        index.add([{'id': 'f1', 'name': 'world history'}])
+
+        # The stale row would score 1.0 for its old name
+        results = index.search('organic chemistry', top_k=5)
+        self.assertEqual(sorted(r['id'] for r in results), ['f1', 'f2'])
+        self.assertLess(dict((r['id'], r['score']) for r in results)['f1'], 0.99)
+        self.assertEqual(index.search('world history', top_k=1)[0]['id'], 'f1')
+        self.assertAlmostEqual(index.search('world history', top_k=1)[0]['score'], 1.0, places=5)
+
+        # Other instances see the retired row too
+        other = EmbeddingIndex(self.directory, HashEncoder())
+        self.assertEqual(len(other.search('chemistry', top_k=5)), 2)
+
+    def test_last_duplicate_in_a_batch_wins(self):
+        index = EmbeddingIndex(self.directory, HashEncoder())
+        index.add([{'id': 'f1', 'name': 'draft one'}, {'id': 'f1', 'name': 'final version'}])
+        results = index.search('final version', top_k=5)
+        self.assertEqual(len(results), 1)
+        self.assertAlmostEqual(results[0]['score'], 1.0, places=5)
+
+    def test_rejects_over_long_ids(self):
+        index = EmbeddingIndex(self.directory, HashEncoder())
+        with self.assertRaises(ValueError):
+            index.add([{'id': 'ü' * 33, 'name': 'notes'}])
+        self.assertEqual(len(index), 0)
+        index.add([{'id': 'ü' * 32, 'name': 'notes'}])
+        self.assertEqual(index.search('notes', top_k=1)[0]['id'], 'ü' * 32)
+
+    def test_growth_is_seen_by_other_instances(self):
+        writer = EmbeddingIndex(self.directory, HashEncoder())
+        reader = EmbeddingIndex(self.directory, HashEncoder())
+        writer.add([{'id': str(i), 'name': f'file {i}'} for i in range(search.INITIAL_CAPACITY + 10)])
+        reader.add([{'id': 'last', 'name': 'unique words here'}])
+        self.assertEqual(len(reader), search.INITIAL_CAPACITY + 11)
+        self.assertEqual(writer.search('unique words here', top_k=1)[0]['id'], 'last')
+
+    def test_concurrent_processes_keep_every_row(self):
+        context = multiprocessing.get_context('fork')
+        # Enough rows to grow the arrays while other workers append
+        workers = [context.Process(target=_add_files, args=(self.directory, w, 40)) for w in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+
+        index = EmbeddingIndex(self.directory, HashEncoder())
+        self.assertEqual(len(index), 4 * 40 * 7)
+        stored = {value.decode() for value in index.ids[:len(index)]}
+        self.assertEqual(stored, {f'{w}-{i}-{j}' for w in range(4) for i in range(40) for j in range(7)})
+        # Each row holds its own embedding, not another worker's
+        expected = HashEncoder().encode([f'notes {w} {i}' for w in range(4) for i in range(40)])
+        rows = {value.decode(): n for n, value in enumerate(index.ids[:len(index)])}
+        for w in range(4):
+            for i in range(40):
+                np.testing.assert_allclose(index.embeddings[rows[f'{w}-{i}-0']], expected[w * 40 + i])
+        self.assertFalse(os.path.exists(index.embeddings_path + '.tmp'))
+
+
+class LsaEncoderTests(SimpleTestCase):
+    def test_cold_workers_fit_once_and_never_read_a_partial_pickle(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path, fits = os.path.join(directory, 'encoder.pkl'), os.path.join(directory, 'fits')
+
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=_open_encoder, args=(path, fits)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+        with open(fits) as f:
+            self.assertEqual(f.read().count('fit'), 1)
+        self.assertEqual(sorted(os.listdir(directory)), ['encoder.pkl', 'encoder.pkl.lock', 'fits'])
+
+
+class AhoCorasickTests(SimpleTestCase):
+    def test_finds_overlapping_occurrences(self):
+        matcher = AhoCorasick({'he': 'he', 'she': 'she', 'his': 'his', 'hers': 'hers'})
+        self.assertEqual(
+            sorted(matcher.iter_matches('ushers')),
+            [(1, 4, 'she'), (2, 4, 'he'), (2, 6, 'hers')]
+        )
+
+    def test_words_are_leftmost_longest_on_word_boundaries(self):
+        matcher = AhoCorasick({'data': 1, 'data science': 2, 'science fair': 3, 'cat': 4})
+        self.assertEqual(matcher.find_words('data science fair'), [(0, 12, 2)])
+        self.assertEqual(matcher.find_words('concatenate big data'), [(16, 20, 1)])
+        self.assertEqual(matcher.find_words('cat, cats and cat'), [(0, 3, 4), (14, 17, 4)])
+
+    def test_remove_keeps_shared_prefixes_and_frees_nodes(self):
+        matcher = AhoCorasick({'week': 'w', 'weekly': 'wl'})
+        matcher.update()
+        nodes = len(matcher._goto)
+
+        matcher.update(add={'weekday': 'wd', 'weekend': 'we'}, remove=['weekly'])
+        self.assertNotIn('weekly', matcher)
+        self.assertIn('week', matcher)
+        self.assertEqual(len(matcher), 3)
+        self.assertEqual([m[2] for m in matcher.find_words('weekly weekend week')], ['we', 'w'])
+
+        matcher.update(remove=['weekday', 'weekend', 'missing', 'wee'])
+        matcher.update(add={'weekly': 'wl'})
+        self.assertEqual(len(matcher._goto), nodes)
+        self.assertEqual([m[2] for m in matcher.find_words('weekly week')], ['wl', 'w'])
+
+    def test_update_rebuilds_once(self):
+        matcher = AhoCorasick()
+        with mock.patch.object(matcher, '_build', wraps=matcher._build) as build:
+            matcher.update(add={f'name {i}': i for i in range(50)}, remove=['name 3'])
+            list(matcher.iter_matches('name 4'))
+        build.assert_called_once()
+
+
+class GazetteerTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'gazetteer.json')
+        self.write({'courses': [{'name': 'Linear Algebra', 'aliases': ['MATH-201']}]})
+
+    def write(self, data):
+        with open(self.path, 'w') as f:
+            json.dump(data, f)
+
+    def test_week_spellings_are_normalized(self):
+        gazetteer = Gazetteer(self.path)
+        self.assertEqual(
+            gazetteer.find('Week_05 notes, week5 slides and WEEK 5 quiz'),
+            [('weeks', 'Week 5')] * 3
+        )
+
+    def test_weeks_outside_the_range_are_not_names(self):
+        gazetteer = Gazetteer(self.path)
+        self.assertEqual(gazetteer.find('week 1, week 53, week 0, week 54, week 100'),
+                         [('weeks', 'Week 1'), ('weeks', 'Week 53')])
+
+    def test_reload_applies_added_and_removed_names(self):
+        gazetteer = Gazetteer(self.path)
+        self.assertEqual(gazetteer.find('math 201 notes'), [('courses', 'Linear Algebra')])
+        self.write({'lecturers': ['Dr. Ada Smith']})
+        gazetteer.refresh(force=True)
+        self.assertEqual(gazetteer.find('MATH-201 by dr ada smith'), [('lecturers', 'Dr. Ada Smith')])
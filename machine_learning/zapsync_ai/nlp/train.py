@@ -9,14 +9,25 @@ from sklearn.utils.class_weight import compute_class_weight
 from imblearn.over_sampling import RandomOverSampler
 from imblearn.pipeline import make_pipeline as make_imb_pipeline
 import joblib
+import argparse
 import os
 import re
+import sys
 from datetime import datetime
 
+# Run as a script from any directory, importing the app's matcher
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from nlp.matcher import AhoCorasick
+from zapsync_ai import bundles
+from zapsync_ai.artifacts import new_release
+from zapsync_ai.dataset_cache import read_sheet
+
 # Constants
-DATASET_PATH = "../datasets/file_metadata.xlsx"
-MODEL_SAVE_PATH = "../models/file_classifier_model.pkl"
-KEYWORD_EXTRACTOR_PATH = "../models/keyword_extractor.pkl"
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DATASET_PATH = os.path.join(BASE_DIR, 'datasets', 'file_metadata.xlsx')
+MODEL_SAVE_PATH = os.path.join(BASE_DIR, 'models', 'file_classifier_model.pkl')
+KEYWORD_EXTRACTOR_PATH = os.path.join(BASE_DIR, 'models', 'keyword_extractor.pkl')
+FILE_COLUMNS = ['Name', 'Type', 'Tags']
 
 def preprocess_text(text):
     """Enhanced text preprocessing"""
@@ -30,76 +41,161 @@ def preprocess_text(text):
     text = re.sub(r"\s+", " ", text).strip()
     return text
 
+# Category keywords in priority order; a keyword matches when it is delimited
+# by underscores or the ends of the preprocessed text
+CATEGORY_PATTERNS = [
+    ('research', ['research', 'paper', 'thesis', 'dissertation', 'journal']),
+    ('lecture', ['lecture', 'note', 'notes', 'class', 'lesson']),
+    ('slide', ['slide', 'presentation', 'deck', 'ppt']),
+    ('assignment', ['assignment', 'hw', 'homework', 'problem set', 'pset']),
+    ('exam', ['exam', 'test', 'quiz', 'midterm', 'final']),
+    ('code', ['code', 'program', 'script', 'src', '.py', '.cpp', '.java']),
+    ('document', ['doc', 'report', 'article', 'writeup']),
+    ('image', ['image', 'photo', 'pic', 'screenshot', '.jpg', '.png'])
+]
+
+# File type fallback mapping
+TYPE_MAPPING = {
+    'pdf': 'document',
+    'docx': 'document',
+    'pptx': 'slide',
+    'png': 'image',
+    'jpg': 'image',
+    'jpeg': 'image',
+    'py': 'code',
+    'cpp': 'code',
+    'java': 'code',
+    'ipynb': 'code'
+}
+
 def determine_category(row):
     """More precise category determination with enhanced patterns"""
     file_name = preprocess_text(row['Name'])
     file_type = row['Type'].lower()
     folder_context = preprocess_text(row.get('Folder', ''))
     
-    # Enhanced matching patterns with priorities
-    category_patterns = [
-        ('research', ['research', 'paper', 'thesis', 'dissertation', 'journal']),
-        ('lecture', ['lecture', 'note', 'notes', 'class', 'lesson']),
-        ('slide', ['slide', 'presentation', 'deck', 'ppt']),
-        ('assignment', ['assignment', 'hw', 'homework', 'problem set', 'pset']),
-        ('exam', ['exam', 'test', 'quiz', 'midterm', 'final']),
-        ('code', ['code', 'program', 'script', 'src', '.py', '.cpp', '.java']),
-        ('document', ['doc', 'report', 'article', 'writeup']),
-        ('image', ['image', 'photo', 'pic', 'screenshot', '.jpg', '.png'])
-    ]
-    
     # Check for exact matches first
-    for category, keywords in category_patterns:
+    for category, keywords in CATEGORY_PATTERNS:
         if any(f'_{k}_' in f'_{file_name}_' for k in keywords):
             return category
     
     # Then check folder context
-    for category, keywords in category_patterns:
+    for category, keywords in CATEGORY_PATTERNS:
         if any(f'_{k}_' in f'_{folder_context}_' for k in keywords):
             return category
     
-    # File type fallback mapping
-    type_mapping = {
-        'pdf': 'document',
-        'docx': 'document',
-        'pptx': 'slide',
-        'png': 'image',
-        'jpg': 'image',
-        'jpeg': 'image',
-        'py': 'code',
-        'cpp': 'code',
-        'java': 'code',
-        'ipynb': 'code'
-    }
-    
-    return type_mapping.get(file_type, 'other')
+    return TYPE_MAPPING.get(file_type, 'other')
+
+def preprocess_series(texts):
+    """preprocess_text over a whole column with vectorized string operations"""
+    is_text = texts.map(lambda value: isinstance(value, str))
+    return (
+        texts.where(is_text, '').astype(str).str.lower()
+        .str.replace(r"[^\w\s'-]", " ", regex=True)
+        .str.replace(r"\b\d+\b", " ", regex=True)
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+    )
+
+def match_folders(names, folder_names):
+    """For each file name, the first folder (in folder_names order) whose
+    lowercased name occurs in it, or None.
+
+    One Aho-Corasick pass per distinct file name replaces a substring check
+    against every folder.
+    """
+    matcher = AhoCorasick()
+    match_all = None
+    for index, folder in enumerate(folder_names):
+        key = folder.lower()
+        if not key:
+            match_all = match_all or (index, folder)
+        elif key not in matcher:
+            matcher.add(key, (index, folder))
+
+    lowered = names.str.lower()
+    found = {}
+    for name in lowered.unique():
+        best = min((value for _, _, value in matcher.iter_matches(name)), default=None)
+        if match_all is not None:
+            best = min(best or match_all, match_all)
+        found[name] = best[1] if best else None
+    return lowered.map(found)
+
+def keyword_pattern(keywords):
+    """Regex equivalent of any(f'_{k}_' in f'_{text}_' for k in keywords)"""
+    return '(?<![^_])(?:' + '|'.join(re.escape(k) for k in keywords) + ')(?![^_])'
+
+def determine_categories(files):
+    """determine_category for every row at once"""
+    file_names = preprocess_series(files['Name'])
+    folder_context = preprocess_series(files['Folder'])
+    patterns = [(category, keyword_pattern(keywords)) for category, keywords in CATEGORY_PATTERNS]
+
+    # Match each distinct text once; catalog names and folders repeat a lot
+    conditions = []
+    for texts in (file_names, folder_context):
+        codes, uniques = pd.factorize(texts)
+        uniques = pd.Series(uniques, dtype=object)
+        conditions += [uniques.str.contains(p, regex=True).to_numpy()[codes] for _, p in patterns]
+    choices = [category for category, _ in patterns] * 2
+    fallback = files['Type'].str.lower().map(TYPE_MAPPING).fillna('other').to_numpy()
+    return pd.Series(np.select(conditions, choices, default=fallback), index=files.index)
 
 def load_and_preprocess():
     """Enhanced data loading with folder context integration"""
-    files = pd.read_excel(DATASET_PATH, sheet_name='Files')
-    folders = pd.read_excel(DATASET_PATH, sheet_name='Folders')
-    
-    # Create a folder name mapping for context
-    folder_map = {folder['Name']: folder for _, folder in folders.iterrows()}
-    
+    files = read_sheet(DATASET_PATH, 'Files', columns=FILE_COLUMNS)
+    folders = read_sheet(DATASET_PATH, 'Folders', columns=['Name'])
+    return prepare_features(files, folders)
+
+def prepare_features(files, folders):
+    """Text features and category labels, using vectorized string operations"""
+    files = files.copy()
     # Add folder context to files
-    files['Folder'] = files['Name'].apply(
-        lambda x: next((f for f in folder_map if f.lower() in x.lower()), None))
+    files['Folder'] = match_folders(files['Name'], folders['Name'].tolist())
     
     # Enhanced categorization
-    files['category'] = files.apply(determine_category, axis=1)
+    files['category'] = determine_categories(files)
     
     # Create enhanced text features with folder context
+    files['text_features'] = preprocess_series(
+        files['Name'] + ' ' +
+        files['Type'] + ' ' +
+        files['Tags'].fillna('') + ' ' +
+        files['Folder'].fillna('')
+    )
+    
+    return files['text_features'], files['category']
+
+def prepare_features_rowwise(files, folders):
+    """The original row-by-row preparation, kept as the reference for verify_features"""
+    files = files.copy()
+    folder_map = {folder['Name']: folder for _, folder in folders.iterrows()}
+    files['Folder'] = files['Name'].apply(
+        lambda x: next((f for f in folder_map if f.lower() in x.lower()), None))
+    files['category'] = files.apply(determine_category, axis=1)
     files['text_features'] = (
         files['Name'] + ' ' +
         files['Type'] + ' ' +
         files['Tags'].fillna('') + ' ' +
         files['Folder'].fillna('')
     ).apply(preprocess_text)
-    
     return files['text_features'], files['category']
 
-def train_and_evaluate_model(X, y):
+def verify_features():
+    """Check the vectorized preparation against the row-wise one on the bundled dataset"""
+    files = read_sheet(DATASET_PATH, 'Files', columns=FILE_COLUMNS)
+    folders = read_sheet(DATASET_PATH, 'Folders', columns=['Name'])
+    X, y = prepare_features(files, folders)
+    X_ref, y_ref = prepare_features_rowwise(files, folders)
+
+    label_mismatches = int((y != y_ref).sum())
+    text_mismatches = int((X != X_ref).sum())
+    print(f"Checked {len(files)} files: {label_mismatches} label and "
+          f"{text_mismatches} text feature mismatches")
+    return label_mismatches == 0 and text_mismatches == 0
+
+def train_and_evaluate_model(X, y, path=MODEL_SAVE_PATH):
     """Enhanced model training with class balancing"""
     # Split data with stratification
     X_train, X_test, y_train, y_test = train_test_split(
@@ -127,13 +223,13 @@ def train_and_evaluate_model(X, y):
     print(classification_report(y_test, y_pred, zero_division=0))
     
     # Save the model
-    os.makedirs(os.path.dirname(MODEL_SAVE_PATH), exist_ok=True)
-    joblib.dump(model, MODEL_SAVE_PATH)
-    print(f"\nImproved model saved to {MODEL_SAVE_PATH}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    joblib.dump(model, path)
+    print(f"\nImproved model saved to {path}")
     
     return model
 
-def train_keyword_extractor(X):
+def train_keyword_extractor(X, path=KEYWORD_EXTRACTOR_PATH):
     """Train an enhanced TF-IDF vectorizer for keyword extraction"""
     vectorizer = TfidfVectorizer(
         max_features=1000,
@@ -142,11 +238,20 @@ def train_keyword_extractor(X):
         min_df=2
     )
     vectorizer.fit(X)
-    os.makedirs(os.path.dirname(KEYWORD_EXTRACTOR_PATH), exist_ok=True)
-    joblib.dump(vectorizer, KEYWORD_EXTRACTOR_PATH)
-    print(f"Enhanced keyword extractor saved to {KEYWORD_EXTRACTOR_PATH}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    joblib.dump(vectorizer, path)
+    print(f"Enhanced keyword extractor saved to {path}")
     return vectorizer
 
+def export_bundles(model, keyword_extractor, X, release):
+    """Write both models as bundles (see zapsync_ai/bundles.py) into the release"""
+    for name, vectorizer, classifier in [
+        ('file_classifier.bundle', *bundles.pipeline_steps(model)),
+        ('keyword_extractor.bundle', keyword_extractor, None)
+    ]:
+        check = bundles.export(release.path(name), vectorizer, classifier, check_texts=X)['check']
+        print(f"Exported {name}: max deviation {check['max_deviation']:.2g} over {check['texts']} texts")
+
 def post_process_predictions(model, texts):
     """Apply business rules to model predictions"""
     preds = model.predict(texts)
@@ -174,11 +279,18 @@ def main():
         if len(y.unique()) < 2:
             raise ValueError("Not enough categories to train - need more diverse data")
         
-        # Train and evaluate model
-        model = train_and_evaluate_model(X, y)
-        
-        # Train keyword extractor
-        keyword_extractor = train_keyword_extractor(X)
+        # Both artifacts are published together as one release, which
+        # running servers pick up without a restart
+        with new_release('nlp') as release:
+            # Train and evaluate model
+            model = train_and_evaluate_model(X, y, release.path(os.path.basename(MODEL_SAVE_PATH)))
+
+            # Train keyword extractor
+            keyword_extractor = train_keyword_extractor(X, release.path(os.path.basename(KEYWORD_EXTRACTOR_PATH)))
+
+            # Memory-mapped copies the server loads instead, checked against the pickles
+            export_bundles(model, keyword_extractor, X, release)
+        print(f"Published release {release.version}")
         
         # Test predictions with post-processing
         test_files = [
@@ -203,4 +315,9 @@ def main():
         print("- Add more specific tags to files in the 'Tags' column")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the file classifier and keyword extractor")
+    parser.add_argument('--verify', action='store_true',
+                        help="only check that vectorized preparation matches the row-wise version")
+    if parser.parse_args().verify:
+        sys.exit(0 if verify_features() else 1)
     main()
\ No newline at end of file
@@ -1,6 +1,11 @@
+from django.conf import settings
 from django.urls import path
-from .views import process_request
+from .views import process_request, process_request_async, process_batch, search, index_files, stats
 
 urlpatterns = [
-    path('process/', process_request, name='process_text'),
+    path('process/', process_request_async if settings.SERVING_MODE == 'asgi' else process_request, name='process_text'),
+    path('process/batch/', process_batch, name='process_batch'),
+    path('search/', search, name='search'),
+    path('search/index/', index_files, name='search_index'),
+    path('stats/', stats, name='nlp_stats'),
 ]
\ No newline at end of file
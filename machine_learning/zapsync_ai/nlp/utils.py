@@ -0,0 +1,263 @@
+import joblib
+import numpy as np
+from typing import Dict, Union, List
+import os
+import re
+from django.conf import settings
+from zapsync_ai import artifacts, bundles
+from zapsync_ai.metrics import BATCH_SIZE, CACHE_LOOKUPS, STAGE_SECONDS
+from zapsync_ai.result_cache import get_result_cache
+from .gazetteer import Gazetteer
+
+MODEL_FILES = ('file_classifier_model.pkl', 'keyword_extractor.pkl')
+BUNDLE_DIRS = ('file_classifier.bundle', 'keyword_extractor.bundle')
+GAZETTEER_PATH = os.path.join(os.path.dirname(__file__), '..', 'datasets', 'gazetteer.json')
+
+
+def probe_artifacts():
+    """Registry hot-reload probe: changes when new NLP artifacts are published"""
+    return artifacts.probe('nlp', MODEL_FILES)
+
+
+class NLPPredictor:
+    def __init__(self):
+        try:
+            # Model paths, from the current release when one has been published
+            self.version, (self.model_path, self.vectorizer_path) = artifacts.resolve('nlp', MODEL_FILES)
+
+            # Load classifier pipeline and vectorizer, memory-mapped when bundled
+            bundle_paths = [os.path.join(os.path.dirname(self.model_path), name) for name in BUNDLE_DIRS]
+            if getattr(settings, 'MODEL_BUNDLES', True) and all(map(bundles.exists, bundle_paths)):
+                self.classifier_pipeline = bundles.load(bundle_paths[0]).pipeline()
+                self.keyword_extractor = bundles.load(bundle_paths[1]).vectorizer
+                self.artifact_format = 'bundle'
+            else:
+                self.classifier_pipeline = joblib.load(self.model_path)
+                self.keyword_extractor = joblib.load(self.vectorizer_path)
+                self.artifact_format = 'pickle'
+            self.feature_names = np.array(self.keyword_extractor.get_feature_names_out())
+            self.result_cache = get_result_cache(getattr(settings, 'NLP_RESULT_CACHE', None))
+            self.gazetteer = Gazetteer(
+                str(getattr(settings, 'GAZETTEER_PATH', GAZETTEER_PATH)),
+                check_interval=getattr(settings, 'GAZETTEER_CHECK_INTERVAL', 5)
+            )
+        except Exception as e:
+            raise RuntimeError(f"Failed to load models: {str(e)}")
+
+    def preprocess_text(self, text: str) -> str:
+        """Match the preprocessing used during training"""
+        if not isinstance(text, str):
+            return ""
+        text = re.sub(r"[^\w\s'-]", " ", text.lower())
+        text = re.sub(r"\b\d+\b", " ", text)
+        text = re.sub(r"\s+", " ", text).strip()
+        return text
+
+    def extract_entities(self, text: str, keywords: List[str] = None) -> Dict[str, Union[str, List[str]]]:
+        """Enhanced entity extraction matching our new categories"""
+        if keywords is None:
+            keywords = self.extract_keywords(text)  # Using our trained keyword extractor
+        entities = {
+            'courses': [],
+            'lecturers': [],
+            'file_types': [],
+            'categories': [],
+            'weeks': [],
+            'semesters': [],
+            'keywords': keywords
+        }
+        
+        # Courses, lecturers, semesters and weeks in one pass over the text
+        for category, name in self.gazetteer.find(text):
+            found = entities.setdefault(category, [])
+            if name not in found:
+                found.append(name)
+
+        text_lower = text.lower()
+        
+        # Extract file types (extension-based)
+        file_types = {
+            'pdf': 'PDF',
+            'docx': 'Word',
+            'pptx': 'PowerPoint',
+            'png': 'Image',
+            'jpg': 'Image',
+            'jpeg': 'Image',
+            'cpp': 'Code',
+            'py': 'Code'
+        }
+        for ext, display_name in file_types.items():
+            if f'.{ext}' in text_lower:
+                entities['file_types'].append(display_name)
+        
+        return entities
+
+    def extract_keywords(self, text: str, top_n: int = 5) -> List[str]:
+        """Extract keywords using our trained vectorizer"""
+        return self.extract_keywords_batch([text], top_n)[0]
+
+    def extract_keywords_batch(self, texts: List[str], top_n: int = 5) -> List[List[str]]:
+        """Top-n keywords per text from one transform over the whole batch"""
+        with STAGE_SECONDS.time('nlp', 'preprocess'):
+            processed = [self.preprocess_text(t) for t in texts]
+        return self._keywords_for_processed(processed, top_n)
+
+    def _keywords_for_processed(self, processed: List[str], top_n: int = 5) -> List[List[str]]:
+        """extract_keywords_batch for texts already run through preprocess_text"""
+        with STAGE_SECONDS.time('nlp', 'extract_keywords'):
+            return self._top_keywords(self.keyword_extractor.transform(processed), top_n)
+
+    def _top_keywords(self, tfidf_matrix, top_n: int) -> List[List[str]]:
+        """Row-wise top-n over the stored (nonzero) entries of a CSR matrix"""
+        tfidf_matrix = tfidf_matrix.tocsr()
+        keywords = []
+        for row in range(tfidf_matrix.shape[0]):
+            start, end = tfidf_matrix.indptr[row], tfidf_matrix.indptr[row + 1]
+            scores = tfidf_matrix.data[start:end]
+            columns = tfidf_matrix.indices[start:end]
+            if len(scores) > top_n:
+                top = np.argpartition(scores, -top_n)[-top_n:]
+                scores, columns = scores[top], columns[top]
+            order = np.argsort(-scores, kind='stable')
+            keywords.append(self.feature_names[columns[order]].tolist())
+        return keywords
+
+    def predict_intent(self, text: str) -> Dict[str, Union[str, float]]:
+        """Predict the file category using our classifier"""
+        try:
+            processed_text = self.preprocess_text(text)
+            
+            # Get prediction with confidence
+            with STAGE_SECONDS.time('nlp', 'predict_proba'):
+                prediction = self.classifier_pipeline.predict_proba([processed_text])[0]
+            top_idx = np.argmax(prediction)
+            intent = self.classifier_pipeline.classes_[top_idx]
+            confidence = float(prediction[top_idx])
+            
+            # Apply business rules
+            intent = self.apply_business_rules(processed_text, intent, confidence)
+            
+            return {
+                "intent": intent,
+                "confidence": confidence
+            }
+        except Exception as e:
+            return {
+                "intent": "unknown",
+                "confidence": 0.0,
+                "error": str(e)
+            }
+
+    def predict_intent_batch(self, texts: List[str]) -> List[Dict[str, Union[str, float]]]:
+        """Classify a batch of texts with a single predict_proba call"""
+        with STAGE_SECONDS.time('nlp', 'preprocess'):
+            processed = [self.preprocess_text(t) for t in texts]
+        return self._intents_for_processed(processed)
+
+    def _intents_for_processed(self, processed: List[str]) -> List[Dict[str, Union[str, float]]]:
+        """predict_intent_batch for texts already run through preprocess_text"""
+        try:
+            with STAGE_SECONDS.time('nlp', 'predict_proba'):
+                probabilities = self.classifier_pipeline.predict_proba(processed)
+        except Exception as e:
+            return [{"intent": "unknown", "confidence": 0.0, "error": str(e)} for _ in processed]
+
+        top_indices = np.argmax(probabilities, axis=1)
+        results = []
+        for processed_text, row, top_idx in zip(processed, probabilities, top_indices):
+            intent = self.classifier_pipeline.classes_[top_idx]
+            confidence = float(row[top_idx])
+            results.append({
+                "intent": self.apply_business_rules(processed_text, intent, confidence),
+                "confidence": confidence
+            })
+        return results
+
+    def apply_business_rules(self, text: str, intent: str, confidence: float) -> str:
+        """Override predictions based on business rules"""
+        # Force certain patterns regardless of model prediction
+        if 'lecture' in text and intent != 'lecture':
+            return 'lecture'
+        if 'slide' in text and intent != 'slide':
+            return 'slide'
+        if 'assignment' in text and intent != 'assignment':
+            return 'assignment'
+        if 'exam' in text and intent != 'exam':
+            return 'exam'
+        if 'research' in text and intent != 'research':
+            return 'research'
+        return intent
+
+    def predict(self, text: str) -> Dict:
+        """Main prediction method with enhanced output"""
+        return self.predict_batch([text])[0]
+
+    def predict_batch(self, texts: List[str]) -> List[Dict]:
+        """Batch version of predict: every model runs once over all texts"""
+        BATCH_SIZE.observe(len(texts), 'nlp', 'predict_batch')
+        analyses = self._analyze(texts)
+        with STAGE_SECONDS.time('nlp', 'extract_entities'):
+            entities = [
+                self.extract_entities(text, keywords=analysis["keywords"])
+                for text, analysis in zip(texts, analyses)
+            ]
+        results = []
+        with STAGE_SECONDS.time('nlp', 'generate_filters'):
+            for text, analysis, text_entities in zip(texts, analyses, entities):
+                intent_result = {"intent": analysis["intent"], "confidence": analysis["confidence"]}
+                results.append({
+                    "text": text,
+                    "predicted_category": intent_result["intent"],
+                    "confidence": intent_result["confidence"],
+                    "entities": text_entities,
+                    "suggested_filters": self.generate_filters(intent_result, text_entities)
+                })
+        return results
+
+    def _analyze(self, texts: List[str]) -> List[Dict]:
+        """Intent and keywords per text, shared across workers through the result cache.
+
+        Both only depend on the preprocessed text, which is the cache key;
+        entities are read from the raw text and are always recomputed.
+        """
+        with STAGE_SECONDS.time('nlp', 'preprocess'):
+            processed = [self.preprocess_text(t) for t in texts]
+        with STAGE_SECONDS.time('nlp', 'result_cache'):
+            results = self.result_cache.get_many(processed, self.version)
+        misses = [i for i, r in enumerate(results) if r is None]
+        CACHE_LOOKUPS.inc(len(texts) - len(misses), 'nlp', 'hit')
+        CACHE_LOOKUPS.inc(len(misses), 'nlp', 'miss')
+
+        if misses:
+            # The models read the preprocessed text, so it is not preprocessed again
+            miss_processed = [processed[i] for i in misses]
+            keywords = self._keywords_for_processed(miss_processed)
+            intents = self._intents_for_processed(miss_processed)
+            for i, text_keywords, intent_result in zip(misses, keywords, intents):
+                results[i] = {**intent_result, "keywords": text_keywords}
+                if "error" not in intent_result:
+                    self.result_cache.set(processed[i], self.version, results[i])
+
+        return results
+
+    def stats(self) -> Dict:
+        return {
+            "model_version": self.version,
+            "artifact_format": self.artifact_format,
+            "result_cache": self.result_cache.stats(),
+            "gazetteer_patterns": len(self.gazetteer),
+            "pid": os.getpid()
+        }
+
+    def generate_filters(self, intent_result: Dict, entities: Dict) -> Dict:
+        """Generate search filters for Node.js API"""
+        filters = {
+            'category': intent_result['intent'],
+            'file_type': entities['file_types'],
+            'course': entities['courses'],
+            'lecturer': entities['lecturers'],
+            'week': entities['weeks'],
+            'semester': entities['semesters'],
+            'keywords': entities['keywords']
+        }
+        return {k: v for k, v in filters.items() if v}  # Remove empty filters
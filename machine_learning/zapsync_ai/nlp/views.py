@@ -1,161 +1,20 @@
+import json
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-import joblib
-import numpy as np
-from sentence_transformers import SentenceTransformer
-from typing import Dict, Union, List
-import os
-import re
-from sklearn.feature_extraction.text import TfidfVectorizer
-
-class NLPPredictor:
-    def __init__(self):
-        # Model paths
-        self.model_path = os.path.join(os.path.dirname(__file__), '..', 'models', 'file_classifier_model.pkl')
-        self.vectorizer_path = os.path.join(os.path.dirname(__file__), '..', 'models', 'keyword_extractor.pkl')
-        
-        try:
-            # Load classifier pipeline and vectorizer
-            self.classifier_pipeline = joblib.load(self.model_path)
-            self.keyword_extractor = joblib.load(self.vectorizer_path)
-            self.semantic_model = SentenceTransformer('all-MiniLM-L6-v2')
-        except Exception as e:
-            raise RuntimeError(f"Failed to load models: {str(e)}")
-
-    def preprocess_text(self, text: str) -> str:
-        """Match the preprocessing used during training"""
-        if not isinstance(text, str):
-            return ""
-        text = re.sub(r"[^\w\s'-]", " ", text.lower())
-        text = re.sub(r"\b\d+\b", " ", text)
-        text = re.sub(r"\s+", " ", text).strip()
-        return text
-
-    def extract_entities(self, text: str) -> Dict[str, Union[str, List[str]]]:
-        """Enhanced entity extraction matching our new categories"""
-        entities = {
-            'courses': [],
-            'lecturers': [],
-            'file_types': [],
-            'categories': [],
-            'weeks': [],
-            'semesters': [],
-            'keywords': self.extract_keywords(text)  # Using our trained keyword extractor
-        }
-        
-        # Updated known entities to match your dataset
-        known_courses = ["Python", "Machine Learning", "Operations Research", "Software Engineering"]
-        known_lecturers = ["Dr Partey", "Prof Eyram", "Dr Gadafi", "Prof Mensah"]
-        
-        text_lower = text.lower()
-        
-        # Extract courses
-        for course in known_courses:
-            if course.lower() in text_lower:
-                entities['courses'].append(course)
-        
-        # Extract lecturers
-        for lecturer in known_lecturers:
-            if lecturer.lower() in text_lower:
-                entities['lecturers'].append(lecturer)
-        
-        # Extract file types (extension-based)
-        file_types = {
-            'pdf': 'PDF',
-            'docx': 'Word',
-            'pptx': 'PowerPoint',
-            'png': 'Image',
-            'jpg': 'Image',
-            'jpeg': 'Image',
-            'cpp': 'Code',
-            'py': 'Code'
-        }
-        for ext, display_name in file_types.items():
-            if f'.{ext}' in text_lower:
-                entities['file_types'].append(display_name)
-        
-        # Week detection
-        week_match = re.search(r'week\s*(\d+)', text_lower)
-        if week_match:
-            entities['weeks'].append(f"Week {week_match.group(1)}")
-        
-        return entities
-
-    def extract_keywords(self, text: str, top_n: int = 5) -> List[str]:
-        """Extract keywords using our trained vectorizer"""
-        processed_text = self.preprocess_text(text)
-        tfidf_matrix = self.keyword_extractor.transform([processed_text])
-        feature_array = np.array(self.keyword_extractor.get_feature_names_out())
-        tfidf_sorting = np.argsort(tfidf_matrix.toarray()).flatten()[::-1]
-        return feature_array[tfidf_sorting][:top_n].tolist()
-
-    def predict_intent(self, text: str) -> Dict[str, Union[str, float]]:
-        """Predict the file category using our classifier"""
-        try:
-            processed_text = self.preprocess_text(text)
-            
-            # Get prediction with confidence
-            prediction = self.classifier_pipeline.predict_proba([processed_text])[0]
-            top_idx = np.argmax(prediction)
-            intent = self.classifier_pipeline.classes_[top_idx]
-            confidence = float(prediction[top_idx])
-            
-            # Apply business rules
-            intent = self.apply_business_rules(processed_text, intent, confidence)
-            
-            return {
-                "intent": intent,
-                "confidence": confidence
-            }
-        except Exception as e:
-            return {
-                "intent": "unknown",
-                "confidence": 0.0,
-                "error": str(e)
-            }
-
-    def apply_business_rules(self, text: str, intent: str, confidence: float) -> str:
-        """Override predictions based on business rules"""
-        # Force certain patterns regardless of model prediction
-        if 'lecture' in text and intent != 'lecture':
-            return 'lecture'
-        if 'slide' in text and intent != 'slide':
-            return 'slide'
-        if 'assignment' in text and intent != 'assignment':
-            return 'assignment'
-        if 'exam' in text and intent != 'exam':
-            return 'exam'
-        if 'research' in text and intent != 'research':
-            return 'research'
-        return intent
-
-    def predict(self, text: str) -> Dict:
-        """Main prediction method with enhanced output"""
-        entities = self.extract_entities(text)
-        intent_result = self.predict_intent(text)
-        
-        return {
-            "text": text,
-            "predicted_category": intent_result["intent"],
-            "confidence": intent_result["confidence"],
-            "entities": entities,
-            "suggested_filters": self.generate_filters(intent_result, entities)
-        }
-
-    def generate_filters(self, intent_result: Dict, entities: Dict) -> Dict:
-        """Generate search filters for Node.js API"""
-        filters = {
-            'category': intent_result['intent'],
-            'file_type': entities['file_types'],
-            'course': entities['courses'],
-            'lecturer': entities['lecturers'],
-            'week': entities['weeks'],
-            'keywords': entities['keywords']
-        }
-        return {k: v for k, v in filters.items() if v}  # Remove empty filters
-
-# Initialize predictor instance
-predictor = NLPPredictor()
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from zapsync_ai.batching import build_batcher
+from zapsync_ai.executor import get_executor
+from zapsync_ai.registry import registry
+
+
+def run_predictor(method, *args, **kwargs):
+    """Call an NLPPredictor method through the configured inference executor"""
+    return get_executor().run('nlp', method, *args, **kwargs)
+
+
+process_batcher = build_batcher(lambda texts: run_predictor('predict_batch', texts))
 
 @api_view(['POST'])
 def process_request(request):
@@ -172,7 +31,7 @@ def process_request(request):
         if not text:
             return Response({"error": "No text provided"}, status=400)
         
-        result = predictor.predict(text)
+        result = run_predictor('predict', text)
         
         return Response({
             "success": True,
@@ -183,4 +42,136 @@ def process_request(request):
         return Response({
             "success": False,
             "error": str(e)
-        }, status=500)
\ No newline at end of file
+        }, status=500)
+
+
+@csrf_exempt
+@require_POST
+async def process_request_async(request):
+    """ASGI variant of process_request: concurrent requests share one model call"""
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+
+    try:
+        text = str(data.get('text', '')).strip()
+        if not text:
+            return JsonResponse({"error": "No text provided"}, status=400)
+
+        result = await process_batcher.submit(text)
+
+        return JsonResponse({
+            "success": True,
+            "result": result
+        })
+
+    except Exception as e:
+        return JsonResponse({
+            "success": False,
+            "error": str(e)
+        }, status=500)
+
+
+@api_view(['POST'])
+def process_batch(request):
+    """
+    Classify many files in one request, e.g. a whole uploaded folder
+    {
+        "texts": ["Lecture 1.pdf", "Assignment 2.docx"]
+    }
+    """
+    try:
+        texts = request.data.get('texts', [])
+        if not isinstance(texts, list) or not texts:
+            return Response({"error": "texts must be a non-empty list"}, status=400)
+        if not all(isinstance(t, str) for t in texts):
+            return Response({"error": "texts must only contain strings"}, status=400)
+
+        results = run_predictor('predict_batch', [t.strip() for t in texts])
+
+        return Response({
+            "success": True,
+            "results": results
+        })
+
+    except Exception as e:
+        return Response({
+            "success": False,
+            "error": str(e)
+        }, status=500)
+
+
+@api_view(['POST'])
+def search(request):
+    """
+    Semantic search over indexed files
+    {
+        "query": "machine learning lecture slides",
+        "top_k": 10
+    }
+    """
+    try:
+        query = str(request.data.get('query', '')).strip()
+        if not query:
+            return Response({"error": "No query provided"}, status=400)
+        top_k = int(request.data.get('top_k', 10))
+
+        results = registry.get('search_index').search(query, top_k=min(max(top_k, 1), 100))
+
+        return Response({
+            "success": True,
+            "results": results
+        })
+
+    except Exception as e:
+        return Response({
+            "success": False,
+            "error": str(e)
+        }, status=500)
+
+
+@api_view(['POST'])
+def index_files(request):
+    """
+    Add files to the search index
+    {
+        "items": [{"id": "64f...", "name": "ML week 5.pdf", "tags": ["lecture"], "folder": "Machine Learning"}]
+    }
+    """
+    try:
+        items = request.data.get('items', [])
+        if not isinstance(items, list) or not items:
+            return Response({"error": "items must be a non-empty list"}, status=400)
+        if not all(isinstance(i, dict) for i in items):
+            return Response({"error": "items must only contain objects"}, status=400)
+
+        index = registry.get('search_index')
+        added = index.add(items)
+
+        return Response({
+            "success": True,
+            "added": added,
+            "total": len(index)
+        })
+
+    except ValueError as e:
+        return Response({
+            "success": False,
+            "error": str(e)
+        }, status=400)
+
+    except Exception as e:
+        return Response({
+            "success": False,
+            "error": str(e)
+        }, status=500)
+
+
+@api_view(['GET'])
+def stats(request):
+    return Response({
+        **run_predictor('stats'),
+        "micro_batching": process_batcher.stats(),
+        "executor": get_executor().stats()
+    })
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RecommendationSystemConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recommendation_system'
+
+    def ready(self):
+        from zapsync_ai.registry import registry
+        registry.register('recommender', 'recommendation_system.recommender.load_recommender')
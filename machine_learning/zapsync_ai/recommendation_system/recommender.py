@@ -0,0 +1,653 @@
+"""
+Item-to-item file recommendations from a sparse user x file co-access matrix.
+
+The model directory holds immutable generations, and CURRENT names the one
+being served:
+    CURRENT              replaced atomically once a generation is complete
+    gen-<version>/       manifest.json (sizes, neighbor count, version) and:
+
+    users.npy, user_rows.npy
+                         sorted fixed-width UTF-8 user IDs and their matrix rows
+    items.npy, item_rows.npy, item_ranks.npy
+                         the same for files, plus each column's position in items.npy
+    indptr.npy, indices.npy, counts.npy
+                         the access counts as the three arrays of a CSR matrix
+    item_indptr.npy, item_users.npy
+                         the same accesses by file (the CSR of the transpose)
+    delta_*.npy          users, files and (user, file) access counts recorded
+                         since the arrays above were last compacted
+    neighbor_ids.<b>.npy, neighbor_scores.<b>.npy
+                         for block b of BLOCK_ITEMS files, (files, k) int32 column
+                         indexes of each file's most similar files by cosine
+                         over co-access (-1 padded) and their float32 similarities
+    popular.npy          the most accessed files, for users with no history
+
+Everything is opened with ``mmap_mode`` and IDs are found by binary search,
+so opening a generation reads only its manifest and the array headers. Recording access events
+writes a new generation in which only the delta, the popular list and the
+neighbor blocks of files that gained co-accesses are new files; the rest are
+hard links to the previous generation's. The delta is folded into the
+compacted arrays once it outgrows a fraction of them, so ingest costs what
+the events touch rather than the size of the model. Writers take an fcntl
+lock on the directory around read-modify-write, so events recorded by
+several worker processes at once are all kept. Serving a user is a lookup of
+their files' neighbor rows and a weighted merge, with no matrix product at
+request time.
+"""
+
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import scipy.sparse as sp
+
+ID_WIDTH = 64
+NEIGHBORS = 50
+POPULAR = 100
+MAX_HISTORY = 500
+BLOCK_ITEMS = 4096
+KEEP_GENERATIONS = 3
+# The delta is compacted once it holds more (user, file) pairs than this, or
+# than this fraction of the compacted ones, whichever is larger
+COMPACT_MIN_PAIRS = 50000
+COMPACT_RATIO = 0.25
+
+ID_DTYPE = f'S{ID_WIDTH}'
+PAIR_KEY = np.int64(1 << 32)
+BASE_ARRAYS = (
+    'users', 'user_rows', 'items', 'item_rows', 'item_ranks',
+    'indptr', 'indices', 'counts', 'item_indptr', 'item_users'
+)
+DELTA_ARRAYS = ('delta_users', 'delta_items', 'delta_rows', 'delta_cols', 'delta_counts', 'delta_new')
+ARRAYS = BASE_ARRAYS + DELTA_ARRAYS + ('popular',)
+
+
+def encode_ids(ids):
+    """Fixed-width UTF-8 IDs; raises ValueError for IDs longer than ID_WIDTH bytes"""
+    encoded = [str(i).encode('utf-8') for i in ids]
+    for value in encoded:
+        if len(value) > ID_WIDTH:
+            raise ValueError(f"IDs are limited to {ID_WIDTH} bytes of UTF-8, got {len(value)}")
+    return np.array(encoded, dtype=ID_DTYPE)
+
+
+def _index_dtype(size):
+    return np.int32 if size < np.iinfo(np.int32).max else np.int64
+
+
+def _search(sorted_ids, rows, keys):
+    """Row of each key found in ``sorted_ids``, -1 for the others"""
+    found = np.full(len(keys), -1, dtype=np.int64)
+    if len(keys) and len(sorted_ids):
+        positions = np.minimum(np.searchsorted(sorted_ids, keys), len(sorted_ids) - 1)
+        hit = sorted_ids[positions] == keys
+        found[hit] = rows[positions[hit]]
+    return found
+
+
+def _gather(starts, ends, *arrays):
+    """The slices ``[start, end)`` of each array concatenated, and their lengths"""
+    starts = np.asarray(starts, dtype=np.int64)
+    lengths = np.asarray(ends, dtype=np.int64) - starts
+    positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    return [np.asarray(a[positions]) for a in arrays], lengths
+
+
+def _link(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def _base_arrays(user_ids, item_ids, matrix):
+    """Compacted arrays for ``matrix``, whose rows and columns are the given IDs"""
+    matrix = matrix.tocsr()
+    matrix.sum_duplicates()
+    user_rows = np.argsort(user_ids, kind='stable')
+    item_rows = np.argsort(item_ids, kind='stable')
+    item_ranks = np.empty_like(item_rows)
+    item_ranks[item_rows] = np.arange(len(item_rows))
+    by_item = matrix.T.tocsr()
+    by_item.sort_indices()
+    index_dtype = _index_dtype(max(matrix.nnz, *matrix.shape))
+    return {
+        'users': user_ids[user_rows],
+        'user_rows': user_rows.astype(np.int64),
+        'items': item_ids[item_rows],
+        'item_rows': item_rows.astype(np.int64),
+        'item_ranks': item_ranks.astype(np.int64),
+        'indptr': matrix.indptr.astype(np.int64),
+        'indices': matrix.indices.astype(index_dtype),
+        'counts': matrix.data.astype(np.int32),
+        'item_indptr': by_item.indptr.astype(np.int64),
+        'item_users': by_item.indices.astype(index_dtype)
+    }
+
+
+def _empty_delta():
+    return {
+        'delta_users': np.empty(0, dtype=ID_DTYPE),
+        'delta_items': np.empty(0, dtype=ID_DTYPE),
+        'delta_rows': np.empty(0, dtype=np.int64),
+        'delta_cols': np.empty(0, dtype=np.int64),
+        'delta_counts': np.empty(0, dtype=np.int32),
+        'delta_new': np.empty(0, dtype=bool)
+    }
+
+
+def _empty_arrays():
+    empty_ids = np.empty(0, dtype=ID_DTYPE)
+    return {
+        **_base_arrays(empty_ids, empty_ids, sp.csr_matrix((0, 0), dtype=np.int32)),
+        **_empty_delta(),
+        'popular': np.empty(0, dtype=np.int64)
+    }
+
+
+class Generation:
+    """One generation of the model; new ones are built in memory, then written"""
+
+    def __init__(self, arrays, version, neighbors, directory=None, blocks=0):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.version = version
+        self.neighbors = neighbors
+        self.directory = directory
+        self.blocks = blocks
+        self._blocks = {}
+        self.base_users = len(self.users)
+        self.base_items = len(self.items)
+        self.n_users = self.base_users + len(self.delta_users)
+        self.n_items = self.base_items + len(self.delta_items)
+
+        # The delta is small, so its lookup structures are built when opened
+        delta_user_rows = np.argsort(self.delta_users, kind='stable')
+        self._delta_user_ids = self.delta_users[delta_user_rows]
+        self._delta_user_rows = delta_user_rows + self.base_users
+        delta_item_rows = np.argsort(self.delta_items, kind='stable')
+        self._delta_item_ids = self.delta_items[delta_item_rows]
+        self._delta_item_rows = delta_item_rows + self.base_items
+        self.delta_keys = np.asarray(self.delta_rows) * PAIR_KEY + np.asarray(self.delta_cols)
+        # Pairs that are not in the compacted arrays, by user and by file
+        new = np.flatnonzero(self.delta_new)
+        self._new_rows = np.asarray(self.delta_rows)[new]
+        self._new_row_cols = np.asarray(self.delta_cols)[new]
+        by_col = np.argsort(self._new_row_cols, kind='stable')
+        self._new_cols = self._new_row_cols[by_col]
+        self._new_col_rows = self._new_rows[by_col]
+
+    @classmethod
+    def open(cls, directory):
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r') for name in ARRAYS}
+        gen = cls(arrays, manifest['version'], manifest['neighbors'], directory, manifest['blocks'])
+        # Mapped up front, so the generation stays readable after it is pruned
+        for b in range(gen.blocks):
+            gen._blocks[b] = tuple(
+                np.load(os.path.join(directory, f'{kind}.{b}.npy'), mmap_mode='r')
+                for kind in ('neighbor_ids', 'neighbor_scores')
+            )
+        return gen
+
+    @property
+    def pairs(self):
+        """Number of distinct (user, file) pairs"""
+        return len(self.indices) + len(self._new_rows)
+
+    def find_users(self, keys):
+        rows = _search(self.users, self.user_rows, keys)
+        missing = rows < 0
+        rows[missing] = _search(self._delta_user_ids, self._delta_user_rows, keys[missing])
+        return rows
+
+    def find_items(self, keys):
+        columns = _search(self.items, self.item_rows, keys)
+        missing = columns < 0
+        columns[missing] = _search(self._delta_item_ids, self._delta_item_rows, keys[missing])
+        return columns
+
+    def item_ids(self, columns):
+        return [
+            (self.items[self.item_ranks[c]] if c < self.base_items
+             else self.delta_items[c - self.base_items]).decode('utf-8')
+            for c in columns
+        ]
+
+    def history(self, row):
+        """(columns, access counts) of one user"""
+        parts_cols, parts_counts = [], []
+        if row < self.base_users:
+            lo, hi = self.indptr[row], self.indptr[row + 1]
+            parts_cols.append(np.asarray(self.indices[lo:hi], dtype=np.int64))
+            parts_counts.append(np.asarray(self.counts[lo:hi]))
+        lo, hi = np.searchsorted(self.delta_rows, [row, row + 1])
+        parts_cols.append(np.asarray(self.delta_cols[lo:hi]))
+        parts_counts.append(np.asarray(self.delta_counts[lo:hi]))
+        # A file can have counts in both the compacted arrays and the delta
+        columns, inverse = np.unique(np.concatenate(parts_cols), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate(parts_counts), minlength=len(columns))
+        return columns, counts
+
+    def degrees(self, columns):
+        """Number of distinct users of each column"""
+        columns = np.asarray(columns, dtype=np.int64)
+        degrees = np.zeros(len(columns), dtype=np.int64)
+        base = columns < self.base_items
+        degrees[base] = self.item_indptr[columns[base] + 1] - self.item_indptr[columns[base]]
+        degrees += np.searchsorted(self._new_cols, columns, 'right') - np.searchsorted(self._new_cols, columns)
+        return degrees
+
+    def _binary(self, keys, indptr, base_values, base_count, new_keys, new_values, width):
+        """Binary CSR of the given rows of a user x file (or file x user) relation"""
+        keys = np.asarray(keys, dtype=np.int64)
+        base = keys[keys < base_count]
+        (base_cols,), base_lengths = _gather(indptr[base], indptr[base + 1], base_values)
+        (new_cols,), new_lengths = _gather(
+            np.searchsorted(new_keys, keys), np.searchsorted(new_keys, keys, 'right'), new_values
+        )
+        rows = np.concatenate([
+            np.repeat(np.flatnonzero(keys < base_count), base_lengths),
+            np.repeat(np.arange(len(keys)), new_lengths)
+        ])
+        columns = np.concatenate([base_cols.astype(np.int64), new_cols])
+        return sp.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, columns)), shape=(len(keys), width)
+        )
+
+    def users_of(self, columns):
+        return self._binary(columns, self.item_indptr, self.item_users, self.base_items,
+                            self._new_cols, self._new_col_rows, self.n_users)
+
+    def items_of(self, rows):
+        return self._binary(rows, self.indptr, self.indices, self.base_users,
+                            self._new_rows, self._new_row_cols, self.n_items)
+
+    def block(self, b):
+        """(ids, scores) neighbor arrays of block ``b``, None if not written yet"""
+        return self._blocks.get(b)
+
+    def neighbor_rows(self, columns):
+        columns = np.asarray(columns, dtype=np.int64)
+        ids = np.full((len(columns), self.neighbors), -1, dtype=np.int32)
+        scores = np.zeros((len(columns), self.neighbors), dtype=np.float32)
+        blocks = columns // BLOCK_ITEMS
+        for b in np.unique(blocks):
+            block = self.block(int(b))
+            if block is not None:
+                selected = blocks == b
+                ids[selected] = block[0][columns[selected] - b * BLOCK_ITEMS]
+                scores[selected] = block[1][columns[selected] - b * BLOCK_ITEMS]
+        return ids, scores
+
+    def compacted(self):
+        """The same model with the delta folded into the compacted arrays"""
+        user_ids = np.empty(self.base_users, dtype=ID_DTYPE)
+        user_ids[self.user_rows] = self.users
+        item_ids = np.empty(self.base_items, dtype=ID_DTYPE)
+        item_ids[self.item_rows] = self.items
+        indptr = np.concatenate([self.indptr, np.full(len(self.delta_users), self.indptr[-1])])
+        base = sp.csr_matrix((self.counts, self.indices, indptr), shape=(self.n_users, self.n_items))
+        delta = sp.csr_matrix(
+            (np.asarray(self.delta_counts), (np.asarray(self.delta_rows), np.asarray(self.delta_cols))),
+            shape=(self.n_users, self.n_items)
+        )
+        arrays = _base_arrays(
+            np.concatenate([user_ids, self.delta_users]),
+            np.concatenate([item_ids, self.delta_items]),
+            base + delta
+        )
+        arrays.update(_empty_delta(), popular=self.popular)
+        return Generation(arrays, self.version, self.neighbors)
+
+
+class CoAccessRecommender:
+    def __init__(self, directory, neighbors=NEIGHBORS):
+        self.directory = directory
+        self.neighbors = neighbors
+        self._lock = threading.Lock()
+        self._current = None
+        os.makedirs(directory, exist_ok=True)
+        self.current_path = os.path.join(directory, 'CURRENT')
+        self._gen = Generation(_empty_arrays(), 0, neighbors)
+        self._reopen_if_changed()
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive across processes (and threads) on this directory"""
+        with open(os.path.join(self.directory, '.lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _signature(self):
+        st = os.stat(self.current_path)
+        return st.st_ino, st.st_mtime_ns
+
+    def _refresh(self):
+        """Pick up a generation written by another process"""
+        try:
+            signature = self._signature()
+        except OSError:
+            return
+        if signature != self._current:
+            with self._lock:
+                self._reopen_if_changed()
+
+    def _reopen_if_changed(self):
+        # Retry if CURRENT moves on, and its old generation is pruned, while opening
+        for _ in range(5):
+            try:
+                signature = self._signature()
+                if signature == self._current:
+                    return
+                with open(self.current_path) as f:
+                    gen = Generation.open(os.path.join(self.directory, f.read().strip()))
+            except FileNotFoundError:
+                if not os.path.exists(self.current_path):
+                    return
+                continue
+            if gen.neighbors != self.neighbors:
+                raise RuntimeError(
+                    f"Recommender at {self.directory} keeps {gen.neighbors} "
+                    f"neighbors per file, not {self.neighbors}; call rebuild()"
+                )
+            self._gen, self._current = gen, signature
+            return
+
+    def _write(self, gen, changed, blocks):
+        """Publish ``gen`` as the next generation.
+
+        ``changed`` names the arrays that differ from the current generation
+        and ``blocks`` maps block numbers to their new (ids, scores); the
+        rest is hard-linked from the current generation.
+        """
+        previous = self._gen
+        version = previous.version + 1
+        block_count = max(previous.blocks, -(-gen.n_items // BLOCK_ITEMS))
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=self.directory)
+        try:
+            for name in ARRAYS:
+                target = os.path.join(staging, f'{name}.npy')
+                if name in changed or previous.directory is None:
+                    np.save(target, getattr(gen, name))
+                else:
+                    _link(os.path.join(previous.directory, f'{name}.npy'), target)
+            for b in range(block_count):
+                for i, kind in enumerate(('neighbor_ids', 'neighbor_scores')):
+                    target = os.path.join(staging, f'{kind}.{b}.npy')
+                    if b < previous.blocks and b not in blocks:
+                        _link(os.path.join(previous.directory, f'{kind}.{b}.npy'), target)
+                    else:
+                        np.save(target, blocks[b][i] if b in blocks else self._empty_block()[i])
+            manifest = {
+                'users': gen.n_users,
+                'items': gen.n_items,
+                'accesses': gen.pairs,
+                'neighbors': self.neighbors,
+                'blocks': block_count,
+                'version': version
+            }
+            with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+                json.dump(manifest, f)
+            os.chmod(staging, 0o755)  # mkdtemp creates it owner-only
+            name = f'gen-{version:010d}'
+            os.replace(staging, os.path.join(self.directory, name))
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        tmp_path = self.current_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(name + '\n')
+        os.replace(tmp_path, self.current_path)
+        self._reopen_if_changed()
+        self._prune(name)
+
+    def _prune(self, current):
+        generations = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith('gen-') and name != current
+        )
+        # Readers that still map a pruned generation keep its pages until they move on
+        for name in generations[:max(len(generations) - (KEEP_GENERATIONS - 1), 0)]:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def _blocks_from(self, neighbor_ids, neighbor_scores):
+        blocks = {}
+        for b, start in enumerate(range(0, len(neighbor_ids), BLOCK_ITEMS)):
+            ids, scores = self._empty_block()
+            rows = slice(start, start + BLOCK_ITEMS)
+            ids[:len(neighbor_ids[rows])] = neighbor_ids[rows]
+            scores[:len(neighbor_scores[rows])] = neighbor_scores[rows]
+            blocks[b] = ids, scores
+        return blocks
+
+    def _empty_block(self):
+        return (np.full((BLOCK_ITEMS, self.neighbors), -1, dtype=np.int32),
+                np.zeros((BLOCK_ITEMS, self.neighbors), dtype=np.float32))
+
+    def _neighbor_rows(self, gen, columns):
+        """Top-k cosine neighbors of ``columns`` over binary co-access, in blocks.
+
+        Only the users of those files and those users' files are read, so
+        the cost follows the neighborhood of ``columns``, not the model size.
+        """
+        ids = np.full((len(columns), self.neighbors), -1, dtype=np.int32)
+        scores = np.zeros((len(columns), self.neighbors), dtype=np.float32)
+        for start in range(0, len(columns), BLOCK_ITEMS):
+            block = columns[start:start + BLOCK_ITEMS]
+            by_item = gen.users_of(block)
+            users = np.unique(by_item.indices)
+            by_item = sp.csr_matrix(
+                (by_item.data, np.searchsorted(users, by_item.indices), by_item.indptr),
+                shape=(len(block), len(users))
+            )
+            co = (by_item @ gen.items_of(users)).tocsr()
+            co.sort_indices()
+            touched = np.unique(np.concatenate([block, co.indices]))
+            norms = np.sqrt(gen.degrees(touched).astype(np.float32))
+            norms[norms == 0] = 1.0
+            row_of = np.repeat(np.arange(len(block)), np.diff(co.indptr))
+            co.data = co.data / (
+                norms[np.searchsorted(touched, block)][row_of] * norms[np.searchsorted(touched, co.indices)]
+            )
+
+            for r, column in enumerate(block):
+                lo, hi = co.indptr[r], co.indptr[r + 1]
+                others, sims = co.indices[lo:hi], co.data[lo:hi]
+                keep = others != column
+                others, sims = others[keep], sims[keep]
+                if len(sims) > self.neighbors:
+                    top = np.argpartition(sims, -self.neighbors)[-self.neighbors:]
+                    others, sims = others[top], sims[top]
+                order = np.argsort(-sims, kind='stable')
+                ids[start + r, :len(order)] = others[order]
+                scores[start + r, :len(order)] = sims[order]
+        return ids, scores
+
+    def _updated_blocks(self, gen, columns):
+        """New contents of the neighbor blocks holding ``columns``"""
+        ids, scores = self._neighbor_rows(gen, columns)
+        blocks = {}
+        for b in np.unique(columns // BLOCK_ITEMS).tolist():
+            current = self._gen.block(b)
+            blocks[b] = tuple(np.array(a) for a in current) if current is not None else self._empty_block()
+        for column, row_ids, row_scores in zip(columns.tolist(), ids, scores):
+            b, offset = divmod(column, BLOCK_ITEMS)
+            blocks[b][0][offset] = row_ids
+            blocks[b][1][offset] = row_scores
+        return blocks
+
+    @staticmethod
+    def _popular(gen, candidates):
+        candidates = np.unique(np.asarray(candidates, dtype=np.int64))
+        order = np.argsort(-gen.degrees(candidates), kind='stable')
+        return candidates[order[:POPULAR]]
+
+    @staticmethod
+    def _assign(found, keys, start):
+        """Fill the -1s in ``found`` with new indexes from ``start``, in first-seen order"""
+        missing = found < 0
+        if not missing.any():
+            return found, keys[:0]
+        new_keys, first, inverse = np.unique(keys[missing], return_index=True, return_inverse=True)
+        order = np.argsort(first, kind='stable')
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        found = found.copy()
+        found[missing] = start + rank[inverse]
+        return found, new_keys[order]
+
+    def _in_base(self, gen, rows, columns):
+        """Whether each (row, column) pair is in the compacted arrays"""
+        result = np.zeros(len(rows), dtype=bool)
+        candidates = np.flatnonzero((rows < gen.base_users) & (columns < gen.base_items))
+        if len(candidates):
+            users = np.unique(rows[candidates])
+            (cols,), lengths = _gather(gen.indptr[users], gen.indptr[users + 1], gen.indices)
+            existing = np.repeat(users, lengths) * PAIR_KEY + cols
+            result[candidates] = np.isin(rows[candidates] * PAIR_KEY + columns[candidates], existing)
+        return result
+
+    def record(self, events):
+        """Add ``(user_id, file_id)`` access events and update affected neighbor rows.
+
+        Raises ValueError for IDs longer than ID_WIDTH bytes of UTF-8.
+        """
+        events = [(str(u), str(f)) for u, f in events if u not in (None, '') and f not in (None, '')]
+        if not events:
+            return 0
+        user_keys = encode_ids([u for u, _ in events])
+        item_keys = encode_ids([f for _, f in events])
+
+        with self._lock, self._file_lock():
+            self._reopen_if_changed()
+            gen = self._gen
+            rows, new_users = self._assign(gen.find_users(user_keys), user_keys, gen.n_users)
+            columns, new_items = self._assign(gen.find_items(item_keys), item_keys, gen.n_items)
+
+            keys, batch_counts = np.unique(rows * PAIR_KEY + columns, return_counts=True)
+            batch_rows, batch_cols = keys // PAIR_KEY, keys % PAIR_KEY
+            in_delta = np.isin(keys, gen.delta_keys)
+            in_base = np.zeros(len(keys), dtype=bool)
+            in_base[~in_delta] = self._in_base(gen, batch_rows[~in_delta], batch_cols[~in_delta])
+            new_pairs = ~in_delta & ~in_base
+
+            merged, first, inverse = np.unique(
+                np.concatenate([gen.delta_keys, keys]), return_index=True, return_inverse=True
+            )
+            counts = np.bincount(
+                inverse, weights=np.concatenate([gen.delta_counts, batch_counts]), minlength=len(merged)
+            )
+            # The delta's own flag wins for pairs it already had
+            flags = np.concatenate([gen.delta_new, ~in_base])[first]
+            arrays = {name: getattr(gen, name) for name in ARRAYS}
+            arrays.update({
+                'delta_users': np.concatenate([gen.delta_users, new_users]),
+                'delta_items': np.concatenate([gen.delta_items, new_items]),
+                'delta_rows': merged // PAIR_KEY,
+                'delta_cols': merged % PAIR_KEY,
+                'delta_counts': counts.astype(np.int32),
+                'delta_new': flags
+            })
+            updated = Generation(arrays, gen.version, self.neighbors)
+            updated.popular = self._popular(updated, np.concatenate([gen.popular, batch_cols]))
+            changed = set(DELTA_ARRAYS) | {'popular'}
+
+            # Only pairs seen for the first time change co-access; their files
+            # and everything else those users accessed need new neighbor rows
+            changed_users = np.unique(batch_rows[new_pairs])
+            dirty = np.unique(updated.items_of(changed_users).indices) if len(changed_users) else np.empty(0, dtype=np.int64)
+            blocks = self._updated_blocks(updated, dirty.astype(np.int64)) if len(dirty) else {}
+
+            if len(merged) > max(COMPACT_MIN_PAIRS, COMPACT_RATIO * len(gen.indices)):
+                updated = updated.compacted()
+                changed = set(ARRAYS)
+            self._write(updated, changed, blocks)
+        return len(events)
+
+    def rebuild(self):
+        """Compact the model and recompute every file's neighbor row"""
+        with self._lock, self._file_lock():
+            self._reopen_if_changed()
+            gen = self._gen.compacted()
+            columns = np.arange(gen.n_items)
+            gen.popular = self._popular(gen, columns)
+            ids, scores = self._neighbor_rows(gen, columns)
+            self._write(gen, set(ARRAYS), self._blocks_from(ids, scores))
+
+    def recommend(self, user, limit=10):
+        """Files the user has not accessed, ranked by summed neighbor similarity"""
+        self._refresh()
+        gen = self._gen
+        try:
+            row = int(gen.find_users(encode_ids([user]))[0])
+        except ValueError:
+            row = -1  # Longer than any recorded ID
+
+        seen = np.empty(0, dtype=np.int64)
+        if row >= 0:
+            seen, counts = gen.history(row)
+            weights = np.log1p(counts).astype(np.float32)
+            if len(seen) > MAX_HISTORY:
+                top = np.argpartition(weights, -MAX_HISTORY)[-MAX_HISTORY:]
+                seen, weights = seen[top], weights[top]
+
+        results = []
+        if len(seen):
+            neighbor_ids, neighbor_scores = gen.neighbor_rows(seen)
+            candidates = neighbor_ids.ravel()
+            scores = (neighbor_scores * weights[:, None]).ravel()
+            keep = (candidates >= 0) & ~np.isin(candidates, seen)
+            candidates, inverse = np.unique(candidates[keep], return_inverse=True)
+            totals = np.bincount(inverse, weights=scores[keep])
+            if len(totals) > limit:
+                top = np.argpartition(totals, -limit)[-limit:]
+                candidates, totals = candidates[top], totals[top]
+            order = np.argsort(-totals, kind='stable')
+            candidates, totals = candidates[order], totals[order]
+            results = [
+                {'id': file_id, 'score': float(s), 'reason': 'co_access'}
+                for file_id, s in zip(gen.item_ids(candidates), totals)
+            ]
+        else:
+            candidates = np.empty(0, dtype=np.int64)
+
+        # Fill up with popular files the user has not seen
+        if len(results) < limit:
+            taken = set(seen.tolist()) | set(candidates.tolist())
+            for c in gen.popular.tolist():
+                if c not in taken:
+                    results.append({'id': gen.item_ids([c])[0], 'score': 0.0, 'reason': 'popular'})
+                    if len(results) == limit:
+                        break
+        return results
+
+    def stats(self):
+        gen = self._gen
+        return {
+            'users': gen.n_users,
+            'files': gen.n_items,
+            'accesses': gen.pairs,
+            'delta_accesses': len(gen.delta_keys),
+            'neighbors': self.neighbors,
+            'version': gen.version
+        }
+
+
+def load_recommender():
+    from django.conf import settings
+
+    return CoAccessRecommender(
+        str(settings.RECOMMENDATION_DIR),
+        neighbors=getattr(settings, 'RECOMMENDATION_NEIGHBORS', NEIGHBORS)
+    )
@@ -1,3 +1,123 @@
-from django.test import TestCase
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from . import recommender
+from .recommender import CoAccessRecommender, encode_ids
+
+
+def _record_batches(directory, worker, batches):
+    model = CoAccessRecommender(directory, neighbors=5)
+    for i in range(batches):
+        model.record([(f'u{worker}-{i % 7}', f'f{(worker + i * j) % 23}') for j in range(5)])
+
+
+class CoAccessRecommenderTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def history(self, model, user):
+        gen = model._gen
+        row = int(gen.find_users(encode_ids([user]))[0])
+        columns, counts = gen.history(row)
+        return dict(zip(gen.item_ids(columns), counts.astype(int).tolist()))
+
+    def test_recommends_co_accessed_files(self):
+        model = CoAccessRecommender(self.directory, neighbors=5)
+        model.record([('alice', 'a'), ('alice', 'b'), ('bob', 'a'), ('bob', 'b'), ('carol', 'a'), ('dave', 'c')])
+        results = model.recommend('carol', limit=2)
+        self.assertEqual(results[0]['id'], 'b')
+        self.assertEqual(results[0]['reason'], 'co_access')
+        self.assertEqual(results[1], {'id': 'c', 'score': 0.0, 'reason': 'popular'})
+        self.assertEqual([r['reason'] for r in model.recommend('nobody', limit=3)], ['popular'] * 3)
+
+    def test_counts_survive_delta_and_compaction(self):
+        rng = np.random.default_rng(0)
+        events = []
+        model = CoAccessRecommender(self.directory, neighbors=5)
+        with mock.patch.object(recommender, 'COMPACT_MIN_PAIRS', 100):
+            for _ in range(20):
+                batch = [(f'u{rng.integers(15)}', f'f{rng.integers(30)}') for _ in range(20)]
+                events.extend(batch)
+                model.record(batch)
+                expected = Counter(f for u, f in events if u == 'u3')
+                self.assertEqual(self.history(model, 'u3'), dict(expected))
+        self.assertEqual(model.stats()['accesses'], len(set(events)))
+
+    def test_rebuild_matches_brute_force_cosine(self):
+        rng = np.random.default_rng(1)
+        model = CoAccessRecommender(self.directory, neighbors=4)
+        events = [(f'u{rng.integers(20)}', f'f{rng.integers(25)}') for _ in range(200)]
+        model.record(events)
+        model.rebuild()
+
+        gen = model._gen
+        matrix = np.zeros((gen.n_users, gen.n_items))
+        for user, item in set(events):
+            matrix[gen.find_users(encode_ids([user]))[0], gen.find_items(encode_ids([item]))[0]] = 1
+        co = matrix.T @ matrix
+        norms = np.sqrt(np.diag(co))
+        similarity = co / np.outer(norms, norms)
+        np.fill_diagonal(similarity, 0)
+        _, scores = gen.neighbor_rows(np.arange(gen.n_items))
+        for column in range(gen.n_items):
+            expected = np.sort(similarity[column][similarity[column] > 0])[::-1][:4]
+            np.testing.assert_allclose(scores[column][:len(expected)], expected, rtol=1e-5)
+
+    def test_rejects_over_long_ids(self):
+        model = CoAccessRecommender(self.directory, neighbors=5)
+        with self.assertRaises(ValueError):
+            model.record([('é' * 33, 'file')])
+        model.record([('é' * 32, 'file')])
+        self.assertEqual(self.history(model, 'é' * 32), {'file': 1})
+        self.assertEqual(model.recommend('x' * 100, limit=1)[0]['reason'], 'popular')
+
+    def test_other_instances_see_new_generations(self):
+        writer = CoAccessRecommender(self.directory, neighbors=5)
+        reader = CoAccessRecommender(self.directory, neighbors=5)
+        for i in range(recommender.KEEP_GENERATIONS + 2):
+            writer.record([('alice', f'f{i}'), ('bob', f'f{i}')])
+        self.assertEqual(reader.recommend('alice', limit=1), [])
+        self.assertEqual(reader.stats(), writer.stats())
+        generations = [name for name in os.listdir(self.directory) if name.startswith('gen-')]
+        self.assertEqual(len(generations), recommender.KEEP_GENERATIONS)
+
+    def test_concurrent_processes_lose_no_events(self):
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=_record_batches, args=(self.directory, w, 10)) for w in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+
+        model = CoAccessRecommender(self.directory, neighbors=5)
+        for w in range(4):
+            expected = Counter()
+            for i in range(10):
+                if i % 7 == 3:
+                    expected.update(f'f{(w + i * j) % 23}' for j in range(5))
+            self.assertEqual(self.history(model, f'u{w}-3'), dict(expected))
+        self.assertEqual(model.stats()['version'], 40)
+
+    def test_concurrent_threads_lose_no_events(self):
+        model = CoAccessRecommender(self.directory, neighbors=5)
+        threads = [
+            threading.Thread(target=model.record, args=([(f'u{t}', 'shared'), ('all', f'f{t}')],))
+            for t in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.history(model, 'all'), {f'f{t}': 1 for t in range(8)})
+        self.assertEqual(model.stats()['users'], 9)
 
-# Create your tests here.
@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import recommendations, record_events, stats
+
+urlpatterns = [
+    path('', recommendations, name='recommendations'),
+    path('events/', record_events, name='recommendation_events'),
+    path('stats/', stats, name='recommendation_stats'),
+]
@@ -1,3 +1,66 @@
-from django.shortcuts import render
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from rest_framework import status
+from zapsync_ai.registry import registry
 
-# Create your views here.
+
+def get_recommender():
+    return registry.get('recommender')
+
+
+@api_view(['GET'])
+def recommendations(request):
+    user = request.query_params.get('user')
+    if not user:
+        return Response({'error': 'user is required'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = min(max(int(request.query_params.get('limit', 10)), 1), 100)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        return Response({
+            'user': user,
+            'recommendations': get_recommender().recommend(user, limit=limit)
+        })
+
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['POST'])
+def record_events(request):
+    """
+    Record file accesses
+    {
+        "events": [{"user": "64a...", "file": "64f..."}]
+    }
+    """
+    events = request.data.get('events')
+    if not isinstance(events, list) or not all(isinstance(e, dict) for e in events):
+        return Response(
+            {'error': 'events must be a list of {"user", "file"} objects'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        recommender = get_recommender()
+        recorded = recommender.record((e.get('user'), e.get('file')) for e in events)
+        return Response({'recorded': recorded, **recommender.stats()})
+
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['GET'])
+def stats(request):
+    return Response(get_recommender().stats())
@@ -0,0 +1,142 @@
+"""
+Versioned model artifacts.
+
+Training scripts publish each model as an immutable release directory:
+
+    models/releases/<model>/<stamp>-<hash>/   the artifact files (and bundle
+                                              directories, see bundles.py)
+    models/releases/<model>/CURRENT           name of the release to serve
+
+A release is written under a temporary name and renamed into place, and
+CURRENT is replaced atomically last, so a reader sees either the previous
+release or the complete new one. Models with no releases yet are served
+from the flat files in ``models/``, as before.
+
+This module has no Django dependency so the training scripts can import it.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+MODELS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'models'))
+RELEASES_DIR_NAME = 'releases'
+KEEP_RELEASES = 5
+
+
+def artifact_version(*paths):
+    """Short content hash identifying a set of model artifact files"""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def _model_dir(model, models_dir):
+    return os.path.join(models_dir, RELEASES_DIR_NAME, model)
+
+
+def current_release(model, models_dir=MODELS_DIR):
+    """Name of the release CURRENT points to, or None before the first publish"""
+    try:
+        with open(os.path.join(_model_dir(model, models_dir), 'CURRENT')) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def resolve(model, filenames, models_dir=MODELS_DIR):
+    """(version, [paths]) of the artifacts to serve for ``model``"""
+    release = current_release(model, models_dir)
+    if release is not None:
+        directory = os.path.join(_model_dir(model, models_dir), release)
+        return release, [os.path.join(directory, name) for name in filenames]
+    paths = [os.path.join(models_dir, name) for name in filenames]
+    return artifact_version(*paths), paths
+
+
+def probe(model, filenames, models_dir=MODELS_DIR):
+    """Cheap token that changes whenever ``resolve`` would return something new"""
+    release = current_release(model, models_dir)
+    if release is not None:
+        return release
+    signature = []
+    for name in filenames:
+        try:
+            st = os.stat(os.path.join(models_dir, name))
+            signature.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class Release:
+    """A release being written; use through ``new_release``"""
+
+    def __init__(self, model, staging_dir):
+        self.model = model
+        self.staging_dir = staging_dir
+        self.version = None
+
+    def path(self, filename):
+        return os.path.join(self.staging_dir, filename)
+
+
+def _prune(model_dir, current, keep):
+    releases = sorted(
+        (name for name in os.listdir(model_dir)
+         if not name.startswith('.') and os.path.isdir(os.path.join(model_dir, name))),
+        key=lambda name: os.stat(os.path.join(model_dir, name)).st_mtime_ns
+    )
+    for name in releases[:max(len(releases) - keep, 0)]:
+        if name != current:
+            shutil.rmtree(os.path.join(model_dir, name), ignore_errors=True)
+
+
+@contextmanager
+def new_release(model, models_dir=MODELS_DIR, keep=KEEP_RELEASES):
+    """Publish the files written into ``release.path(...)`` as the current release.
+
+        with new_release('profanity') as release:
+            joblib.dump(model, release.path('profane_model_v2.pkl'))
+        print(release.version)
+
+    Nothing is published if the block raises. Only the newest ``keep``
+    releases are kept on disk.
+    """
+    model_dir = _model_dir(model, models_dir)
+    os.makedirs(model_dir, exist_ok=True)
+    release = Release(model, tempfile.mkdtemp(prefix='.staging-', dir=model_dir))
+    try:
+        yield release
+        files = sorted(
+            os.path.relpath(os.path.join(root, name), release.staging_dir)
+            for root, _, names in os.walk(release.staging_dir) for name in names
+        )
+        if not files:
+            raise RuntimeError(f"Release of {model} contains no files")
+        digest = artifact_version(*(release.path(name) for name in files))
+        version = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{digest}"
+        os.chmod(release.staging_dir, 0o755)  # mkdtemp creates it owner-only
+        os.replace(release.staging_dir, os.path.join(model_dir, version))
+    except BaseException:
+        shutil.rmtree(release.staging_dir, ignore_errors=True)
+        raise
+
+    # A temporary file of its own, so concurrent publishers never write into each other's
+    fd, tmp_path = tempfile.mkstemp(prefix='.CURRENT-', dir=model_dir)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(version + '\n')
+        os.chmod(tmp_path, 0o644)  # mkstemp creates it owner-only
+        os.replace(tmp_path, os.path.join(model_dir, 'CURRENT'))
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    release.version = version
+    _prune(model_dir, version, keep)
@@ -12,5 +12,12 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'zapsync_ai.settings')
+os.environ.setdefault('ZAPSYNC_SERVING_MODE', 'asgi')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.MODEL_PRELOAD:
+    from zapsync_ai.registry import registry  # noqa: E402
+    registry.preload()
@@ -0,0 +1,83 @@
+"""
+Dynamic micro-batching for async inference views.
+
+Requests that arrive within ``max_wait`` seconds of each other (or until
+``max_batch_size`` of them are waiting) are combined into a single call to
+a batch function, which runs in a worker thread so the event loop keeps
+accepting requests. Each caller then gets its own result back.
+"""
+
+import asyncio
+
+from django.conf import settings
+from asgiref.sync import sync_to_async
+
+
+class MicroBatcher:
+    def __init__(self, batch_fn, max_batch_size=64, max_wait=0.002):
+        """``batch_fn`` maps a list of items to a list of results of the same length"""
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._loop = None
+        self._pending = []
+        self._timer = None
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Futures are bound to the loop that created them
+            self._loop, self._pending, self._timer = loop, [], None
+
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self._loop.create_task(self._run(batch))
+
+    async def _run(self, batch):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await sync_to_async(self.batch_fn, thread_sensitive=False)(
+                [item for item, _ in batch]
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000
+        }
+
+
+def build_batcher(batch_fn):
+    """MicroBatcher configured from settings.MICRO_BATCHING"""
+    config = getattr(settings, 'MICRO_BATCHING', {})
+    return MicroBatcher(
+        batch_fn,
+        max_batch_size=config.get('MAX_BATCH_SIZE', 64),
+        max_wait=config.get('MAX_WAIT_MS', 2) / 1000
+    )
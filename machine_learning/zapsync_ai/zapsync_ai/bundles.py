@@ -0,0 +1,377 @@
+"""
+Compact, memory-mapped bundles of linear text models.
+
+A bundle is a directory written next to the pickles of a release:
+
+    manifest.json   analyzer settings, TF-IDF or hashing options, classes and format
+    terms.npy       vocabulary as sorted fixed-width UTF-8, position = column
+    idf.npy         float32 idf weight of each column
+                    (neither for a HashingVectorizer, which is stateless)
+    coef.npy        float32 (classes, columns) weights of the linear classifier
+    intercept.npy   its float64 intercepts
+
+Everything is opened with ``mmap_mode`` so loading reads only the manifest,
+and every process serving the same release shares the pages through the OS
+page cache instead of unpickling its own copy. Terms are found with a binary
+search over the sorted array, so no vocabulary dict is built, and the pickled
+``stop_words_`` (only kept by sklearn for introspection) is not carried over.
+
+``export`` refuses to write a bundle whose predictions on ``check_texts``
+deviate from the sklearn objects by more than ``TOLERANCE``; float32
+weights keep probabilities within about 1e-7 of the pickles.
+
+This module has no Django dependency so the training scripts can import it.
+"""
+
+import json
+import os
+from collections import Counter
+from collections.abc import Mapping
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.special import expit, softmax
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.naive_bayes import ComplementNB, MultinomialNB
+from sklearn.preprocessing import normalize
+
+FORMAT_VERSION = 1
+TOLERANCE = 1e-5
+MANIFEST = 'manifest.json'
+ARRAYS = ('terms', 'idf', 'coef', 'intercept')
+
+# Vectorizer parameters that define its analyzer; anything else it
+# would need (a custom tokenizer, preprocessor or analyzer) cannot be exported
+ANALYZER_PARAMS = (
+    'analyzer', 'encoding', 'decode_error', 'strip_accents', 'lowercase',
+    'token_pattern', 'stop_words', 'ngram_range'
+)
+
+
+class SortedVocabulary(Mapping):
+    """Read-only term -> column mapping over a sorted array of UTF-8 terms"""
+
+    def __init__(self, terms):
+        self.terms = terms
+
+    def lookup(self, tokens):
+        """Column of each token, -1 where it is not in the vocabulary"""
+        columns = np.full(len(tokens), -1, dtype=np.int64)
+        if not len(tokens) or not len(self.terms):
+            return columns
+        encoded = [t.encode('utf-8') for t in tokens]
+        # Converting to the array's width truncates longer tokens, which
+        # could then equal a term, so those are ruled out first
+        fits = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)) <= self.terms.itemsize
+        keys = np.array(encoded, dtype=self.terms.dtype)
+        positions = np.minimum(np.searchsorted(self.terms, keys), len(self.terms) - 1)
+        found = fits & (self.terms[positions] == keys)
+        columns[found] = positions[found]
+        return columns
+
+    def __getitem__(self, term):
+        column = int(self.lookup([term])[0])
+        if column < 0:
+            raise KeyError(term)
+        return column
+
+    def __iter__(self):
+        return (term.decode('utf-8') for term in self.terms)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def items(self):
+        return zip(self, range(len(self.terms)))
+
+
+class BundledTfidfVectorizer:
+    """``TfidfVectorizer.transform`` over bundled arrays.
+
+    Exposes the attributes the serving code reads from a fitted
+    TfidfVectorizer (``vocabulary_``, ``idf_``, the analyzer settings).
+    """
+
+    def __init__(self, manifest, terms, idf):
+        for name, value in manifest['analyzer'].items():
+            setattr(self, name, value)
+        self.ngram_range = tuple(self.ngram_range)
+        self.tokenizer = None
+        self.preprocessor = None
+        tfidf = manifest['tfidf']
+        self.norm = tfidf['norm']
+        self.use_idf = tfidf['use_idf']
+        self.binary = tfidf['binary']
+        self.sublinear_tf = tfidf['sublinear_tf']
+        self.dtype = np.dtype(tfidf['dtype'])
+        self.vocabulary_ = SortedVocabulary(terms)
+        self.idf_ = idf
+        self._analyzer = TfidfVectorizer(**manifest['analyzer']).build_analyzer()
+
+    def build_analyzer(self):
+        return self._analyzer
+
+    def get_feature_names_out(self):
+        return np.array(list(self.vocabulary_), dtype=object)
+
+    def transform(self, raw_documents):
+        if isinstance(raw_documents, str):
+            raise ValueError("Iterable over raw text documents expected, string object received.")
+        tokens, counts, lengths = [], [], []
+        for doc in raw_documents:
+            doc_counts = Counter(self._analyzer(doc))
+            tokens.extend(doc_counts)
+            counts.extend(doc_counts.values())
+            lengths.append(len(doc_counts))
+
+        columns = self.vocabulary_.lookup(tokens)
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+        known = columns >= 0
+        X = sp.csr_matrix(
+            (np.asarray(counts, dtype=self.dtype)[known], (rows[known], columns[known])),
+            shape=(len(lengths), len(self.vocabulary_)), dtype=self.dtype
+        )
+        X.sort_indices()
+
+        # The same steps, in the same order, as TfidfTransformer.transform
+        if self.binary:
+            X.data.fill(1)
+        if self.sublinear_tf:
+            np.log(X.data, X.data)
+            X.data += 1.0
+        if self.use_idf:
+            X.data *= self.idf_[X.indices]
+        if self.norm is not None:
+            X = normalize(X, norm=self.norm, copy=False)
+        return X
+
+
+class BundledHashingVectorizer:
+    """A HashingVectorizer rebuilt from its parameters; it has no fitted state"""
+
+    def __init__(self, manifest):
+        params = {**manifest['analyzer'], **manifest['hashing']}
+        params['ngram_range'] = tuple(params['ngram_range'])
+        params['dtype'] = np.dtype(params['dtype']).type
+        self._vectorizer = HashingVectorizer(**params)
+        for name, value in params.items():
+            setattr(self, name, value)
+        self.tokenizer = None
+        self.preprocessor = None
+
+    def build_analyzer(self):
+        return self._vectorizer.build_analyzer()
+
+    def transform(self, raw_documents):
+        return self._vectorizer.transform(raw_documents)
+
+
+class BundledLinearClassifier:
+    """``predict_proba`` of a linear classifier over bundled weights.
+
+    ``link`` is 'logistic' for a binary logistic regression and 'softmax'
+    for multinomial logistic regression and naive Bayes, whose joint log
+    likelihood is linear in the features.
+    """
+
+    def __init__(self, manifest, coef, intercept):
+        self.link = manifest['link']
+        self.classes_ = np.array(manifest['classes'])
+        self.coef_ = coef
+        self.intercept_ = intercept
+
+    def decision_function(self, X):
+        scores = np.asarray(X @ self.coef_.T) + self.intercept_
+        return scores.ravel() if self.link == 'logistic' else scores
+
+    def predict_proba(self, X):
+        scores = self.decision_function(X)
+        if self.link == 'logistic':
+            probability = expit(scores)
+            return np.stack([1 - probability, probability], axis=1)
+        return softmax(scores, axis=1)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+class BundledPipeline:
+    """Vectorizer and classifier chained like the sklearn Pipeline they came from"""
+
+    def __init__(self, vectorizer, classifier):
+        self.vectorizer = vectorizer
+        self.classifier = classifier
+        self.classes_ = classifier.classes_
+
+    def predict_proba(self, raw_documents):
+        return self.classifier.predict_proba(self.vectorizer.transform(raw_documents))
+
+    def predict(self, raw_documents):
+        return self.classifier.predict(self.vectorizer.transform(raw_documents))
+
+
+class Bundle:
+    def __init__(self, manifest, arrays):
+        self.manifest = manifest
+        if manifest['vectorizer'] == 'hashing':
+            self.vectorizer = BundledHashingVectorizer(manifest)
+        else:
+            self.vectorizer = BundledTfidfVectorizer(manifest, arrays['terms'], arrays['idf'])
+        self.classifier = None
+        if manifest['classifier'] is not None:
+            self.classifier = BundledLinearClassifier(
+                manifest['classifier'], arrays['coef'], arrays['intercept']
+            )
+
+    def pipeline(self):
+        if self.classifier is None:
+            raise ValueError("Bundle has no classifier")
+        return BundledPipeline(self.vectorizer, self.classifier)
+
+
+def exists(directory):
+    return os.path.exists(os.path.join(directory, MANIFEST))
+
+
+def load(directory, mmap_mode='r'):
+    """Open the bundle in ``directory``, memory-mapping its arrays"""
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported bundle format {manifest.get('format')!r} in {directory}")
+    arrays = {
+        name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode)
+        for name in manifest['arrays']
+    }
+    return Bundle(manifest, arrays)
+
+
+def pipeline_steps(pipeline):
+    """(vectorizer, classifier) of a text-classification Pipeline.
+
+    Steps in between must be samplers (e.g. imblearn's RandomOverSampler),
+    which only act while fitting.
+    """
+    steps = [step for _, step in pipeline.steps]
+    for step in steps[1:-1]:
+        if not hasattr(step, 'fit_resample'):
+            raise ValueError(f"Cannot bundle pipeline step {type(step).__name__}")
+    return steps[0], steps[-1]
+
+
+def _vectorizer_manifest(vectorizer):
+    if isinstance(vectorizer, HashingVectorizer):
+        kind = 'hashing'
+    elif isinstance(vectorizer, TfidfVectorizer) and hasattr(vectorizer, 'vocabulary_'):
+        kind = 'tfidf'
+    else:
+        raise ValueError("Only fitted TfidfVectorizers and HashingVectorizers can be bundled")
+    params = vectorizer.get_params()
+    if (params['analyzer'] != 'word' or params['tokenizer'] is not None
+            or params['preprocessor'] is not None or params['input'] != 'content'):
+        raise ValueError("Vectorizer uses custom text processing")
+    analyzer = {name: params[name] for name in ANALYZER_PARAMS}
+    analyzer['ngram_range'] = list(analyzer['ngram_range'])
+    if analyzer['stop_words'] is not None and not isinstance(analyzer['stop_words'], str):
+        analyzer['stop_words'] = sorted(analyzer['stop_words'])
+    if kind == 'hashing':
+        return {
+            'vectorizer': kind,
+            'analyzer': analyzer,
+            'hashing': {
+                'n_features': params['n_features'],
+                'alternate_sign': params['alternate_sign'],
+                'norm': params['norm'],
+                'binary': params['binary'],
+                'dtype': np.dtype(params['dtype']).name
+            }
+        }
+    return {
+        'vectorizer': kind,
+        'analyzer': analyzer,
+        'tfidf': {
+            'norm': params['norm'],
+            'use_idf': params['use_idf'],
+            'binary': params['binary'],
+            'sublinear_tf': params['sublinear_tf'],
+            'dtype': np.dtype(params['dtype']).name
+        }
+    }
+
+
+def _classifier_arrays(classifier, columns):
+    """(manifest entry, coef, intercept) with features in bundle column order"""
+    if isinstance(classifier, LogisticRegression):
+        intercept = np.asarray(classifier.intercept_, dtype=np.float64)
+        link = 'logistic' if len(classifier.classes_) <= 2 else 'softmax'
+        weights = classifier.coef_
+    elif isinstance(classifier, SGDClassifier):
+        # Multiclass SGD normalizes one-vs-rest probabilities, which is not a softmax
+        if classifier.loss != 'log_loss' or len(classifier.classes_) > 2:
+            raise ValueError("Only binary SGDClassifiers with log_loss can be bundled")
+        intercept = np.asarray(classifier.intercept_, dtype=np.float64)
+        link = 'logistic'
+        weights = classifier.coef_
+    elif isinstance(classifier, (ComplementNB, MultinomialNB)):
+        # ComplementNB only adds the class prior when there is a single class
+        if isinstance(classifier, MultinomialNB) or len(classifier.classes_) == 1:
+            intercept = np.asarray(classifier.class_log_prior_, dtype=np.float64)
+        else:
+            intercept = np.zeros(len(classifier.classes_))
+        link = 'softmax'
+        weights = classifier.feature_log_prob_
+    else:
+        raise ValueError(f"Cannot bundle classifier {type(classifier).__name__}")
+    entry = {'type': type(classifier).__name__, 'link': link, 'classes': classifier.classes_.tolist()}
+    return entry, np.ascontiguousarray(weights[:, columns], dtype=np.float32), intercept
+
+
+def _max_deviation(vectorizer, classifier, bundle, texts):
+    if classifier is not None:
+        expected = classifier.predict_proba(vectorizer.transform(texts))
+        actual = bundle.classifier.predict_proba(bundle.vectorizer.transform(texts))
+        return float(np.max(np.abs(expected - actual)))
+    difference = abs(vectorizer.transform(texts) - bundle.vectorizer.transform(texts))
+    return float(difference.max()) if difference.nnz else 0.0
+
+
+def export(directory, vectorizer, classifier=None, check_texts=(), tolerance=TOLERANCE):
+    """Write ``vectorizer`` (and ``classifier``, fitted on its output) as a bundle.
+
+    TF-IDF columns are renumbered in sorted term order, which is already the
+    order of any vocabulary sklearn learned. Raises ValueError if the bundle's
+    output on ``check_texts`` is more than ``tolerance`` away from sklearn's.
+    Returns the manifest.
+    """
+    manifest = {'format': FORMAT_VERSION, **_vectorizer_manifest(vectorizer)}
+    if manifest['vectorizer'] == 'hashing':
+        columns = np.arange(vectorizer.n_features)
+        arrays = {}
+    else:
+        ordered = sorted(vectorizer.vocabulary_.items(), key=lambda item: item[0].encode('utf-8'))
+        encoded = [term.encode('utf-8') for term, _ in ordered]
+        columns = np.array([column for _, column in ordered], dtype=np.int64)
+        arrays = {
+            'terms': np.array(encoded, dtype=f"S{max(map(len, encoded), default=1)}"),
+            'idf': np.asarray(vectorizer.idf_, dtype=np.float32)[columns] if vectorizer.use_idf
+            else np.ones(len(columns), dtype=np.float32)
+        }
+    manifest['classifier'] = None
+    if classifier is not None:
+        manifest['classifier'], arrays['coef'], arrays['intercept'] = _classifier_arrays(classifier, columns)
+    manifest['arrays'] = [name for name in ARRAYS if name in arrays]
+
+    texts = list(check_texts)
+    deviation = _max_deviation(vectorizer, classifier, Bundle(manifest, arrays), texts) if texts else 0.0
+    if deviation > tolerance:
+        raise ValueError(f"Bundle deviates from the sklearn model by {deviation:g} (tolerance {tolerance:g})")
+    manifest['check'] = {'texts': len(texts), 'max_deviation': deviation}
+
+    os.makedirs(directory, exist_ok=True)
+    for name in manifest['arrays']:
+        np.save(os.path.join(directory, f'{name}.npy'), arrays[name])
+    # The manifest goes last; a directory without one is not a bundle
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
@@ -0,0 +1,224 @@
+"""
+Columnar cache for the spreadsheet datasets used by the training scripts.
+
+The first read of a workbook parses it once with ``pd.read_excel`` and writes
+every sheet as one ``.npy`` file per column under ``datasets/.cache``. Later
+reads open only the requested columns with ``mmap_mode`` and can yield them
+in row chunks. A cache is keyed by the source file's content hash; the
+hash is only recomputed when the file's mtime or size changes.
+
+Column layouts:
+    numeric, bool, datetime   <i>.npy in the column's own dtype
+    text                      <i>.offsets.npy (int64, rows + 1) and
+                              <i>.data.npy (the UTF-8 bytes of all values)
+    anything else             <i>.pickle.npy, an object array (not mmap-able)
+Text and object columns with missing values also get a <i>.mask.npy.
+
+This module has no Django dependency so scripts can import it directly.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR_NAME = '.cache'
+CHUNK_ROWS = 100000
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _slug(name):
+    return re.sub(r'[^\w-]+', '_', str(name)).strip('_') or 'sheet'
+
+
+def _write_column(directory, i, series):
+    """Save one column and return its manifest entry"""
+    entry = {'name': series.name, 'dtype': str(series.dtype)}
+    if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biufcmM':
+        entry['layout'] = 'array'
+        np.save(os.path.join(directory, f'{i}.npy'), series.to_numpy())
+        return entry
+
+    values = series.to_numpy(dtype=object, na_value=None)
+    mask = np.array([v is None for v in values], dtype=bool)
+    if mask.any():
+        np.save(os.path.join(directory, f'{i}.mask.npy'), mask)
+        entry['has_mask'] = True
+
+    if all(isinstance(v, str) for v in values[~mask]):
+        encoded = [b'' if v is None else v.encode('utf-8') for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        np.save(os.path.join(directory, f'{i}.offsets.npy'), offsets)
+        np.save(os.path.join(directory, f'{i}.data.npy'), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+        entry['layout'] = 'text'
+    else:
+        np.save(os.path.join(directory, f'{i}.pickle.npy'), values, allow_pickle=True)
+        entry['layout'] = 'pickle'
+    return entry
+
+
+def _build(source, directory):
+    """Parse every sheet of ``source`` once and write its columns into ``directory``"""
+    sheets = pd.read_excel(source, sheet_name=None)
+    manifest = {'source': os.path.basename(source), 'sheets': {}}
+    for position, (sheet, frame) in enumerate(sheets.items()):
+        sheet_dir = f'{position}-{_slug(sheet)}'
+        os.makedirs(os.path.join(directory, sheet_dir))
+        manifest['sheets'][sheet] = {
+            'directory': sheet_dir,
+            'rows': len(frame),
+            'columns': [
+                _write_column(os.path.join(directory, sheet_dir), i, frame[column])
+                for i, column in enumerate(frame.columns)
+            ]
+        }
+    with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+
+
+class DatasetCache:
+    def __init__(self, source, cache_dir=None):
+        self.source = os.path.abspath(source)
+        self.cache_dir = cache_dir or os.path.join(os.path.dirname(self.source), CACHE_DIR_NAME)
+        self.stem = os.path.splitext(os.path.basename(self.source))[0]
+        self.pointer_path = os.path.join(self.cache_dir, f'{self.stem}.json')
+        self.directory = self._ensure()
+        with open(os.path.join(self.directory, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+
+    def _ensure(self):
+        """Directory of an up-to-date cache for the source, converting it if needed"""
+        stat = os.stat(self.source)
+        pointer = {}
+        if os.path.exists(self.pointer_path):
+            with open(self.pointer_path) as f:
+                pointer = json.load(f)
+
+        if pointer.get('mtime_ns') == stat.st_mtime_ns and pointer.get('size') == stat.st_size:
+            digest = pointer['sha256']
+        else:
+            digest = _file_hash(self.source)
+        directory = os.path.join(self.cache_dir, f'{self.stem}-{digest[:16]}')
+
+        if not os.path.exists(os.path.join(directory, 'manifest.json')):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_dir = tempfile.mkdtemp(prefix=f'.{self.stem}-', dir=self.cache_dir)
+            try:
+                _build(self.source, tmp_dir)
+                os.replace(tmp_dir, directory)
+            except OSError:
+                # Another process finished the same conversion first
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                if not os.path.exists(os.path.join(directory, 'manifest.json')):
+                    raise
+            except Exception:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+            self._remove_stale(directory)
+
+        if pointer.get('sha256') != digest or pointer.get('mtime_ns') != stat.st_mtime_ns:
+            tmp_path = self.pointer_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': digest}, f)
+            os.replace(tmp_path, self.pointer_path)
+        return directory
+
+    def _remove_stale(self, keep):
+        prefix = f'{self.stem}-'
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith(prefix) and path != keep and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def sheet_names(self):
+        return list(self.manifest['sheets'])
+
+    def _sheet(self, sheet):
+        if sheet is None:
+            sheet = self.sheet_names()[0]
+        if sheet not in self.manifest['sheets']:
+            raise KeyError(f"Worksheet named '{sheet}' not found in {self.manifest['source']}")
+        return self.manifest['sheets'][sheet]
+
+    def _columns(self, info, columns):
+        entries = {entry['name']: (i, entry) for i, entry in enumerate(info['columns'])}
+        if columns is None:
+            return list(entries.values())
+        missing = [c for c in columns if c not in entries]
+        if missing:
+            raise KeyError(f"Columns not found: {', '.join(map(str, missing))}")
+        return [entries[c] for c in columns]
+
+    def _load(self, info, i, entry):
+        """Memory-mapped arrays for one column"""
+        base = os.path.join(self.directory, info['directory'], str(i))
+        arrays = {}
+        if entry['layout'] == 'array':
+            arrays['values'] = np.load(f'{base}.npy', mmap_mode='r')
+        elif entry['layout'] == 'text':
+            arrays['offsets'] = np.load(f'{base}.offsets.npy', mmap_mode='r')
+            arrays['data'] = np.load(f'{base}.data.npy', mmap_mode='r')
+        else:
+            arrays['values'] = np.load(f'{base}.pickle.npy', allow_pickle=True)
+        if entry.get('has_mask'):
+            arrays['mask'] = np.load(f'{base}.mask.npy', mmap_mode='r')
+        return arrays
+
+    @staticmethod
+    def _slice(entry, arrays, start, stop):
+        if entry['layout'] == 'text':
+            offsets = arrays['offsets'][start:stop + 1]
+            data = arrays['data'][offsets[0]:offsets[-1]].tobytes()
+            relative = offsets - offsets[0]
+            values = np.array(
+                [data[a:b].decode('utf-8') for a, b in zip(relative[:-1], relative[1:])],
+                dtype=object
+            )
+        else:
+            values = np.array(arrays['values'][start:stop])
+
+        if 'mask' in arrays:
+            values = values.astype(object)
+            values[np.asarray(arrays['mask'][start:stop])] = None
+        series = pd.Series(values, name=entry['name'])
+        return series.astype(entry['dtype']) if entry['layout'] != 'pickle' else series
+
+    def iter_chunks(self, sheet=None, columns=None, chunk_size=CHUNK_ROWS):
+        """Yield DataFrames of up to ``chunk_size`` rows holding only ``columns``"""
+        info = self._sheet(sheet)
+        selected = [(i, entry, self._load(info, i, entry)) for i, entry in self._columns(info, columns)]
+        rows = info['rows']
+        for start in range(0, max(rows, 1), chunk_size):
+            stop = min(start + chunk_size, rows)
+            frame = pd.DataFrame({
+                entry['name']: self._slice(entry, arrays, start, stop)
+                for i, entry, arrays in selected
+            })
+            frame.index = pd.RangeIndex(start, stop)
+            yield frame
+
+    def read(self, sheet=None, columns=None):
+        chunks = list(self.iter_chunks(sheet, columns, chunk_size=max(self._sheet(sheet)['rows'], 1)))
+        return chunks[0]
+
+
+def read_sheet(path, sheet=None, columns=None):
+    """Drop-in for ``pd.read_excel(path, sheet_name=sheet, usecols=columns)`` through the cache"""
+    return DatasetCache(path).read(sheet, columns)
+
+
+def iter_sheet(path, sheet=None, columns=None, chunk_size=CHUNK_ROWS):
+    return DatasetCache(path).iter_chunks(sheet, columns, chunk_size)
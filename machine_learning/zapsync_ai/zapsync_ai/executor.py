@@ -0,0 +1,216 @@
+"""
+Where model calls run: inline on the request thread, or in a pool of
+worker processes that each hold their own preloaded copy of the models.
+
+Views call ``get_executor().run(model_name, method_name, *args)``; only the
+model name, method name and arguments (plain lists of strings) are pickled
+to the worker, and the plain-dict results are pickled back.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from .metrics import INFERENCE_SECONDS, metrics
+from .registry import registry
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceTimeout(RuntimeError):
+    pass
+
+
+def _init_worker(models):
+    """Runs once in every pool process: set up Django and load the models"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'zapsync_ai.settings')
+    # Workers run models inline; they must not start pools of their own
+    os.environ['ZAPSYNC_INFERENCE_EXECUTOR'] = 'inline'
+    import django
+    django.setup()
+    registry.preload(models)
+
+
+def _call(model, method, args, kwargs):
+    return getattr(registry.get(model), method)(*args, **kwargs)
+
+
+def _call_with_metrics(model, method, args, kwargs):
+    """Worker-side _call that also hands back the metrics recorded since the last
+    call and the versions of the worker's loaded models"""
+    try:
+        return _call(model, method, args, kwargs), metrics.drain(), registry.versions()
+    except Exception as e:
+        e.metrics = metrics.drain()
+        raise
+
+
+def _ping():
+    return os.getpid()
+
+
+def default_workers():
+    """The cores divided among the server's worker processes, at least one each.
+
+    gunicorn.conf.py exports its worker count as ZAPSYNC_SERVER_WORKERS;
+    every server worker starts its own pool.
+    """
+    server_workers = int(os.environ.get('ZAPSYNC_SERVER_WORKERS') or 1)
+    return max((os.cpu_count() or 1) // max(server_workers, 1), 1)
+
+
+class InlineExecutor:
+    name = 'inline'
+
+    def run(self, model, method, *args, **kwargs):
+        with INFERENCE_SECONDS.time(model, method, self.name):
+            return _call(model, method, args, kwargs)
+
+    def model_versions(self):
+        return registry.versions()
+
+    def stats(self):
+        return {'backend': self.name}
+
+
+class ProcessPoolInferenceExecutor:
+    """Runs model calls in worker processes so inference is not bound by the GIL.
+
+    A worker that dies breaks the whole ``ProcessPoolExecutor``; the pool is
+    then replaced and the call retried once. Calls that exceed ``timeout``
+    raise InferenceTimeout, and since a running call cannot be cancelled,
+    the pool's processes are killed and the pool replaced, so a hung worker
+    never holds its slot. Calls in flight on other workers then see a
+    broken pool and are retried on the new one.
+    """
+    name = 'process'
+
+    def __init__(self, workers=None, timeout=10.0, start_method='forkserver', models=None):
+        self.workers = workers or default_workers()
+        self.timeout = timeout
+        self.start_method = start_method
+        self.models = list(models or registry.names())
+        self._lock = threading.Lock()
+        self._replaced = threading.Condition(self._lock)
+        self._replacing = None
+        self.restarts = 0
+        self.timeouts = 0
+        self.calls = 0
+        self._versions = {}
+        self._pool = self._start()
+
+    def _start(self):
+        pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(self.start_method),
+            initializer=_init_worker,
+            initargs=(self.models,)
+        )
+        # Start (and load models in) every worker now, not on the first requests
+        for future in [pool.submit(_ping) for _ in range(self.workers)]:
+            future.result()
+        return pool
+
+    def _restart(self, broken_pool, reason="Inference worker died"):
+        with self._lock:
+            if self._pool is not broken_pool:
+                return  # Another thread already replaced it
+            if self._replacing is broken_pool:
+                # Another thread is replacing it; wait without blocking other calls
+                self._replaced.wait_for(lambda: self._replacing is not broken_pool)
+                return
+            self._replacing = broken_pool
+
+        logger.warning("%s, restarting the process pool", reason)
+        # shutdown() does not stop running calls; stuck workers are killed
+        for process in list((broken_pool._processes or {}).values()):
+            if process.is_alive():
+                process.kill()
+        broken_pool.shutdown(wait=False, cancel_futures=True)
+        # Starting the pool loads the models, so it is not done under the lock
+        pool = None
+        try:
+            pool = self._start()
+        finally:
+            with self._lock:
+                if pool is not None:
+                    self._pool = pool
+                    self.restarts += 1
+                self._replacing = None
+                self._replaced.notify_all()
+
+    def run(self, model, method, *args, timeout=None, **kwargs):
+        with INFERENCE_SECONDS.time(model, method, self.name):
+            return self._run(model, method, args, kwargs, timeout)
+
+    def _run(self, model, method, args, kwargs, timeout):
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            self.calls += 1
+        for attempt in range(2):
+            pool = self._pool
+            try:
+                future = pool.submit(_call_with_metrics, model, method, args, kwargs)
+                result, worker_metrics, versions = future.result(timeout=timeout)
+                metrics.merge(worker_metrics)
+                self._versions.update(versions)
+                return result
+            except BrokenProcessPool:
+                self._restart(pool)
+                if attempt:
+                    raise
+            except TimeoutError:
+                with self._lock:
+                    self.timeouts += 1
+                if not future.cancel():
+                    self._restart(pool, f"{model}.{method} timed out")
+                raise InferenceTimeout(f"{model}.{method} took longer than {timeout}s")
+            except Exception as e:
+                metrics.merge(getattr(e, 'metrics', {}))
+                raise
+
+    def model_versions(self):
+        """Versions reported by the most recent calls (workers reload independently)"""
+        return dict(self._versions)
+
+    def stats(self):
+        return {
+            'backend': self.name,
+            'workers': self.workers,
+            'start_method': self.start_method,
+            'calls': self.calls,
+            'timeouts': self.timeouts,
+            'restarts': self.restarts
+        }
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """The process-wide executor configured by settings.INFERENCE_EXECUTOR"""
+    global _executor, _executor_pid
+    if _executor is not None and _executor_pid == os.getpid():
+        return _executor
+
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            config = getattr(settings, 'INFERENCE_EXECUTOR', {})
+            if os.environ.get('ZAPSYNC_INFERENCE_EXECUTOR', config.get('BACKEND')) == 'process':
+                _executor = ProcessPoolInferenceExecutor(
+                    workers=config.get('WORKERS'),
+                    timeout=config.get('TIMEOUT', 10.0),
+                    start_method=config.get('START_METHOD', 'forkserver'),
+                    models=config.get('MODELS')
+                )
+            else:
+                _executor = InlineExecutor()
+            _executor_pid = os.getpid()
+    return _executor
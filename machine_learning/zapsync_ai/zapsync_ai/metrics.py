@@ -0,0 +1,304 @@
+"""
+In-process metrics for the serving hot paths, exported in the Prometheus
+text format at /metrics.
+
+Models record per-stage timings, batch sizes and cache outcomes through
+series bound once at import, e.g. ``STAGE_SECONDS.labels('nlp',
+'preprocess')``. A sample costs a bisect and an uncontended lock, a small
+fraction of even the cheapest model call, so instrumentation stays on in
+production.
+
+Values are per process. With the process-pool inference executor, every
+model call also returns the metrics the worker recorded since its previous
+call, and the executor folds them into the serving process (see ``drain``
+and ``merge``), so one scrape still sees the model stages. Under a
+multi-worker gunicorn each worker reports its own values.
+"""
+
+import bisect
+import threading
+import time
+
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs += [f'{n}="{_escape(v)}"' for n, v in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """A metric family; ``labels(...)`` returns the series for one set of label values.
+
+    Hot paths should bind their series once (``SERIES = METRIC.labels(...)``
+    at import time) so recording a sample skips the label lookup.
+    """
+    kind = None
+    series_class = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        series = self._series.get(values)
+        if series is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+            with self._lock:
+                series = self._series.setdefault(values, self._new_series())
+        return series
+
+    def _new_series(self):
+        return self.series_class()
+
+    def drain(self):
+        """{label values: delta} for series changed since the last drain, picklable"""
+        return {
+            values: series.take() for values, series in list(self._series.items()) if series.dirty
+        }
+
+    def merge(self, deltas):
+        for values, delta in deltas.items():
+            self.labels(*values).merge(delta)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values in sorted(self._series):
+            lines.extend(self._samples(values, self._series[values]))
+        return lines
+
+
+class _CounterSeries:
+    __slots__ = ('value', 'dirty', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self.dirty = False
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+            self.dirty = True
+
+    def take(self):
+        with self._lock:
+            value, self.value, self.dirty = self.value, 0, False
+        return value
+
+    def merge(self, delta):
+        self.inc(delta)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+    series_class = _CounterSeries
+
+    def inc(self, amount, *labels):
+        self.labels(*labels).inc(amount)
+
+    def _samples(self, values, series):
+        return [f'{self.name}_total{_format_labels(self.labelnames, values)} {_format_value(series.value)}']
+
+
+class _GaugeSeries:
+    __slots__ = ('value', 'dirty')
+
+    def __init__(self):
+        self.value = 0.0
+        self.dirty = False
+
+    def set(self, value):
+        self.value = value
+        self.dirty = True
+
+    def take(self):
+        self.dirty = False
+        return self.value
+
+    def merge(self, delta):
+        self.set(delta)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+    series_class = _GaugeSeries
+
+    def set(self, value, *labels):
+        self.labels(*labels).set(value)
+
+    def _samples(self, values, series):
+        return [f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(series.value)}']
+
+
+class _HistogramSeries:
+    __slots__ = ('buckets', 'counts', 'sum', 'dirty', '_lock')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # Per-bucket (not cumulative) counts, with the +Inf bucket last
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.dirty = False
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.dirty = True
+
+    def time(self):
+        return _Timer(self)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum
+
+    def take(self):
+        with self._lock:
+            delta = (self.counts, self.sum)
+            self.counts, self.sum, self.dirty = [0] * len(self.counts), 0.0, False
+        return delta
+
+    def merge(self, delta):
+        counts, total = delta
+        with self._lock:
+            for i, count in enumerate(counts):
+                self.counts[i] += count
+            self.sum += total
+            self.dirty = True
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_series(self):
+        return _HistogramSeries(self.buckets)
+
+    def observe(self, value, *labels):
+        self.labels(*labels).observe(value)
+
+    def time(self, *labels):
+        return _Timer(self.labels(*labels))
+
+    def _samples(self, values, series):
+        counts, total = series.snapshot()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            label_text = _format_labels(self.labelnames, values, [('le', _format_value(bound))])
+            lines.append(f'{self.name}_bucket{label_text} {cumulative}')
+        label_text = _format_labels(self.labelnames, values)
+        lines.append(f'{self.name}_sum{label_text} {_format_value(total)}')
+        lines.append(f'{self.name}_count{label_text} {cumulative}')
+        return lines
+
+
+class _Timer:
+    __slots__ = ('series', 'started')
+
+    def __init__(self, series):
+        self.series = series
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.series.observe(time.perf_counter() - self.started)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def drain(self):
+        """{metric name: deltas} recorded since the last drain, for shipping to another process"""
+        deltas = {}
+        for name, metric in self._metrics.items():
+            changed = metric.drain()
+            if changed:
+                deltas[name] = changed
+        return deltas
+
+    def merge(self, deltas):
+        for name, changed in deltas.items():
+            metric = self._metrics.get(name)
+            if metric is not None:
+                metric.merge(changed)
+
+    def render(self):
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+REQUEST_SECONDS = metrics.register(Histogram(
+    'zapsync_http_request_duration_seconds',
+    'Time from the request entering Django to the response leaving it, by route.',
+    ('route', 'method', 'status')
+))
+INFERENCE_SECONDS = metrics.register(Histogram(
+    'zapsync_inference_call_seconds',
+    'Model calls as seen by the views, including any hand-off to a worker process.',
+    ('model', 'method', 'executor')
+))
+STAGE_SECONDS = metrics.register(Histogram(
+    'zapsync_model_stage_seconds',
+    'Time spent in each stage of a model call.',
+    ('model', 'stage')
+))
+BATCH_SIZE = metrics.register(Histogram(
+    'zapsync_model_batch_size',
+    'Number of texts handled by one model call.',
+    ('model', 'method'),
+    buckets=SIZE_BUCKETS
+))
+CACHE_LOOKUPS = metrics.register(Counter(
+    'zapsync_model_cache_lookups',
+    'Cache lookups in front of the models by outcome (hit, miss, or oov for inputs '
+    'answered by the vocabulary index).',
+    ('model', 'outcome')
+))
+MODEL_LOAD_SECONDS = metrics.register(Gauge(
+    'zapsync_model_load_seconds',
+    'Seconds the last load of each model took, by phase (load or warmup).',
+    ('model', 'phase')
+))
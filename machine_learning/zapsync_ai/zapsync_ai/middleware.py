@@ -0,0 +1,163 @@
+import cProfile
+import logging
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .executor import get_executor
+from .metrics import REQUEST_SECONDS
+from .profiling import get_profile_store, text_hash
+
+logger = logging.getLogger(__name__)
+
+# Largest JSON body whose text is hashed for a profile; bigger ones are not read
+# ahead of the view (streaming uploads to /filter/scan/ must stay streamed)
+MAX_HASHED_BODY = 1024 * 1024
+
+# One capture at a time per process: cProfile cannot nest and profiling
+# every concurrent request would multiply the overhead
+_profiling = threading.Lock()
+
+
+class RequestMetricsMiddleware:
+    """Time every request by its URL pattern (not its path, to keep label cardinality low)"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self._observe(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self._observe(request, response, started)
+        return response
+
+    @staticmethod
+    def _observe(request, response, started):
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match is not None else 'unmatched'
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - started, route, request.method, str(response.status_code)
+        )
+
+
+def _model_versions():
+    return get_executor().model_versions()
+
+
+class ModelVersionMiddleware:
+    """Report the serving model versions as ``X-Model-Versions: nlp=<version>,profanity=<version>``"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self._add_header(response, _model_versions())
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        # The first call may start the process pool, which must not block the event loop
+        self._add_header(response, await sync_to_async(_model_versions)())
+        return response
+
+    @staticmethod
+    def _add_header(response, versions):
+        if versions:
+            response['X-Model-Versions'] = ','.join(f'{name}={versions[name]}' for name in sorted(versions))
+
+
+class RequestProfilingMiddleware:
+    """cProfile single requests picked by a header or at random, see settings.REQUEST_PROFILING.
+
+    Only the serving process is profiled: with the process-pool executor the
+    model work shows up as time waiting on the pool. Under ASGI the middleware
+    disables itself: cProfile follows one thread, while the event loop runs
+    other requests in between and the sync views run in a worker thread.
+    """
+    sync_capable = True
+    # Declared so that Django hands over the async chain under ASGI rather
+    # than adapting it, which is how __init__ can tell and refuse to run
+    async_capable = True
+
+    def __init__(self, get_response):
+        config = getattr(settings, 'REQUEST_PROFILING', {})
+        if not config.get('ENABLED'):
+            raise MiddlewareNotUsed
+        if iscoroutinefunction(get_response):
+            logger.warning("Request profiling is not supported under ASGI and stays disabled")
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.header = 'HTTP_' + config.get('HEADER', 'X-Zapsync-Profile').upper().replace('-', '_')
+        self.sample_rate = config.get('SAMPLE_RATE', 0.0)
+        self.path_prefixes = tuple(config.get('PATH_PREFIXES', ('/filter/', '/nlp/')))
+
+    def _wanted(self, request):
+        if not request.path.startswith(self.path_prefixes):
+            return False
+        if request.META.get(self.header, '') in ('1', 'true'):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if not self._wanted(request) or not _profiling.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self._profile(request)
+        finally:
+            _profiling.release()
+
+    def _profile(self, request):
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = None  # Malformed header: the body is not read ahead of the view
+        digest = None
+        if request.content_type == 'application/json' and length is not None and 0 <= length <= MAX_HASHED_BODY:
+            digest, length = text_hash(request)
+
+        profiler = cProfile.Profile()
+        started = time.time()
+        clock = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        duration = time.perf_counter() - clock
+
+        match = getattr(request, 'resolver_match', None)
+        name = get_profile_store().save(profiler, {
+            'path': request.path,
+            'route': match.route if match is not None else None,
+            'method': request.method,
+            'status': response.status_code,
+            'started': started,
+            'duration_ms': round(duration * 1000, 3),
+            'text_sha256': digest,
+            'text_length': length
+        })
+        response['X-Profile-Id'] = name
+        return response
@@ -0,0 +1,112 @@
+"""
+Store of cProfile captures for single slow requests.
+
+RequestProfilingMiddleware profiles requests picked by header or sampling
+and saves each one here as ``<stamp>-<id>.prof`` (loadable with pstats or
+snakeviz) next to a ``.json`` with what is needed to find it again: the
+route, timing, status and a hash of the request text. The raw text is never
+written. Only the newest ``max_profiles`` captures are kept.
+"""
+
+import hashlib
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+
+PROFILE_NAME = re.compile(r'^[\w-]+$')
+
+
+def text_hash(request):
+    """sha256 prefix of the text being checked, or of the raw body for other payloads"""
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        data = None
+    if isinstance(data, dict):
+        text = data.get('text', data.get('texts', data.get('query')))
+        if text is not None:
+            payload = json.dumps(text, ensure_ascii=False, sort_keys=True).encode('utf-8')
+            return hashlib.sha256(payload).hexdigest()[:16], len(payload)
+    return hashlib.sha256(request.body).hexdigest()[:16], len(request.body)
+
+
+class ProfileStore:
+    def __init__(self, directory, max_profiles=200):
+        self.directory = str(directory)
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+
+    def save(self, profiler, info):
+        """Write one capture and drop the oldest beyond ``max_profiles``"""
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime(info['started']))
+        # Names sort by capture time, which is the order they are rotated in
+        name = f"{stamp}{int(info['started'] * 1000) % 1000:03d}-{uuid.uuid4().hex[:8]}"
+        base = os.path.join(self.directory, name)
+        profiler.dump_stats(base + '.prof')
+        with open(base + '.json.tmp', 'w') as f:
+            json.dump({'name': name, **info}, f)
+        # The metadata appears last, so readers never list a half-written capture
+        os.replace(base + '.json.tmp', base + '.json')
+        self._rotate()
+        return name
+
+    def _rotate(self):
+        with self._lock:
+            names = sorted(f[:-5] for f in os.listdir(self.directory) if f.endswith('.json'))
+            for name in names[:max(len(names) - self.max_profiles, 0)]:
+                for suffix in ('.json', '.prof'):
+                    try:
+                        os.remove(os.path.join(self.directory, name + suffix))
+                    except OSError:
+                        pass
+
+    def list(self):
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, file_name)) as f:
+                    entries.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # Rotated away while listing
+        return entries
+
+    def slowest(self, limit=20, path_prefix=None):
+        entries = [e for e in self.list() if path_prefix is None or e['path'].startswith(path_prefix)]
+        return sorted(entries, key=lambda e: e['duration_ms'], reverse=True)[:limit]
+
+    def summary(self, name, sort='cumulative', limit=30):
+        """pstats report of one capture as text"""
+        if not PROFILE_NAME.match(name):
+            raise KeyError(name)
+        path = os.path.join(self.directory, name + '.prof')
+        if not os.path.exists(path):
+            raise KeyError(name)
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+_store = None
+
+
+def get_profile_store():
+    global _store
+    if _store is None:
+        from django.conf import settings
+
+        config = getattr(settings, 'REQUEST_PROFILING', {})
+        _store = ProfileStore(
+            config.get('DIRECTORY', os.path.join(os.path.dirname(__file__), '..', 'profiles')),
+            max_profiles=config.get('MAX_PROFILES', 200)
+        )
+    return _store
@@ -0,0 +1,248 @@
+"""
+Process-wide registry of the ML models served by the zapsync_ai apps.
+
+Apps register a loader for each model in ``AppConfig.ready()``. Models are
+loaded on first use, or all at once with ``preload()`` before the server
+forks its workers so the loaded pages stay shared copy-on-write.
+
+Models registered with a ``probe`` are hot-reloaded: every
+MODEL_RELOAD['CHECK_INTERVAL'] seconds a background thread compares each
+probe's token with the one the loaded instance was built from, and on a
+change loads, warms and hands over to a new instance before swapping it in
+with a single assignment. Requests keep using the old instance until then
+and are never blocked by a reload. The thread is started lazily from
+``get()``, so it also runs in forked workers.
+"""
+
+import gc
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .metrics import MODEL_LOAD_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def resident_memory():
+    """Current resident set size of this process in bytes (0 if unknown)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # ru_maxrss is the peak, in KB on Linux and bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, OSError):
+        return 0
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._loaders = {}
+        self._warmups = {}
+        self._probes = {}
+        self._handovers = {}
+        self._tokens = {}
+        self._instances = {}
+        self._info = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self._watcher = None
+
+    def register(self, name, loader, warmup=None, probe=None, handover=None):
+        """Register ``loader`` (a callable or dotted path) under ``name``.
+
+        ``warmup`` is called with the loaded instance, e.g. to run one dummy
+        prediction so the first real request does not pay for lazy setup.
+        It doubles as the check a reloaded instance must pass.
+        ``probe`` (callable or dotted path) returns a token that changes when
+        new artifacts are published, and enables hot reload. ``handover`` is
+        called with the new and the old instance before a swap, e.g. to
+        re-score the old instance's hottest cache entries.
+        """
+        with self._lock:
+            self._loaders[name] = loader
+            self._warmups[name] = warmup
+            self._probes[name] = probe
+            self._handovers[name] = handover
+            self._locks.setdefault(name, threading.Lock())
+            self._info.setdefault(name, {'loaded': False})
+
+    def names(self):
+        return list(self._loaders)
+
+    def get(self, name):
+        instance = self._instances.get(name)
+        if instance is None:
+            instance = self.load(name)
+        if time.monotonic() >= self._next_check:
+            self._watch()
+        return instance
+
+    @staticmethod
+    def _resolve(function):
+        return import_string(function) if isinstance(function, str) else function
+
+    def _build(self, name):
+        """Load a new instance; returns it with its probe token and load info"""
+        probe = self._probes[name]
+        token = self._resolve(probe)() if probe is not None else None
+
+        rss_before = resident_memory()
+        started = time.perf_counter()
+        instance = self._resolve(self._loaders[name])()
+        load_seconds = time.perf_counter() - started
+        MODEL_LOAD_SECONDS.set(load_seconds, name, 'load')
+        info = {
+            'loaded': True,
+            'version': getattr(instance, 'version', None),
+            'load_seconds': round(load_seconds, 4),
+            'rss_delta_bytes': resident_memory() - rss_before,
+            'pid': os.getpid()
+        }
+        return instance, token, info
+
+    def _warm(self, name, instance, info, previous=None):
+        """Warm a built instance and (given the instance it replaces) hand over to it"""
+        rss_before = resident_memory()
+        started = time.perf_counter()
+        if self._warmups[name] is not None:
+            self._warmups[name](instance)
+        warmup_seconds = time.perf_counter() - started
+        if previous is not None and self._handovers[name] is not None:
+            self._handovers[name](instance, previous)
+
+        MODEL_LOAD_SECONDS.set(warmup_seconds, name, 'warmup')
+        info['warmup_seconds'] = round(warmup_seconds, 4)
+        info['rss_delta_bytes'] += resident_memory() - rss_before
+
+    def load(self, name):
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model: {name}")
+
+        with self._locks[name]:
+            instance = self._instances.get(name)
+            if instance is not None:
+                return instance
+
+            instance, token, info = self._build(name)
+            self._warm(name, instance, info)
+            self._info[name] = {**info, 'reloads': 0}
+            self._tokens[name] = token
+            self._instances[name] = instance
+            logger.info("Loaded model %s in %.3fs", name, info['load_seconds'])
+            return instance
+
+    def _watch(self):
+        """Start a background update check unless one is running or reloading is off"""
+        with self._lock:
+            if time.monotonic() < self._next_check:
+                return
+            config = getattr(settings, 'MODEL_RELOAD', {})
+            if not config.get('ENABLED', True):
+                self._next_check = float('inf')
+                return
+            self._next_check = time.monotonic() + config.get('CHECK_INTERVAL', 5)
+            if self._watcher is not None and self._watcher.is_alive():
+                return
+            self._watcher = threading.Thread(
+                target=self.check_for_updates, name='model-reload', daemon=True
+            )
+            self._watcher.start()
+
+    def check_for_updates(self):
+        """Reload every loaded model whose probe token changed; returns the reloaded names"""
+        reloaded = []
+        for name, probe in list(self._probes.items()):
+            if probe is None or name not in self._instances:
+                continue
+            try:
+                token = self._resolve(probe)()
+            except Exception:
+                logger.exception("Checking %s for new artifacts failed", name)
+                continue
+            if token != self._tokens.get(name) and self.reload(name):
+                reloaded.append(name)
+        return reloaded
+
+    def reload(self, name):
+        """Build a new instance next to the serving one and swap it in if it checks out"""
+        with self._locks[name]:
+            previous = self._instances.get(name)
+            try:
+                instance, token, info = self._build(name)
+                # Same artifacts rewritten (e.g. touched): keep the warm instance
+                # without paying for a warmup and handover
+                unchanged = previous is not None and info['version'] is not None and \
+                    info['version'] == getattr(previous, 'version', None)
+                if not unchanged:
+                    self._warm(name, instance, info, previous)
+            except Exception:
+                # Keep serving the old instance; retry once the artifacts change again
+                try:
+                    self._tokens[name] = self._resolve(self._probes[name])()
+                except Exception:
+                    pass
+                self._info[name]['failed_reloads'] = self._info[name].get('failed_reloads', 0) + 1
+                logger.exception("Reloading model %s failed, keeping the loaded version", name)
+                return False
+
+            self._tokens[name] = token
+            if unchanged:
+                return False
+
+            self._instances[name] = instance
+            self._info[name] = {
+                **self._info[name], **info,
+                'reloads': self._info[name].get('reloads', 0) + 1,
+                'reloaded_at': time.time()
+            }
+            logger.info("Reloaded model %s as version %s", name, info['version'])
+            return True
+
+    def required(self):
+        """Models preload() loads and readiness waits for: settings.PRELOAD_MODELS,
+        or every registered model if that is None"""
+        names = getattr(settings, 'PRELOAD_MODELS', None)
+        return [name for name in (self.names() if names is None else names) if name in self._loaders]
+
+    def preload(self, names=None, freeze=True):
+        """Load the required models (or ``names``) now, typically in the master before forking.
+
+        With ``freeze`` all objects surviving the load are moved to the
+        permanent GC generation, so collections in the workers never write
+        to (and un-share) those pages.
+        """
+        for name in names or self.required():
+            self.load(name)
+        if freeze and hasattr(gc, 'freeze'):
+            gc.collect()
+            gc.freeze()
+
+    def is_ready(self):
+        return all(name in self._instances for name in self.required())
+
+    def versions(self):
+        """{model name: artifact version} of the loaded instances that have one"""
+        return {
+            name: instance.version for name, instance in list(self._instances.items())
+            if getattr(instance, 'version', None) is not None
+        }
+
+    def status(self):
+        return {
+            'ready': self.is_ready(),
+            'rss_bytes': resident_memory(),
+            'models': {name: dict(self._info[name]) for name in self._loaders}
+        }
+
+
+registry = ModelRegistry()
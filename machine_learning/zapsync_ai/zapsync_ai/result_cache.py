@@ -0,0 +1,186 @@
+"""
+Prediction result caches shared by every worker on a host.
+
+Backends store JSON-serializable values under a string key and a model
+version; an entry written for one version is never returned for another,
+so retrained models never see stale results. The backend is picked with a
+dotted path in settings, so a Redis-compatible one can be dropped in with
+the same get/get_many/set/stats interface.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from django.utils.module_loading import import_string
+
+MAX_VARIABLES = 900  # Below SQLite's default limit on bound parameters per statement
+
+
+class DummyResultCache:
+    """Caches nothing; used when caching is disabled"""
+
+    def __init__(self, **options):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        self.misses += 1
+        return None
+
+    def get_many(self, keys, version):
+        self.misses += len(keys)
+        return [None] * len(keys)
+
+    def set(self, key, version, value):
+        pass
+
+    def stats(self):
+        return {'backend': 'dummy', 'hits': 0, 'misses': self.misses, 'hit_ratio': 0.0}
+
+
+class SQLiteResultCache:
+    """Result cache in a local SQLite database in WAL mode.
+
+    Readers never block the writer, so every worker process on the host can
+    share one file. Entries expire after ``ttl`` seconds and the least
+    recently used ones are evicted once there are more than ``max_entries``.
+    """
+
+    # Refresh an entry's access time at most this often, so hot keys do not
+    # turn every read into a write
+    TOUCH_INTERVAL = 60
+    # Enforce max_entries every this many writes
+    EVICT_EVERY = 500
+
+    def __init__(self, path, ttl=3600, max_entries=100000):
+        self.path = str(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+            'expires_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+        )
+
+    def _connection(self):
+        """One connection per thread, reopened after a fork"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def _make_key(key, version):
+        return hashlib.sha1(f'{version}\0{key}'.encode('utf-8')).hexdigest()
+
+    def get(self, key, version):
+        return self.get_many([key], version)[0]
+
+    def get_many(self, keys, version):
+        """Values for ``keys`` in order, None for misses, read with one query per MAX_VARIABLES keys"""
+        db_keys = [self._make_key(key, version) for key in keys]
+        unique = list(dict.fromkeys(db_keys))
+        now = time.time()
+        rows = {}
+        try:
+            connection = self._connection()
+            for start in range(0, len(unique), MAX_VARIABLES):
+                chunk = unique[start:start + MAX_VARIABLES]
+                rows.update(
+                    (row[0], row[1:]) for row in connection.execute(
+                        'SELECT key, value, expires_at, accessed_at FROM results '
+                        f'WHERE key IN ({", ".join("?" * len(chunk))})', chunk
+                    )
+                )
+            rows = {key: row for key, row in rows.items() if row[1] >= now}
+            stale = [key for key, row in rows.items() if now - row[2] > self.TOUCH_INTERVAL]
+            for start in range(0, len(stale), MAX_VARIABLES):
+                chunk = stale[start:start + MAX_VARIABLES]
+                connection.execute(
+                    f'UPDATE results SET accessed_at = ? WHERE key IN ({", ".join("?" * len(chunk))})',
+                    (now, *chunk)
+                )
+        except sqlite3.Error:
+            rows = {}
+
+        hits = sum(1 for key in db_keys if key in rows)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(db_keys) - hits
+        return [json.loads(rows[key][0]) if key in rows else None for key in db_keys]
+
+    def set(self, key, version, value):
+        now = time.time()
+        try:
+            self._connection().execute(
+                'INSERT OR REPLACE INTO results (key, value, expires_at, accessed_at) '
+                'VALUES (?, ?, ?, ?)',
+                (self._make_key(key, version), json.dumps(value), now + self.ttl, now)
+            )
+        except sqlite3.Error:
+            return  # A busy or read-only cache must never fail a prediction
+        with self._lock:
+            self.writes += 1
+            evict = self.writes % self.EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones over the cap"""
+        connection = self._connection()
+        try:
+            removed = connection.execute(
+                'DELETE FROM results WHERE expires_at < ?', (time.time(),)
+            ).rowcount
+            excess = connection.execute('SELECT COUNT(*) FROM results').fetchone()[0] - self.max_entries
+            if excess > 0:
+                removed += connection.execute(
+                    'DELETE FROM results WHERE key IN '
+                    '(SELECT key FROM results ORDER BY accessed_at LIMIT ?)', (excess,)
+                ).rowcount
+        except sqlite3.Error:
+            return
+        with self._lock:
+            self.evictions += removed
+
+    def stats(self):
+        try:
+            entries = self._connection().execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'sqlite',
+                'entries': entries,
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'writes': self.writes,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
+
+
+def get_result_cache(config):
+    """Build a cache from ``{'BACKEND': dotted.path, 'OPTIONS': {...}}``"""
+    if not config:
+        return DummyResultCache()
+    backend = import_string(config.get('BACKEND', 'zapsync_ai.result_cache.SQLiteResultCache'))
+    return backend(**config.get('OPTIONS', {}))
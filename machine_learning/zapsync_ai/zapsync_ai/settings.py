@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,6 +46,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'zapsync_ai.middleware.RequestMetricsMiddleware',
+    'zapsync_ai.middleware.ModelVersionMiddleware',
+    'zapsync_ai.middleware.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -125,3 +129,164 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Model loading
+# Models load lazily on first use. With ZAPSYNC_PRELOAD_MODELS=1 the WSGI/ASGI
+# entry points load them all at import time (see gunicorn.conf.py), so a
+# preloading server shares them copy-on-write across its workers.
+
+MODEL_PRELOAD = os.environ.get('ZAPSYNC_PRELOAD_MODELS', '') == '1'
+
+# The models preloading loads and the readiness probe (/ready/) waits for;
+# None means every registered one. The stores behind search, recommendations
+# and activity stats are cheap to open and load on first use.
+PRELOAD_MODELS = ['profanity', 'nlp', 'anomaly']
+
+
+# Model hot reload
+# Every CHECK_INTERVAL seconds each process checks models/releases/ (or the
+# flat files in models/) for newly published artifacts, and loads, warms and
+# swaps them in on a background thread. X-Model-Versions on every response
+# names the versions in use.
+
+MODEL_RELOAD = {
+    'ENABLED': os.environ.get('ZAPSYNC_MODEL_RELOAD', '1') == '1',
+    'CHECK_INTERVAL': 5,
+}
+
+# Serve releases from their memory-mapped bundles (see zapsync_ai/bundles.py)
+# when they have them. ZAPSYNC_MODEL_BUNDLES=0 always loads the pickles.
+MODEL_BUNDLES = os.environ.get('ZAPSYNC_MODEL_BUNDLES', '1') == '1'
+
+
+# Content filtering
+
+# Max number of cached profanity verdicts
+PROFANITY_CACHE_SIZE = 10000
+
+# Chunk size (bytes) used when streaming large uploads through /filter/scan/
+PROFANITY_SCAN_CHUNK_SIZE = 64 * 1024
+
+# Moderation feedback posted to /filter/feedback/, which
+# content_filtering/online.py trains on and publishes as new releases.
+# Only staff and members of MODERATOR_GROUP may post it.
+PROFANITY_ONLINE_LEARNING = {
+    'FEEDBACK_PATH': BASE_DIR / 'feedback' / 'profanity.sqlite3',
+    'MAX_EVENTS_PER_REQUEST': 1000,
+    'MODERATOR_GROUP': 'moderators',
+}
+
+
+# Semantic search
+# Where the embedding index lives, and which encoder builds it: 'auto' uses
+# sentence-transformers when installed and the offline LSA encoder otherwise.
+
+SEARCH_INDEX_DIR = BASE_DIR / 'search_index'
+
+SEARCH_ENCODER = os.environ.get('ZAPSYNC_SEARCH_ENCODER', 'auto')
+
+
+# NLP entity extraction
+# Data file with the known courses, lecturers and semesters, and how often
+# (seconds) it is checked for changes.
+
+GAZETTEER_PATH = BASE_DIR / 'datasets' / 'gazetteer.json'
+
+GAZETTEER_CHECK_INTERVAL = 5
+
+
+# NLP result cache
+# Prediction results shared by all workers on the host, keyed by the
+# preprocessed text and the model artifact hash. Set to None to disable.
+
+NLP_RESULT_CACHE = {
+    'BACKEND': 'zapsync_ai.result_cache.SQLiteResultCache',
+    'OPTIONS': {
+        'path': BASE_DIR / 'cache' / 'nlp_results.sqlite3',
+        'ttl': 3600,
+        'max_entries': 100000,
+    },
+}
+
+
+# Serving mode
+# 'asgi' (set by asgi.py) routes /filter/predict/ and /nlp/process/ to async
+# views that micro-batch concurrent requests: requests arriving within
+# MAX_WAIT_MS of each other, up to MAX_BATCH_SIZE, share one model call.
+
+SERVING_MODE = os.environ.get('ZAPSYNC_SERVING_MODE', 'wsgi')
+
+MICRO_BATCHING = {
+    'MAX_BATCH_SIZE': 64,
+    'MAX_WAIT_MS': 2,
+}
+
+
+# Inference executor
+# 'inline' runs models on the request thread. 'process' runs them in a pool
+# of WORKERS processes per server worker (default: the cores divided among
+# the server's workers), each with its own preloaded models; calls slower
+# than TIMEOUT seconds fail and have their pool replaced, and crashed
+# workers are replaced.
+
+INFERENCE_EXECUTOR = {
+    'BACKEND': os.environ.get('ZAPSYNC_INFERENCE_EXECUTOR', 'inline'),
+    'WORKERS': int(os.environ.get('ZAPSYNC_INFERENCE_WORKERS', 0)) or None,
+    'TIMEOUT': 10.0,
+    'START_METHOD': 'forkserver',
+    'MODELS': ['profanity', 'nlp'],
+}
+
+
+# Request profiling
+# When ENABLED, requests under PATH_PREFIXES are run under cProfile if they
+# carry the HEADER (value 1) or fall in the random SAMPLE_RATE. Captures go to
+# DIRECTORY, newest MAX_PROFILES kept, and are listed slowest first to admin
+# users at /profiles/. WSGI only: under ASGI the middleware logs a warning and
+# stays out of the chain.
+
+REQUEST_PROFILING = {
+    'ENABLED': os.environ.get('ZAPSYNC_PROFILING', '') == '1',
+    'HEADER': 'X-Zapsync-Profile',
+    'SAMPLE_RATE': float(os.environ.get('ZAPSYNC_PROFILING_SAMPLE_RATE', 0)),
+    'PATH_PREFIXES': ['/filter/', '/nlp/'],
+    'DIRECTORY': BASE_DIR / 'profiles',
+    'MAX_PROFILES': 200,
+}
+
+
+# Anomaly detection
+# The SQLite file all workers share the activity windows and recent anomalies
+# in, how many recent anomalies /api/anomalies/ can serve, and the largest
+# batch accepted by /anomaly/ingest/. The window and bucket lengths are fixed
+# by the trained model (anomaly_detection/train.py).
+
+ANOMALY_DETECTION = {
+    'STATE_PATH': BASE_DIR / 'stats' / 'anomaly.sqlite3',
+    'RECENT_ANOMALIES': 1000,
+    'MAX_EVENTS_PER_REQUEST': 50000,
+}
+
+
+# Activity stats
+# Per-day aggregates behind /api/stats/, fed by /anomaly/ingest/: the SQLite
+# file all workers share them in, how many days are kept, the HyperLogLog
+# precision for distinct users (2**p bytes per day, ~1.04/sqrt(2**p) error)
+# and the storage in use when counting began.
+
+ACTIVITY_STATS = {
+    'PATH': BASE_DIR / 'stats' / 'activity.sqlite3',
+    'RETENTION_DAYS': 400,
+    'HLL_PRECISION': 12,
+    'STORAGE_BASELINE': 0,
+}
+
+
+# Recommendations
+# Directory of the memory-mapped co-access model, and how many similar files
+# are precomputed for each file.
+
+RECOMMENDATION_DIR = BASE_DIR / 'recommendations'
+
+RECOMMENDATION_NEIGHBORS = 50
@@ -0,0 +1,258 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+import numpy as np
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import SimpleTestCase, override_settings
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.naive_bayes import ComplementNB
+
+from . import artifacts, bundles, executor, middleware
+from .result_cache import SQLiteResultCache
+
+TEXTS = [
+    'lecture notes for week one', 'exam answers leaked online', 'research paper draft v2',
+    'darn this broken lab report', 'slides from the guest lecture', 'café menu and prices',
+    'week two problem set answers', 'final exam review session notes', 'résumé and cover letter',
+]
+LABELS = np.array([0, 2, 0, 1, 0, 1, 2, 2, 1])
+UNSEEN = ['', 'nothing known here', 'exam notes exam notes week', 'CAFÉ Résumé', 'lecture ' * 50]
+
+
+def _publish(models_dir, worker):
+    for i in range(20):
+        with artifacts.new_release('demo', models_dir=models_dir, keep=100) as release:
+            with open(release.path('model.txt'), 'w') as f:
+                f.write(f'{worker}-{i}')
+
+
+def _fake_call(model, method, args, kwargs):
+    """Stands in for a model call in the pool's workers"""
+    if method == 'hang':
+        time.sleep(60)
+    elif method == 'crash_once':
+        flag, = args
+        if not os.path.exists(flag):
+            open(flag, 'w').close()
+            os._exit(1)
+    return os.getpid()
+
+
+class BundleTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def assertMatchesSklearn(self, vectorizer, classifier):
+        bundles.export(self.directory, vectorizer, classifier, check_texts=TEXTS)
+        bundle = bundles.load(self.directory)
+        self.assertIsInstance(bundle.vectorizer.idf_, np.memmap)
+        texts = TEXTS + UNSEEN
+        np.testing.assert_allclose(
+            bundle.pipeline().predict_proba(texts),
+            classifier.predict_proba(vectorizer.transform(texts)),
+            atol=bundles.TOLERANCE
+        )
+        np.testing.assert_array_equal(
+            bundle.pipeline().predict(texts), classifier.predict(vectorizer.transform(texts))
+        )
+        return bundle
+
+    def test_binary_logistic_regression(self):
+        vectorizer = TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True).fit(TEXTS)
+        classifier = LogisticRegression().fit(vectorizer.transform(TEXTS), LABELS == 1)
+        bundle = self.assertMatchesSklearn(vectorizer, classifier)
+        self.assertEqual(bundle.manifest['classifier']['link'], 'logistic')
+
+    def test_multinomial_logistic_regression(self):
+        vectorizer = TfidfVectorizer(stop_words='english').fit(TEXTS)
+        classifier = LogisticRegression().fit(vectorizer.transform(TEXTS), LABELS)
+        bundle = self.assertMatchesSklearn(vectorizer, classifier)
+        self.assertEqual(bundle.manifest['classifier']['link'], 'softmax')
+
+    def test_complement_naive_bayes(self):
+        vectorizer = TfidfVectorizer(binary=True, norm=None).fit(TEXTS)
+        classifier = ComplementNB().fit(vectorizer.transform(TEXTS), LABELS)
+        bundle = self.assertMatchesSklearn(vectorizer, classifier)
+        self.assertEqual(bundle.manifest['classifier']['type'], 'ComplementNB')
+
+    def test_hashing_vectorizer_has_no_arrays(self):
+        vectorizer = HashingVectorizer(n_features=2 ** 8, alternate_sign=False)
+        bundles.export(self.directory, vectorizer, check_texts=TEXTS)
+        bundle = bundles.load(self.directory)
+        self.assertEqual(bundle.manifest['arrays'], [])
+        self.assertEqual((bundle.vectorizer.transform(TEXTS) != vectorizer.transform(TEXTS)).nnz, 0)
+
+    def test_refuses_a_bundle_that_deviates(self):
+        vectorizer = TfidfVectorizer().fit(TEXTS)
+        classifier = LogisticRegression().fit(vectorizer.transform(TEXTS), LABELS == 1)
+        with self.assertRaises(ValueError):
+            bundles.export(self.directory, vectorizer, classifier, check_texts=TEXTS, tolerance=0.0)
+        self.assertFalse(bundles.exists(self.directory))
+
+    def test_vocabulary_lookup(self):
+        vocabulary = bundles.SortedVocabulary(np.array([b'abcdef', b'caf\xc3\xa9', b'exam'], dtype='S6'))
+        # 'abcdefg' cut to the array's six bytes would equal the term 'abcdef'
+        columns = vocabulary.lookup(['exam', 'café', 'abcdef', 'abcdefg', 'zzz', 'ab'])
+        np.testing.assert_array_equal(columns, [2, 1, 0, -1, -1, -1])
+        self.assertEqual(dict(vocabulary.items()), {'abcdef': 0, 'café': 1, 'exam': 2})
+        self.assertNotIn('abcdefg', vocabulary)
+
+
+class NewReleaseTests(SimpleTestCase):
+    def test_concurrent_publishers_each_swap_current(self):
+        models_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, models_dir, ignore_errors=True)
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=_publish, args=(models_dir, w)) for w in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+
+        model_dir = os.path.join(models_dir, artifacts.RELEASES_DIR_NAME, 'demo')
+        self.assertEqual(len(os.listdir(model_dir)), 4 * 20 + 1)
+        version, (path,) = artifacts.resolve('demo', ['model.txt'], models_dir=models_dir)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(oct(os.stat(os.path.join(model_dir, 'CURRENT')).st_mode & 0o777), '0o644')
+
+
+class ProcessPoolInferenceExecutorTests(SimpleTestCase):
+    def setUp(self):
+        # Forked workers inherit these patches: no models are loaded
+        for target, name, value in [(executor, '_call', _fake_call), (executor.registry, 'preload', lambda models: None)]:
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.pool = executor.ProcessPoolInferenceExecutor(workers=2, timeout=0.5, start_method='fork', models=['none'])
+        self.addCleanup(lambda: self.pool._pool.shutdown(wait=True, cancel_futures=True))
+
+    def workers(self):
+        return set(self.pool._pool._processes)
+
+    def test_timeout_kills_the_hung_worker_and_replaces_the_pool(self):
+        before = self.workers()
+        with self.assertLogs(executor.logger, 'WARNING'), self.assertRaises(executor.InferenceTimeout):
+            self.pool.run('demo', 'hang')
+        self.assertTrue(before.isdisjoint(self.workers()))
+        self.assertIn(self.pool.run('demo', 'echo'), self.workers())
+        self.assertEqual({k: self.pool.stats()[k] for k in ('calls', 'timeouts', 'restarts')},
+                         {'calls': 2, 'timeouts': 1, 'restarts': 1})
+
+    def test_broken_pool_is_replaced_and_the_call_retried(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        flag = os.path.join(directory, 'crashed')
+        with self.assertLogs(executor.logger, 'WARNING'):
+            pid = self.pool.run('demo', 'crash_once', flag)
+        self.assertIn(pid, self.workers())
+        self.assertEqual(self.pool.stats()['restarts'], 1)
+
+    def test_concurrent_callers_share_one_replacement(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        flag = os.path.join(directory, 'crashed')
+        results, errors = [], []
+
+        def call():
+            try:
+                results.append(self.pool.run('demo', 'crash_once', flag, timeout=10))
+            except BrokenProcessPool as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(6)]
+        with self.assertLogs(executor.logger, 'WARNING'):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual((len(results), errors), (6, []))
+        self.assertEqual(self.pool.stats()['restarts'], 1)
+        self.assertEqual(self.pool.stats()['calls'], 6)
+
+
+class SQLiteResultCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'results.sqlite3')
+        self.now = 1000.0
+        patcher = mock.patch('zapsync_ai.result_cache.time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_entries_expire_after_ttl(self):
+        cache = SQLiteResultCache(self.path, ttl=10)
+        cache.set('text', 'v1', {'intent': 'search'})
+        self.now += 10
+        self.assertEqual(cache.get('text', 'v1'), {'intent': 'search'})
+        self.now += 1
+        self.assertIsNone(cache.get('text', 'v1'))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_entries_are_keyed_by_model_version(self):
+        cache = SQLiteResultCache(self.path)
+        cache.set('text', 'v1', {'intent': 'old'})
+        self.assertIsNone(cache.get('text', 'v2'))
+        cache.set('text', 'v2', {'intent': 'new'})
+        self.assertEqual(SQLiteResultCache(self.path).get('text', 'v1'), {'intent': 'old'})
+        self.assertEqual(cache.get_many(['text', 'other'], 'v2'), [{'intent': 'new'}, None])
+
+    def test_evicts_expired_then_least_recently_used(self):
+        cache = SQLiteResultCache(self.path, ttl=1000, max_entries=3)
+        cache.set('old', 'v', 0)
+        for name in ('a', 'b', 'c', 'd'):
+            self.now += 200
+            cache.set(name, 'v', name)
+        self.now = 2100  # 'old' has expired; reading 'a' leaves 'b' least recently used
+        self.assertEqual(cache.get('a', 'v'), 'a')
+        cache.evict()
+        self.assertEqual(cache.get_many(['old', 'a', 'b', 'c', 'd'], 'v'), [None, 'a', None, 'c', 'd'])
+        self.assertEqual((cache.stats()['entries'], cache.evictions), (3, 2))
+
+    def test_set_evicts_every_evict_every_writes(self):
+        cache = SQLiteResultCache(self.path, max_entries=2)
+        with mock.patch.object(SQLiteResultCache, 'EVICT_EVERY', 4):
+            for i in range(3):
+                cache.set(str(i), 'v', i)
+            self.assertEqual(cache.stats()['entries'], 3)
+            cache.set('3', 'v', 3)
+        self.assertEqual(cache.stats()['entries'], 2)
+
+    def test_get_many_reads_in_one_query(self):
+        cache = SQLiteResultCache(self.path)
+        for i in range(5):
+            cache.set(f'text {i}', 'v', i)
+        statements = []
+        cache._connection().set_trace_callback(statements.append)
+        keys = ['text 3', 'missing', 'text 0', 'text 3']
+        self.assertEqual(cache.get_many(keys, 'v'), [3, None, 0, 3])
+        self.assertEqual(len([s for s in statements if s.startswith('SELECT')]), 1)
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+        with mock.patch('zapsync_ai.result_cache.MAX_VARIABLES', 2):
+            self.assertEqual(cache.get_many([f'text {i}' for i in range(5)], 'v'), list(range(5)))
+
+
+@override_settings(REQUEST_PROFILING={'ENABLED': True})
+class RequestProfilingMiddlewareTests(SimpleTestCase):
+    def test_refuses_an_async_chain(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        with self.assertLogs(middleware.logger, 'WARNING') as logs, self.assertRaises(MiddlewareNotUsed):
+            middleware.RequestProfilingMiddleware(get_response)
+        self.assertIn('ASGI', logs.output[0])
+
+    def test_wraps_a_sync_chain(self):
+        get_response = lambda request: HttpResponse()
+        self.assertIs(middleware.RequestProfilingMiddleware(get_response).get_response, get_response)
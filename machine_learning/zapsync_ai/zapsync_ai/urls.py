@@ -16,11 +16,23 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from . import views
+from anomaly_detection import views as anomaly_views
+from recommendation_system import views as recommendation_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('ready/', views.ready, name='ready'),
+    path('models/', views.models_status, name='models_status'),
+    path('models/warmup/', views.warmup, name='models_warmup'),
+    path('metrics', views.metrics_view, name='metrics'),
+    path('profiles/', views.slowest_profiles, name='slowest_profiles'),
+    path('profiles/<str:name>/', views.profile_detail, name='profile_detail'),
     path('filter/', include('content_filtering.urls')),
-    # path('anomaly/', include('anomaly_detection.urls')),
-    # path('recommend/', include('recommendation_system.urls')),
+    path('anomaly/', include('anomaly_detection.urls')),
+    path('recommend/', include('recommendation_system.urls')),
     path('nlp/', include('nlp.urls')),
+    path('api/stats/', anomaly_views.activity_stats, name='api_stats'),
+    path('api/anomalies/', anomaly_views.anomalies, name='api_anomalies'),
+    path('api/recommendations/', recommendation_views.recommendations, name='api_recommendations'),
 ]
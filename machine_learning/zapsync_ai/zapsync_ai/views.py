@@ -0,0 +1,70 @@
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from .metrics import CONTENT_TYPE, metrics
+from .profiling import get_profile_store
+from .registry import registry
+
+
+@api_view(['GET'])
+def ready(request):
+    """Readiness probe: 200 once every model in settings.PRELOAD_MODELS is loaded"""
+    status = registry.status()
+    return Response(status, status=200 if status['ready'] else 503)
+
+
+@api_view(['GET'])
+def models_status(request):
+    return Response(registry.status())
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def warmup(request):
+    """Load and warm the models in settings.PRELOAD_MODELS in this worker"""
+    try:
+        registry.preload(freeze=False)
+    except Exception as e:
+        return Response({'error': str(e), **registry.status()}, status=500)
+    return Response(registry.status())
+
+
+@require_GET
+def metrics_view(request):
+    """Prometheus scrape endpoint (plain Django, so DRF content negotiation stays out of it)"""
+    return HttpResponse(metrics.render(), content_type=CONTENT_TYPE)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def slowest_profiles(request):
+    """
+    The slowest profiled requests, slowest first
+    GET /profiles/?limit=20&path=/nlp/
+    """
+    try:
+        limit = min(max(int(request.query_params.get('limit', 20)), 1), 1000)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=400)
+    return Response({
+        'profiles': get_profile_store().slowest(limit, request.query_params.get('path'))
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def profile_detail(request, name):
+    """pstats report of one capture: GET /profiles/<name>/?sort=tottime&limit=30"""
+    sort = request.query_params.get('sort', 'cumulative')
+    if sort not in ('cumulative', 'tottime', 'calls', 'ncalls'):
+        return Response({'error': 'sort must be cumulative, tottime, calls or ncalls'}, status=400)
+    try:
+        limit = min(max(int(request.query_params.get('limit', 30)), 1), 500)
+        report = get_profile_store().summary(name, sort=sort, limit=limit)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=400)
+    except KeyError:
+        return Response({'error': f'No profile named {name}'}, status=404)
+    return HttpResponse(report, content_type='text/plain; charset=utf-8')
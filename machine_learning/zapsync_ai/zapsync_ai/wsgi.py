@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'zapsync_ai.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.MODEL_PRELOAD:
+    from zapsync_ai.registry import registry  # noqa: E402
+    registry.preload()